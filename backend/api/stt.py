@@ -4,6 +4,8 @@ from flask import current_app as app
 import os
 from pywhispercpp.model import Model as WhisperModel
 
+from source.audiodecoder import decode_audio_file
+
 from typing import Optional, Union, List, Dict, Any
 
 
@@ -79,8 +81,10 @@ def compute_file_transcription(model: str, file_name: str) -> List[any]:
         print("File not found")
         return []
 
-    # perform transcription
-    segments = app.config["LOADED_MODELS"][model].transcribe(file_name)
+    # perform transcription (decoded in memory, no temporary wav)
+    segments = app.config["LOADED_MODELS"][model].transcribe(
+        decode_audio_file(file_name)
+    )
     # return results
     print(segments)
     return [[segment.t0, segment.t1, segment.text] for segment in segments]
@@ -274,9 +278,13 @@ def stt_debug_transcribe_file():
         )
     print("Loaded Models: ", app.config["LOADED_MODELS"])
 
-    # perform transcription
+    # check if the audio file exists
+    if not os.path.exists(_audio_file):
+        return jsonify({"error": "Audio file not found", "audio_file": _audio_file}), 400
+
+    # perform transcription (decoded in memory, no temporary wav)
     segments = app.config["LOADED_MODELS"][_model].transcribe(
-        _audio_file, language=_language
+        decode_audio_file(_audio_file), language=_language
     )
 
     # return results
@@ -0,0 +1,285 @@
+"""
+Micro-benchmarks for the audio pipeline.
+
+Run from the backend directory:
+    python benchmark.py              # run everything
+    python benchmark.py preprocess   # run a single benchmark
+"""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from source.audioprocessing import AudioPreprocessor
+from source.sessionformat import CODECS, SessionFile, write_session
+from source.whispercore_main import AudioChunk, AudioConfig, AudioStorage
+
+
+# ------------------------------------------------------------ #
+# helpers
+# ------------------------------------------------------------ #
+
+
+def make_pcm(seconds: float, sample_rate: int, channels: int) -> np.ndarray:
+    """Interleaved int16 noise + tone test signal."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * 440.0 * t)
+    frames = np.repeat(tone[:, None], channels, axis=1)
+    frames += 0.05 * np.random.default_rng(0).standard_normal(frames.shape)
+    return (frames * 32767).astype(np.int16).reshape(-1)
+
+
+def make_speechlike(seconds: float, sample_rate: int) -> np.ndarray:
+    """Mono float32 voiced harmonics, syllable envelope + pauses, noise floor."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 140.0 + 40.0 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None)
+    # ~30% pauses between phrases
+    phrases = np.sin(2 * np.pi * 0.1 * t + rng.uniform(0, 2 * np.pi)) > -0.6
+    audio = 0.1 * voiced * syllables * phrases + 0.002 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+
+def children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def report(name: str, cpu_seconds: float, audio_seconds: float):
+    print(
+        f"  {name:<28} {cpu_seconds * 1000 / audio_seconds:8.3f} ms CPU / s audio"
+        f"  ({audio_seconds / max(cpu_seconds, 1e-9):8.1f}x realtime)"
+    )
+
+
+# ------------------------------------------------------------ #
+# benchmarks
+# ------------------------------------------------------------ #
+
+
+def bench_preprocess(seconds: float = 60.0, chunk_size: int = 1024 * 4):
+    """In-memory downmix + polyphase resample vs. the ffmpeg _converted.wav path."""
+    print(f"[preprocess] {seconds:.0f}s of audio -> 16000Hz mono")
+
+    for rate, channels in [(48000, 2), (44100, 2), (48000, 4)]:
+        print(f" source: {rate}Hz, {channels} channels")
+        pcm = make_pcm(seconds, rate, channels)
+        step = chunk_size * channels
+
+        # in memory stage, chunk by chunk like AsyncMicrophone
+        preprocessor = AudioPreprocessor(rate, channels, 16000)
+        start = time.process_time()
+        for i in range(0, len(pcm), step):
+            preprocessor.process(pcm[i : i + step])
+        report("AudioPreprocessor", time.process_time() - start, seconds)
+
+        # ffmpeg round trip through a converted wav on disk
+        try:
+            import ffmpeg
+        except ImportError:
+            print("  ffmpeg-python not installed, skipping ffmpeg path")
+            continue
+
+        with tempfile.TemporaryDirectory() as tmp:
+            in_file = os.path.join(tmp, "source.wav")
+            out_file = os.path.join(tmp, "source_converted.wav")
+            with wave.open(in_file, "wb") as wf:
+                wf.setnchannels(channels)
+                wf.setsampwidth(2)
+                wf.setframerate(rate)
+                wf.writeframes(pcm.tobytes())
+
+            start_children = children_cpu_seconds()
+            start = time.process_time()
+            try:
+                ffmpeg.input(in_file).output(
+                    out_file, ar=16000, ac=1, acodec="pcm_s16le", format="wav"
+                ).run(quiet=True, overwrite_output=True)
+            except (OSError, ffmpeg.Error) as e:
+                # ffmpeg binary missing / failing -- keep the in-memory numbers
+                print(f"  ffmpeg failed ({type(e).__name__}: {e}), skipping ffmpeg path")
+                continue
+            with wave.open(out_file, "rb") as wf:
+                np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(
+                    np.float32
+                )
+            cpu = (time.process_time() - start) + (
+                children_cpu_seconds() - start_children
+            )
+            report("ffmpeg -> _converted.wav", cpu, seconds)
+
+
+class ConcatenateAudioChunk:
+    """The previous AudioChunk.append_audio_data (np.concatenate per append)."""
+
+    def __init__(self):
+        self._samples = np.array([], dtype=np.float32)
+
+    def append_audio_data(self, audio_data: np.ndarray):
+        self._samples = np.concatenate((self._samples, audio_data))
+
+    def __len__(self):
+        return len(self._samples)
+
+
+def bench_append(
+    seconds: float = 3600.0, sample_rate: int = 16000, block_size: int = 1024 * 4
+):
+    """AudioChunk / AudioStorage append throughput, concatenate vs. capacity buffer."""
+    print(f"[append] {seconds:.0f}s of {sample_rate}Hz audio in {block_size} sample blocks")
+    config = AudioConfig(sample_rate, 1, 8)
+    block = np.zeros(block_size, dtype=np.float32)
+    num_blocks = int(seconds * sample_rate) // block_size
+
+    def run(name: str, append, count: int = num_blocks):
+        start = time.perf_counter()
+        for _ in range(count):
+            append(block)
+        elapsed = time.perf_counter() - start
+        audio = count * block_size / sample_rate
+        print(
+            f"  {name:<36} {elapsed:8.3f} s  ({count * block_size / elapsed / 1e6:8.1f} M samples/s,"
+            f" {audio / elapsed:10.0f}x realtime)"
+        )
+
+    # a single chunk -- the old path is quadratic, so only a minute of it
+    one_minute = int(60 * sample_rate) // block_size
+    run("single chunk, 60s, concatenate", ConcatenateAudioChunk().append_audio_data, one_minute)
+    run("single chunk, 60s, capacity buffer", AudioChunk(config).append_audio_data, one_minute)
+    run("single chunk, 1h, capacity buffer", AudioChunk(config).append_audio_data)
+
+    # storage with 10s chunks (what run_whisper_core does)
+    chunks = []
+
+    def concatenate_storage_append(audio_data: np.ndarray):
+        if not chunks or len(chunks[-1]) >= 10 * sample_rate:
+            chunks.append(ConcatenateAudioChunk())
+        chunks[-1].append_audio_data(audio_data)
+
+    run("AudioStorage 10s chunks, concatenate", concatenate_storage_append)
+    run("AudioStorage 10s chunks, capacity", AudioStorage(config).append_audio)
+
+
+def bench_range(sample_rate: int = 16000, window: float = 5.0, reads: int = 2000):
+    """get_audio_range_seconds cost for the trailing window as a session grows."""
+    print(f"[range] {reads} reads of the last {window:.0f}s, 10s chunks")
+    config = AudioConfig(sample_rate, 1, 8)
+    block = np.zeros(sample_rate * 60, dtype=np.float32)
+
+    storage = AudioStorage(config)
+    stored = 0
+    for minutes in [1, 10, 60, 180]:
+        while stored < minutes:
+            storage.append_audio(block)
+            stored += 1
+
+        total = storage.get_total_duration_seconds()
+        start = time.perf_counter()
+        for i in range(reads):
+            # alternate between a read inside one chunk and one crossing a boundary
+            offset = window if i % 2 else window + 7.5
+            storage.get_audio_range_seconds(total - offset, total - offset + window)
+        elapsed = time.perf_counter() - start
+        print(f"  session {minutes:>4} min  {elapsed * 1e6 / reads:8.1f} us / read")
+
+
+def bench_storage_dtype(
+    sample_rate: int = 16000, minutes: int = 60, reads: int = 1000
+):
+    """float32 vs. int16 AudioStorage: memory per session + read (widening) cost."""
+    print(f"[dtype] {minutes} min session, {reads} reads per window")
+    config = AudioConfig(sample_rate, 1, 8)
+    block = (0.1 * np.random.default_rng(0).standard_normal(sample_rate * 60)).astype(
+        np.float32
+    )
+
+    for dtype in [np.float32, np.int16]:
+        storage = AudioStorage(config, sample_dtype=dtype)
+        for _ in range(minutes):
+            storage.append_audio(block)
+        stored = sum(chunk._buffer.nbytes for chunk in storage)
+        print(f" {np.dtype(dtype).name}: {stored / 1e6:8.1f} MB stored")
+
+        total = storage.get_total_samples()
+        for window in [5.0, 30.0]:
+            length = int(window * sample_rate)
+            start = time.perf_counter()
+            for _ in range(reads):
+                storage.get_audio_range_samples(total - length, total)
+            elapsed = time.perf_counter() - start
+            print(f"  last {window:4.0f}s read  {elapsed * 1e6 / reads:10.1f} us / read")
+
+
+def bench_codec(
+    seconds: float = 600.0, sample_rate: int = 16000, window: float = 5.0, reads: int = 200
+):
+    """Session file audio section: raw vs. flac / opus blocks -- size vs. read cost."""
+    try:
+        import soundfile  # noqa: F401
+    except ImportError:
+        print("[codec] soundfile not installed, skipping")
+        return
+
+    print(f"[codec] {seconds:.0f}s speech-like session, random {window:.0f}s range reads")
+    audio = (make_speechlike(seconds, sample_rate) * 32767).astype(np.int16)
+    raw_float32 = len(audio) * 4
+    length = int(window * sample_rate)
+    starts = np.random.default_rng(1).integers(0, len(audio) - length, reads)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in [None] + list(CODECS):
+            filename = os.path.join(tmp, f"{codec}.save")
+            start = time.perf_counter()
+            write_session(filename, sample_rate, np.int16, 0, [audio], [], codec=codec)
+            encode = time.perf_counter() - start
+            size = os.path.getsize(filename)
+
+            # full decode (what WhisperCoreSave.load does)
+            start = time.perf_counter()
+            np.array(SessionFile(filename).get_audio())
+            decode = time.perf_counter() - start
+
+            # range reads on a freshly opened file
+            session = SessionFile(filename)
+            start = time.perf_counter()
+            for i in starts:
+                np.array(session.get_audio_range_samples(int(i), int(i) + length))
+            read = time.perf_counter() - start
+
+            print(
+                f"  {codec or 'raw int16':<10} {size * 3600 / seconds / 1e6:7.1f} MB/h"
+                f"  ({raw_float32 / size:5.1f}x vs float32)"
+                f"  encode {seconds / encode:7.0f}x  decode {seconds / decode:7.0f}x realtime"
+                f"  {window:.0f}s read {read * 1000 / reads:7.2f} ms"
+            )
+
+
+# ------------------------------------------------------------ #
+# main
+# ------------------------------------------------------------ #
+
+BENCHMARKS = {
+    "preprocess": bench_preprocess,
+    "append": bench_append,
+    "range": bench_range,
+    "dtype": bench_storage_dtype,
+    "codec": bench_codec,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name} (choices: {', '.join(BENCHMARKS)})")
+            continue
+        BENCHMARKS[name]()
+        print()
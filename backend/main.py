@@ -24,7 +24,7 @@ import threading
 import os
 import dotenv
 
-from source import whispercore_main, sesame_main
+from source import whispercore_main, sesame_main, pipelinestate
 
 # ---------------------------------------------------------------------------- #
 
@@ -263,30 +263,12 @@ if __name__ == "__main__":
     # Run App
     # ----------------------------------------------------------------------------- #
 
-    GLOBAL_ARGS = {
-        # mic
-        "enable_mic": True,
-        "mic_mutex": threading.RLock(),
-        # whispercore
-        "enable_whispercore": True,
-        "whispercore_mutex": threading.RLock(),
-        # wake word
-        "wake_word_detected": False,
-        "wake_word_mutex": threading.RLock(),
-        # ---
-        # ---
-        # for thread -- disables duplicates
-        "threads_active": False,
-        "threads_controller_mutex": threading.RLock(),
-    }
-
-    # ------------------------------------------------------------------- #
-    # take over the threads controller mutex first
-    GLOBAL_ARGS["threads_controller_mutex"].acquire()
+    # shared mic / whispercore state -- starts out transcribing
+    PIPELINE_STATE = pipelinestate.PipelineState(pipelinestate.TRANSCRIBING)
 
     whispercore_thread = threading.Thread(
         target=whispercore_main.run_whisper_core,
-        args=(GLOBAL_ARGS,),
+        args=(PIPELINE_STATE,),
         daemon=True,
     )
     whispercore_thread.start()
@@ -298,8 +280,7 @@ if __name__ == "__main__":
     )
 
     # enable threads
-    GLOBAL_ARGS["threads_active"] = True
-    GLOBAL_ARGS["threads_controller_mutex"].release()
+    PIPELINE_STATE.mark_ready()
 
     # ------------------------------------------------------------------- #
     # create socket app
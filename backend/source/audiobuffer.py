@@ -0,0 +1,188 @@
+import numpy as np
+
+from typing import Dict, List, Tuple, Union
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+INT16_TO_FLOAT32 = np.float32(1.0 / 32768.0)
+
+
+# ------------------------------------------------------------ #
+# Ring Buffer
+# ------------------------------------------------------------ #
+
+
+class AudioRingBuffer:
+    """
+    Fixed capacity float32 ring buffer for a single producer and any number
+    of consumers (e.g. the wake word detector and the whisper loop).
+    dtype=np.int16 keeps raw PCM instead (write_int16 then copies as is).
+
+    The producer writes into a preallocated array and then publishes the new
+    write cursor. Cursors are absolute sample counts since creation, so each
+    consumer only needs to remember the last cursor it has read up to.
+
+    Nothing is allocated per write and no lock is taken: the write cursor is
+    a plain int that is only ever assigned by the producer thread. Overrun
+    stats have a single writer each -- the producer's counter, and one
+    counter per consumer name passed to read_since / read_range (use one
+    name per consumer thread).
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, not {capacity}")
+        if np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.int16)):
+            raise ValueError(f"Unsupported ring dtype: {np.dtype(dtype)}")
+
+        self._capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=dtype)
+
+        # absolute number of samples ever written (published by producer)
+        self._write_cursor = 0
+
+        # stats -- samples dropped because a write exceeded the capacity
+        # (producer) / because a consumer was lapped (consumer name -> count)
+        self._write_overrun_samples = 0
+        self._read_overrun_samples: Dict[str, int] = {}
+
+    # ------------------------------------------------------------ #
+    # producer functions
+
+    def write(self, audio_data: np.ndarray):
+        """Copy float32 samples into the ring."""
+        self._write(audio_data, scale=None)
+
+    def write_int16(self, audio_data: Union[bytes, np.ndarray]):
+        """Convert int16 PCM into float32 [-1.0, 1.0] directly inside the ring (int16 rings copy as is)."""
+        if isinstance(audio_data, (bytes, bytearray, memoryview)):
+            audio_data = np.frombuffer(audio_data, dtype=np.int16)
+        self._write(
+            audio_data, scale=None if self._buffer.dtype == np.int16 else INT16_TO_FLOAT32
+        )
+
+    def _write(self, audio_data: np.ndarray, scale: np.float32 = None):
+        count = len(audio_data)
+        if count == 0:
+            return
+
+        # only the newest `capacity` samples can be kept
+        if count > self._capacity:
+            self._write_overrun_samples += count - self._capacity
+            audio_data = audio_data[-self._capacity :]
+            skipped = count - self._capacity
+        else:
+            skipped = 0
+
+        cursor = self._write_cursor + skipped
+        start = cursor % self._capacity
+        first = min(len(audio_data), self._capacity - start)
+
+        # write in (at most) two pieces around the wrap point
+        self._copy_into(self._buffer[start : start + first], audio_data[:first], scale)
+        if first < len(audio_data):
+            self._copy_into(
+                self._buffer[: len(audio_data) - first], audio_data[first:], scale
+            )
+
+        # publish after the samples are in place
+        self._write_cursor = cursor + len(audio_data)
+
+    @staticmethod
+    def _copy_into(out: np.ndarray, src: np.ndarray, scale: np.float32 = None):
+        if scale is None:
+            np.copyto(out, src, casting="same_kind")
+        else:
+            np.multiply(src, scale, out=out, casting="unsafe")
+
+    # ------------------------------------------------------------ #
+    # consumer functions
+
+    def read_since(
+        self, cursor: int, contiguous: bool = False, consumer: str = None
+    ) -> Tuple[Union[List[np.ndarray], np.ndarray], int]:
+        """
+        Read every sample written after `cursor`.
+
+        Returns (data, new_cursor). By default data is a list of at most two
+        views into the ring (split at the wrap point). With contiguous=True a
+        single array is returned: a view if the range does not wrap, otherwise
+        one contiguous copy.
+
+        Views stay valid until the producer laps them, so copy them out
+        before the ring wraps around (i.e. within `capacity` samples).
+        """
+        end = self._write_cursor
+        return self.read_range(cursor, end, contiguous=contiguous, consumer=consumer), end
+
+    def read_range(
+        self,
+        start_cursor: int,
+        end_cursor: int,
+        contiguous: bool = False,
+        consumer: str = None,
+    ) -> Union[List[np.ndarray], np.ndarray]:
+        """
+        Read the samples in [start_cursor, end_cursor).
+
+        The range is clamped to what the ring still holds; lapped samples are
+        counted against `consumer`. Same view / copy semantics as read_since.
+        """
+        end_cursor = min(end_cursor, self._write_cursor)
+        oldest = max(0, self._write_cursor - self._capacity)
+
+        # consumer fell behind by more than the ring holds
+        if start_cursor < oldest:
+            self._read_overrun_samples[consumer] = (
+                self._read_overrun_samples.get(consumer, 0) + oldest - start_cursor
+            )
+            start_cursor = oldest
+        if start_cursor > end_cursor:
+            start_cursor = end_cursor
+
+        views = self._views(start_cursor, end_cursor)
+        if not contiguous:
+            return views
+
+        if not views:
+            return np.empty(0, dtype=self._buffer.dtype)
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views)
+
+    def _views(self, start_cursor: int, end_cursor: int) -> List[np.ndarray]:
+        count = end_cursor - start_cursor
+        if count <= 0:
+            return []
+
+        start = start_cursor % self._capacity
+        first = min(count, self._capacity - start)
+        views = [self._buffer[start : start + first]]
+        if first < count:
+            views.append(self._buffer[: count - first])
+        return views
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_write_cursor(self) -> int:
+        return self._write_cursor
+
+    def get_oldest_cursor(self) -> int:
+        return max(0, self._write_cursor - self._capacity)
+
+    def get_capacity(self) -> int:
+        return self._capacity
+
+    def get_overrun_samples(self, consumer: str = None) -> int:
+        """Samples lost by `consumer`, or by the producer + every consumer if None."""
+        if consumer is not None:
+            return self._read_overrun_samples.get(consumer, 0)
+        return self._write_overrun_samples + sum(self._read_overrun_samples.values())
+
+    def __len__(self):
+        """Number of samples currently held."""
+        return min(self._write_cursor, self._capacity)
@@ -0,0 +1,123 @@
+import ffmpeg
+import numpy as np
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+# whisper.cpp only accepts 16kHz mono float32
+WHISPER_SAMPLE_RATE = 16000
+
+INT16_TO_FLOAT32 = np.float32(1.0 / 32768.0)
+
+# bytes pulled from the pipe per read when decoding a whole file
+DECODE_BLOCK_BYTES = 1 << 16
+
+
+# ------------------------------------------------------------ #
+# Decoder
+# ------------------------------------------------------------ #
+
+
+class FFmpegStreamDecoder:
+    """
+    Decode any container ffmpeg understands into raw s16le PCM on a pipe.
+
+    Frames are read as ffmpeg produces them -- nothing is written to disk,
+    so the first samples are available right after ffmpeg starts instead of
+    after a whole converted file has been written.
+
+    Mirrors the parts of wave.Wave_read used by AsyncMicrophone
+    (readframes / getframerate / getnchannels / getsampwidth / close).
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        sample_rate: int = WHISPER_SAMPLE_RATE,
+        channels: int = 1,
+    ):
+        self._filename = filename
+        self._sample_rate = sample_rate
+        self._channels = channels
+        self._frame_bytes = 2 * channels
+
+        self._process = (
+            ffmpeg.input(filename)
+            .output(
+                "pipe:",
+                format="s16le",
+                acodec="pcm_s16le",
+                ar=sample_rate,
+                ac=channels,
+            )
+            .global_args("-hide_banner", "-loglevel", "error", "-nostdin")
+            .run_async(pipe_stdout=True)
+        )
+
+    # ------------------------------------------------------------ #
+    # wave.Wave_read style api
+
+    def readframes(self, num_frames: int) -> bytes:
+        """Read up to `num_frames` frames; returns b"" at end of stream."""
+        wanted = num_frames * self._frame_bytes
+        data = self._process.stdout.read(wanted)
+
+        # keep frames whole if the pipe handed back an odd split
+        remainder = len(data) % self._frame_bytes
+        if remainder:
+            data += self._process.stdout.read(self._frame_bytes - remainder)
+        return data
+
+    def getframerate(self) -> int:
+        return self._sample_rate
+
+    def getnchannels(self) -> int:
+        return self._channels
+
+    def getsampwidth(self) -> int:
+        return 2
+
+    def wait(self) -> int:
+        """Wait for ffmpeg to exit and return its exit code."""
+        return self._process.wait()
+
+    def close(self):
+        """Stop ffmpeg (if still running) and reap the process."""
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.stdout.close()
+        self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ------------------------------------------------------------ #
+# helper functions
+# ------------------------------------------------------------ #
+
+
+def decode_audio_file(
+    filename: str, sample_rate: int = WHISPER_SAMPLE_RATE
+) -> np.ndarray:
+    """Decode a whole file to float32 mono [-1.0, 1.0] without temporary files."""
+    pcm = bytearray()
+    with FFmpegStreamDecoder(filename, sample_rate, channels=1) as decoder:
+        while True:
+            block = decoder.readframes(DECODE_BLOCK_BYTES // 2)
+            if not block:
+                break
+            pcm += block
+
+        if decoder.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {filename}")
+
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    result = np.empty(len(samples), dtype=np.float32)
+    np.multiply(samples, INT16_TO_FLOAT32, out=result, casting="unsafe")
+    return result
@@ -0,0 +1,376 @@
+import numpy as np
+
+from math import gcd
+from typing import Tuple, Union
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+INT16_TO_FLOAT32 = np.float32(1.0 / 32768.0)
+
+# taps per polyphase branch -- higher = sharper anti-aliasing filter
+DEFAULT_TAPS_PER_PHASE = 32
+DEFAULT_KAISER_BETA = 8.0
+
+
+# ------------------------------------------------------------ #
+# Resampling
+# ------------------------------------------------------------ #
+
+
+def design_lowpass(up: int, down: int, taps_per_phase: int, beta: float) -> np.ndarray:
+    """Kaiser windowed-sinc lowpass for a rational up/down resampler."""
+    num_taps = taps_per_phase * up
+    cutoff = 1.0 / max(up, down)  # relative to the upsampled nyquist
+
+    n = np.arange(num_taps) - (num_taps - 1) / 2.0
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(num_taps, beta)
+
+    # unity DC gain per output sample after zero stuffing
+    taps *= up / np.sum(taps)
+    return taps.astype(np.float32)
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler (input_rate -> output_rate).
+
+    The FIR is split into `up` polyphase branches so only the taps that hit
+    real input samples are evaluated. The last (taps_per_phase - 1) input
+    samples and the output phase are carried across calls, so feeding a
+    signal in blocks produces the same output as feeding it in one go.
+    """
+
+    def __init__(
+        self,
+        input_rate: int,
+        output_rate: int,
+        taps_per_phase: int = DEFAULT_TAPS_PER_PHASE,
+        beta: float = DEFAULT_KAISER_BETA,
+    ):
+        divisor = gcd(input_rate, output_rate)
+        self._up = output_rate // divisor
+        self._down = input_rate // divisor
+        self._input_rate = input_rate
+        self._output_rate = output_rate
+
+        # polyphase matrix: row p holds taps p, p + up, p + 2up, ... reversed
+        # so that a window of input samples (oldest -> newest) can be dotted
+        taps = design_lowpass(self._up, self._down, taps_per_phase, beta)
+        self._num_taps_per_phase = taps_per_phase
+        self._phases = taps.reshape(taps_per_phase, self._up).T[:, ::-1].copy()
+
+        # streaming state
+        self._history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self._input_count = 0  # total input samples consumed
+        self._output_count = 0  # total output samples produced
+
+        # scratch buffer reused between calls (history + new block)
+        self._extended = np.zeros(0, dtype=np.float32)
+
+    def process(self, audio_data: np.ndarray) -> np.ndarray:
+        """Resample a block of float32 mono audio."""
+        if self._up == self._down:
+            return audio_data
+
+        count = len(audio_data)
+        if count == 0:
+            return np.empty(0, dtype=np.float32)
+
+        # [history | block] in a reused scratch buffer
+        history_size = len(self._history)
+        needed = history_size + count
+        if len(self._extended) < needed:
+            self._extended = np.empty(needed * 2, dtype=np.float32)
+        extended = self._extended[:needed]
+        extended[:history_size] = self._history
+        extended[history_size:] = audio_data
+
+        # extended[0] is global input sample `first_index`
+        first_index = self._input_count - history_size
+        total_input = self._input_count + count
+
+        # every output n whose newest input sample (n * down // up) exists
+        end_output = (total_input * self._up + self._down - 1) // self._down
+        n = np.arange(self._output_count, end_output, dtype=np.int64)
+        position = n * self._down
+        newest = position // self._up
+        phase = position % self._up
+
+        # gather windows of input (oldest -> newest) and apply each branch
+        windows = np.lib.stride_tricks.sliding_window_view(
+            extended, self._num_taps_per_phase
+        )
+        result = np.einsum(
+            "ij,ij->i",
+            windows[newest - (self._num_taps_per_phase - 1) - first_index],
+            self._phases[phase],
+        ).astype(np.float32, copy=False)
+
+        # carry state to the next block
+        self._history[:] = extended[needed - history_size :]
+        self._input_count = total_input
+        self._output_count = end_output
+        return result
+
+    def reset(self):
+        self._history[:] = 0.0
+        self._input_count = 0
+        self._output_count = 0
+
+    def get_ratio(self) -> float:
+        return self._output_rate / self._input_rate
+
+
+# ------------------------------------------------------------ #
+# Preprocessing
+# ------------------------------------------------------------ #
+
+
+class AudioPreprocessor:
+    """
+    In-memory capture stage: int16 interleaved PCM -> float32 mono at the
+    desired sample rate.
+
+    Downmixing sums the channel columns into a reused buffer, and
+    resampling is done by a stateful PolyphaseResampler.
+    """
+
+    def __init__(self, input_rate: int, channels: int, output_rate: int):
+        self._input_rate = input_rate
+        self._channels = channels
+        self._output_rate = output_rate
+
+        self._resampler = (
+            PolyphaseResampler(input_rate, output_rate)
+            if input_rate != output_rate
+            else None
+        )
+
+        # int16 sum -> float32 [-1.0, 1.0] average, in one multiply
+        self._scale = np.float32(1.0 / (32768.0 * channels))
+        self._mono = np.zeros(0, dtype=np.float32)
+
+    def is_passthrough(self) -> bool:
+        """True if the input is already mono at the output rate."""
+        return self._channels == 1 and self._resampler is None
+
+    def process(self, raw: Union[bytes, np.ndarray]) -> np.ndarray:
+        """
+        Convert a block of interleaved int16 PCM.
+
+        The returned array may be a view of an internal buffer that is
+        reused on the next call -- copy it out before calling again.
+        """
+        if isinstance(raw, (bytes, bytearray, memoryview)):
+            raw = np.frombuffer(raw, dtype=np.int16)
+
+        frames = raw.reshape(-1, self._channels)
+        count = len(frames)
+        if len(self._mono) < count:
+            self._mono = np.empty(count * 2, dtype=np.float32)
+        mono = self._mono[:count]
+
+        # vectorized downmix (sum of channels, scaled once)
+        np.sum(frames, axis=1, dtype=np.float32, out=mono)
+        np.multiply(mono, self._scale, out=mono)
+
+        if self._resampler is None:
+            return mono
+        return self._resampler.process(mono)
+
+    def reset(self):
+        if self._resampler is not None:
+            self._resampler.reset()
+
+
+# ------------------------------------------------------------ #
+# Voice Activity Detection
+# ------------------------------------------------------------ #
+
+
+class VoiceActivityDetector:
+    """
+    Frame based energy / zero-crossing / spectral flatness VAD.
+
+    A frame counts as speech when it is loud enough (relative to a tracked
+    noise floor and an absolute minimum) and looks like speech rather than
+    broadband noise: low spectral flatness or a voiced zero-crossing rate.
+    Decisions are smoothed with a hangover so short pauses inside a phrase
+    stay marked as speech.
+
+    Blocks of any size can be fed; a partial trailing frame is carried over.
+    Frame decisions are kept (1 byte per frame) so callers can ask where
+    speech happened in absolute sample coordinates.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: float = 30.0,
+        energy_margin_db: float = 10.0,
+        min_energy_db: float = -55.0,
+        flatness_threshold: float = 0.35,
+        zcr_threshold: float = 0.25,
+        hangover_ms: float = 300.0,
+        noise_floor_adapt: float = 0.95,
+    ):
+        self._sample_rate = sample_rate
+        self._frame_length = int(sample_rate * frame_ms / 1000.0)
+        self._energy_margin_db = energy_margin_db
+        self._min_energy_db = min_energy_db
+        self._flatness_threshold = flatness_threshold
+        self._zcr_threshold = zcr_threshold
+        self._hangover_frames = int(round(hangover_ms / frame_ms))
+        self._noise_floor_adapt = noise_floor_adapt
+
+        self._window = np.hanning(self._frame_length).astype(np.float32)
+        self._pending = np.zeros(self._frame_length, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self._pending_count = 0
+        self._frame_count = 0
+        self._last_speech_frame = -(1 << 62)
+        self._noise_floor_db = self._min_energy_db
+        self._flags = np.zeros(1024, dtype=np.uint8)
+
+    # ------------------------------------------------------------ #
+    # processing
+
+    def process(self, audio_data: np.ndarray) -> np.ndarray:
+        """Feed a block of float32 mono audio; returns speech flags for each completed frame."""
+        if len(audio_data) == 0:
+            return np.zeros(0, dtype=bool)
+
+        # complete the partial frame left over from the last block
+        fill = min(self._frame_length - self._pending_count, len(audio_data))
+        self._pending[self._pending_count : self._pending_count + fill] = audio_data[
+            :fill
+        ]
+        self._pending_count += fill
+        audio_data = audio_data[fill:]
+
+        blocks = []
+        if self._pending_count == self._frame_length:
+            blocks.append(self._pending[None, :])
+            self._pending_count = 0
+
+        # whole frames of the remaining block (a view, no copy)
+        whole = (len(audio_data) // self._frame_length) * self._frame_length
+        if whole:
+            blocks.append(audio_data[:whole].reshape(-1, self._frame_length))
+
+        flags = np.zeros(0, dtype=bool)
+        if blocks:
+            frames = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+            flags = self._classify(frames)
+
+        # keep the tail for next time -- only after the completed pending
+        # frame (a view of the same buffer) was classified
+        tail = audio_data[whole:]
+        self._pending[: len(tail)] = tail
+        self._pending_count += len(tail)
+        return flags
+
+    def _classify(self, frames: np.ndarray) -> np.ndarray:
+        count = len(frames)
+
+        # frame energy in dB
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+        # zero crossing rate
+        crossings = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1)
+        zcr = crossings / self._frame_length
+
+        # spectral flatness (geometric / arithmetic mean of the power spectrum)
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        # raw decision
+        loud = (energy_db > self._noise_floor_db + self._energy_margin_db) & (
+            energy_db > self._min_energy_db
+        )
+        speech_like = (flatness < self._flatness_threshold) | (
+            zcr < self._zcr_threshold
+        )
+        raw = loud & speech_like
+
+        # hangover: frames within N frames of the last speech frame stay on
+        index = np.arange(self._frame_count, self._frame_count + count)
+        last_speech = np.where(raw, index, self._last_speech_frame)
+        np.maximum.accumulate(last_speech, out=last_speech)
+        smoothed = (index - last_speech) <= self._hangover_frames
+
+        # track the noise floor on non speech frames (fast down, slow up)
+        quiet = energy_db[~raw]
+        if len(quiet):
+            candidate = float(np.percentile(quiet, 10))
+            if candidate < self._noise_floor_db:
+                self._noise_floor_db = candidate
+            else:
+                self._noise_floor_db = (
+                    self._noise_floor_adapt * self._noise_floor_db
+                    + (1.0 - self._noise_floor_adapt) * candidate
+                )
+
+        # store decisions
+        self._store_flags(smoothed)
+        self._last_speech_frame = int(last_speech[-1])
+        self._frame_count += count
+        return smoothed
+
+    def _store_flags(self, flags: np.ndarray):
+        end = self._frame_count + len(flags)
+        if end > len(self._flags):
+            grown = np.zeros(max(end, len(self._flags) * 2), dtype=np.uint8)
+            grown[: self._frame_count] = self._flags[: self._frame_count]
+            self._flags = grown
+        self._flags[self._frame_count : end] = flags
+
+    # ------------------------------------------------------------ #
+    # queries (absolute sample positions since reset)
+
+    def get_processed_samples(self) -> int:
+        return self._frame_count * self._frame_length
+
+    def get_last_speech_sample(self) -> int:
+        """End sample of the last (hangover smoothed) speech frame, 0 if none."""
+        if self._last_speech_frame < 0:
+            return 0
+        last = min(
+            self._last_speech_frame + self._hangover_frames, self._frame_count - 1
+        )
+        return (last + 1) * self._frame_length
+
+    def get_speech_bounds(
+        self, start_sample: int, end_sample: int, padding_ms: float = 200.0
+    ) -> Tuple[int, int]:
+        """
+        Trim leading/trailing non-speech off [start_sample, end_sample).
+
+        Returns the padded (start, end) sample range that contains speech, or
+        None if no speech frame lies in the range. If speech runs up to the
+        last classified frame, the not yet classified tail is kept as well.
+        """
+        first_frame = max(0, start_sample // self._frame_length)
+        last_frame = min(self._frame_count, -(-end_sample // self._frame_length))
+
+        speech = np.flatnonzero(self._flags[first_frame:last_frame])
+        if len(speech) == 0:
+            return None
+
+        padding = int(self._sample_rate * padding_ms / 1000.0)
+        speech_start = (first_frame + speech[0]) * self._frame_length
+        speech_end = (first_frame + speech[-1] + 1) * self._frame_length
+        if speech_end >= self.get_processed_samples():
+            # speech is still ongoing
+            speech_end = end_sample
+
+        # plain ints -- the bounds end up in segment times / the journal
+        return (
+            int(max(start_sample, speech_start - padding)),
+            int(min(end_sample, speech_end + padding)),
+        )
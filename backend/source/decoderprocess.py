@@ -0,0 +1,225 @@
+import multiprocessing
+import threading
+
+from typing import Any, Callable, Dict, List, Tuple
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+# (t0, t1, text) as whisper.cpp reports it -- times in centiseconds
+RawSegment = Tuple[int, int, str]
+
+# seconds the parent waits for the child to load its model
+DEFAULT_START_TIMEOUT = 300.0
+
+# seconds between should_continue checks while a decode runs
+POLL_INTERVAL = 0.01
+
+# seconds close() waits for the child before terminating it
+CLOSE_TIMEOUT = 5.0
+
+
+def load_whisper_model(model: str, **kwargs):
+    """Default model factory -- runs in the decoder process."""
+    from pywhispercpp.model import Model
+
+    return Model(model, **kwargs)
+
+
+# ------------------------------------------------------------ #
+# Child process
+# ------------------------------------------------------------ #
+
+
+def _decoder_main(conn, model_factory, model: str, kwargs: Dict[str, Any]):
+    """Load the model, then serve (audio, params, stream) requests until None / EOF."""
+    try:
+        _model = model_factory(model, **kwargs)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", None))
+
+    def send_segment(segment):
+        conn.send(("segment", (segment.t0, segment.t1, segment.text)))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        audio, params, stream = request
+        try:
+            results = _model.transcribe(
+                audio, new_segment_callback=send_segment if stream else None, **params
+            )
+            conn.send(("done", [(x.t0, x.t1, x.text) for x in results]))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+# ------------------------------------------------------------ #
+# Decoder process
+# ------------------------------------------------------------ #
+
+
+class DecoderProcess:
+    """
+    A whisper model loaded in its own process.
+
+    pywhispercpp holds the GIL for the whole whisper_full call, so a decode
+    on a thread of this process would stall every other Python thread (mic
+    reads, the update cadence, the segment event forwarder, a second model)
+    until it returns. The calling thread here only waits on a pipe, which
+    releases the GIL; one DecoderProcess per model lets two models decode at
+    the same time.
+
+    transcribe() calls are serialised -- one decode per process at a time.
+
+    Cancellation: whisper.cpp's only abort hook reachable from pywhispercpp
+    (encoder_begin_callback) fires once per 30 s encoder window, i.e. never
+    inside a streaming clip. A decode is aborted by terminating the child
+    instead: once should_continue returns False (polled every
+    POLL_INTERVAL) or abort() is called, the child is killed and a fresh
+    one is started in its place. transcribe() returns ([], True) right
+    away; the next decode waits until the new child has loaded its model.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        model_factory: Callable[..., Any] = load_whisper_model,
+        start_timeout: float = DEFAULT_START_TIMEOUT,
+        **kwargs,
+    ):
+        self._model = model
+        self._model_factory = model_factory
+        self._start_timeout = start_timeout
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._restarts = 0
+
+        # spawn -- the child must not inherit the parent's threads / locks
+        self._context = multiprocessing.get_context("spawn")
+        self._spawn()
+        self._wait_ready()
+
+    def _spawn(self):
+        """Start a child -- it loads the model in the background."""
+        self._conn, _child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_decoder_main,
+            args=(_child_conn, self._model_factory, self._model, self._kwargs),
+            name="WhisperDecoder",
+            daemon=True,
+        )
+        self._process.start()
+        _child_conn.close()
+        self._ready = False
+
+    def _wait_ready(self):
+        """Block until the child has loaded its model."""
+        if self._ready:
+            return
+        _kind, _payload = None, "timed out"
+        try:
+            if self._conn.poll(self._start_timeout):
+                _kind, _payload = self._conn.recv()
+        except EOFError:
+            _payload = "exited"
+        if _kind != "ready":
+            self.close()
+            raise RuntimeError(f"Decoder process for {self._model} failed to start: {_payload}")
+        self._ready = True
+
+    def _restart(self):
+        """Kill the child (and its running decode), start a fresh one."""
+        self._process.terminate()
+        self._process.join()
+        self._conn.close()
+        self._restarts += 1
+        self._spawn()
+
+    def transcribe(
+        self,
+        audio_data,
+        params: Dict[str, Any] = None,
+        on_segment: Callable[[RawSegment], None] = None,
+        should_continue: Callable[[], bool] = None,
+    ) -> Tuple[List[RawSegment], bool]:
+        """
+        Decode `audio_data` in the child -> (segments, aborted).
+
+        on_segment: called (on this thread) with every segment as soon as
+        whisper.cpp finalizes it
+        """
+        with self._lock:
+            self._abort.clear()
+            _error = None
+            try:
+                self._wait_ready()
+                self._conn.send((audio_data, params or {}, on_segment is not None))
+                while True:
+                    if self._abort.is_set() or (
+                        should_continue is not None and not should_continue()
+                    ):
+                        self._restart()
+                        return ([], True)
+                    if not self._conn.poll(POLL_INTERVAL):
+                        continue
+
+                    _kind, _payload = self._conn.recv()
+                    if _kind == "segment":
+                        if on_segment is not None and _error is None:
+                            # read on to "done" -- the next decode must not
+                            # receive this one's messages
+                            try:
+                                on_segment(_payload)
+                            except Exception as e:
+                                _error = e
+                    elif _kind == "done":
+                        if _error is not None:
+                            raise _error
+                        return (_payload, False)
+                    else:
+                        raise RuntimeError(f"Decode failed: {_payload}")
+            except (EOFError, BrokenPipeError) as e:
+                raise RuntimeError(f"Decoder process for {self._model} exited") from e
+
+    def abort(self):
+        """Abort the running decode from another thread (no-op while idle)."""
+        self._abort.set()
+
+    def close(self):
+        """Stop the child (waits for a running decode up to CLOSE_TIMEOUT)."""
+        try:
+            self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(CLOSE_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._conn.close()
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_model(self) -> str:
+        return self._model
+
+    def get_pid(self) -> int:
+        return self._process.pid
+
+    def get_restarts(self) -> int:
+        """Children started in place of an aborted one."""
+        return self._restarts
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
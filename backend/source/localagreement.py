@@ -0,0 +1,140 @@
+import re
+
+from typing import List, Tuple
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+# (t0 millis, t1 millis, text) -- absolute session time
+Word = Tuple[int, int, str]
+
+# longest run of words checked when a decode re-emits the committed tail
+MAX_OVERLAP_WORDS = 5
+
+# words starting this close before the committed end still count as new
+COMMIT_TOLERANCE_MILLIS = 100
+
+# whisper context prompt is capped at half its 448 token window
+DEFAULT_PROMPT_CHARS = 200
+
+_NORMALIZE_PATTERN = re.compile(r"[^\w']+")
+
+
+def _normalize(text: str) -> str:
+    """Compare words without case / punctuation."""
+    return _NORMALIZE_PATTERN.sub("", text.lower())
+
+
+# ------------------------------------------------------------ #
+# Local Agreement
+# ------------------------------------------------------------ #
+
+
+class LocalAgreement:
+    """
+    LocalAgreement-2 streaming policy.
+
+    Every decode produces a hypothesis (a list of timestamped words). A word
+    is committed once two consecutive hypotheses agree on it -- the longest
+    common prefix of the previous and the new hypothesis. Committed words are
+    final: audio before get_committed_end() is not decoded again and the
+    committed text is fed back to whisper as the initial prompt.
+    """
+
+    def __init__(self):
+        self._committed: List[Word] = []
+        # uncommitted words of the last hypothesis
+        self._tentative: List[Word] = []
+        self._committed_end = 0
+
+    # ------------------------------------------------------------ #
+    # hypothesis functions
+
+    def insert(self, words: List[Word]) -> List[Word]:
+        """Feed a new hypothesis; returns the words it committed."""
+        # drop words of audio that was already committed
+        words = [
+            w
+            for w in words
+            if _normalize(w[2]) and w[0] > self._committed_end - COMMIT_TOLERANCE_MILLIS
+        ]
+
+        # a decode starting at the committed end often repeats its last words
+        if words and self._committed:
+            for n in range(
+                min(len(self._committed), len(words), MAX_OVERLAP_WORDS), 0, -1
+            ):
+                _tail = [_normalize(w[2]) for w in self._committed[-n:]]
+                _head = [_normalize(w[2]) for w in words[:n]]
+                if _tail == _head:
+                    words = words[n:]
+                    break
+
+        # longest common prefix with the previous hypothesis
+        _count = 0
+        for previous, word in zip(self._tentative, words):
+            if _normalize(previous[2]) != _normalize(word[2]):
+                break
+            _count += 1
+
+        committed = words[:_count]
+        self._tentative = words[_count:]
+        self._commit(committed)
+        return committed
+
+    def force_commit_before(self, millis: int) -> List[Word]:
+        """Commit tentative words ending before `millis` without agreement."""
+        _count = 0
+        while _count < len(self._tentative) and self._tentative[_count][1] <= millis:
+            _count += 1
+
+        committed = self._tentative[:_count]
+        self._tentative = self._tentative[_count:]
+        self._commit(committed)
+
+        # nothing to keep before the new start even without words
+        self._committed_end = max(self._committed_end, millis)
+        return committed
+
+    def _commit(self, words: List[Word]):
+        if not words:
+            return
+        self._committed.extend(words)
+        self._committed_end = max(self._committed_end, words[-1][1])
+
+    def reset(self):
+        self._committed = []
+        self._tentative = []
+        self._committed_end = 0
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_committed_end(self) -> int:
+        """Millis up to which the transcript is final."""
+        return self._committed_end
+
+    def get_committed_words(self) -> List[Word]:
+        return list(self._committed)
+
+    def get_tentative_words(self) -> List[Word]:
+        return list(self._tentative)
+
+    def get_committed_text(self) -> str:
+        return " ".join(w[2] for w in self._committed)
+
+    def get_tentative_text(self) -> str:
+        return " ".join(w[2] for w in self._tentative)
+
+    def get_prompt(self, max_chars: int = DEFAULT_PROMPT_CHARS) -> str:
+        """Tail of the committed text (whole words) for whisper's initial_prompt."""
+        _words = []
+        _length = 0
+        for word in reversed(self._committed):
+            _length += len(word[2]) + 1
+            if _length > max_chars:
+                break
+            _words.append(word[2])
+        return " ".join(reversed(_words))
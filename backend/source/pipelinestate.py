@@ -0,0 +1,149 @@
+import threading
+import time
+
+from typing import Dict, List, Tuple
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+IDLE = "idle"  # waiting for the wake word
+LISTENING = "listening"  # wake word detected, transcription starting up
+TRANSCRIBING = "transcribing"  # whisper loop is running
+COMPLETING = "completing"  # inactivity reached, wrapping up the session
+STOPPED = "stopped"  # shutting down -- terminal
+
+ALLOWED_TRANSITIONS = {
+    IDLE: (LISTENING, STOPPED),
+    LISTENING: (TRANSCRIBING, IDLE, STOPPED),
+    TRANSCRIBING: (COMPLETING, STOPPED),
+    COMPLETING: (IDLE, STOPPED),
+    STOPPED: (),
+}
+
+# how many transitions are kept for latency measurement
+MAX_HISTORY = 256
+
+
+# ------------------------------------------------------------ #
+# Pipeline State
+# ------------------------------------------------------------ #
+
+
+class PipelineState:
+    """
+    Shared state between the mic thread and the whisper loop.
+
+    IDLE -> LISTENING -> TRANSCRIBING -> COMPLETING -> IDLE
+
+    Transitions go through a single Condition, so threads blocked in
+    wait_for() are woken as soon as the state they wait on is entered
+    instead of polling. Every transition is timestamped (time.monotonic)
+    for latency measurement.
+    """
+
+    def __init__(self, initial_state: str = IDLE):
+        if initial_state not in ALLOWED_TRANSITIONS:
+            raise ValueError(f"Unknown pipeline state: {initial_state}")
+
+        self._condition = threading.Condition()
+        self._state = initial_state
+
+        # (from_state, to_state, monotonic timestamp)
+        self._history: List[Tuple[str, str, float]] = [
+            (None, initial_state, time.monotonic())
+        ]
+        self._entered_at: Dict[str, float] = {initial_state: self._history[0][2]}
+
+        # start up gating + duplicate thread checks
+        self._ready = threading.Event()
+        self._controller_lock = threading.RLock()
+
+    # ------------------------------------------------------------ #
+    # transitions
+
+    def transition(self, new_state: str, expected: Tuple[str, ...] = None) -> bool:
+        """
+        Move to `new_state` and wake every waiter.
+
+        If `expected` is given the transition only happens when the current
+        state is one of them. Returns False if the transition was skipped.
+        Raises ValueError for transitions the state machine does not allow.
+        """
+        with self._condition:
+            if expected is not None and self._state not in expected:
+                return False
+            if self._state == new_state:
+                return False
+            if new_state not in ALLOWED_TRANSITIONS[self._state]:
+                raise ValueError(f"Invalid transition: {self._state} -> {new_state}")
+
+            now = time.monotonic()
+            self._history.append((self._state, new_state, now))
+            if len(self._history) > MAX_HISTORY:
+                del self._history[0]
+            self._entered_at[new_state] = now
+
+            self._state = new_state
+            self._condition.notify_all()
+            return True
+
+    def stop(self):
+        """Enter STOPPED from any state (releases every waiter)."""
+        self.transition(STOPPED)
+
+    def wait_for(self, *states: str, timeout: float = None) -> str:
+        """
+        Block until the pipeline is in one of `states` (or STOPPED).
+
+        Returns the state that was reached, or None on timeout.
+        """
+        targets = set(states) | {STOPPED}
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._state in targets, timeout=timeout
+            ):
+                return None
+            return self._state
+
+    # ------------------------------------------------------------ #
+    # start up
+
+    def mark_ready(self):
+        """Signal that the server is up and worker threads may start."""
+        self._ready.set()
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def get_controller_lock(self) -> threading.RLock:
+        """Lock guarding thread start up / duplicate thread checks."""
+        return self._controller_lock
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_state(self) -> str:
+        return self._state
+
+    def is_in(self, *states: str) -> bool:
+        return self._state in states
+
+    def get_entered_at(self, state: str) -> float:
+        """Monotonic timestamp of the last time `state` was entered (None if never)."""
+        with self._condition:
+            return self._entered_at.get(state)
+
+    def get_latency(self, from_state: str, to_state: str) -> float:
+        """Seconds between the last entries into `from_state` and `to_state`."""
+        with self._condition:
+            start = self._entered_at.get(from_state)
+            end = self._entered_at.get(to_state)
+        if start is None or end is None or end < start:
+            return None
+        return end - start
+
+    def get_history(self) -> List[Tuple[str, str, float]]:
+        with self._condition:
+            return list(self._history)
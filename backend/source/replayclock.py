@@ -0,0 +1,128 @@
+import threading
+import time
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+# replay_speed value meaning "as fast as the consumer drains"
+REPLAY_LOCKSTEP = 0.0
+
+
+# ------------------------------------------------------------ #
+# Clocks
+# ------------------------------------------------------------ #
+
+
+class SystemClock:
+    """Wall clock used for live capture."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def is_lockstep(self) -> bool:
+        return False
+
+    # producer hooks -- nothing to pace against a live device
+    def wait_for_demand(self) -> bool:
+        return True
+
+    def advance(self, seconds: float):
+        pass
+
+    def finish(self):
+        pass
+
+
+class ReplayClock:
+    """
+    Virtual clock for replaying recorded audio through the streaming pipeline.
+
+    - speed > 0: virtual time runs at `speed` x wall time, and the producer
+      is paced against an absolute schedule (no drift from per-chunk sleeps)
+    - speed == REPLAY_LOCKSTEP: virtual time only moves when the consumer
+      sleeps. Each sleep hands the producer a demand horizon and blocks until
+      audio up to that horizon has been produced, so every tick sees exactly
+      the same audio no matter how long transcription takes.
+    """
+
+    def __init__(self, speed: float = 1.0):
+        if speed < 0:
+            raise ValueError(f"replay speed must be >= 0, not {speed}")
+
+        self._speed = speed
+        self._origin = time.monotonic()
+
+        # virtual time requested by the consumer (lockstep only)
+        self._now = 0.0
+        # seconds of audio pushed by the producer
+        self._produced = 0.0
+        self._finished = False
+        self._condition = threading.Condition()
+
+    def is_lockstep(self) -> bool:
+        return self._speed == REPLAY_LOCKSTEP
+
+    # ------------------------------------------------------------ #
+    # consumer functions
+
+    def time(self) -> float:
+        """Seconds of virtual time since replay started."""
+        if self.is_lockstep():
+            return self._now
+        return (time.monotonic() - self._origin) * self._speed
+
+    def sleep(self, seconds: float):
+        """Sleep in virtual time."""
+        if seconds <= 0:
+            return
+        if not self.is_lockstep():
+            time.sleep(seconds / self._speed)
+            return
+
+        with self._condition:
+            self._now += seconds
+            self._condition.notify_all()
+
+            # wait until the producer has caught up with the new horizon
+            self._condition.wait_for(
+                lambda: self._finished or self._produced >= self._now
+            )
+
+    # ------------------------------------------------------------ #
+    # producer functions
+
+    def wait_for_demand(self) -> bool:
+        """
+        Block until the next block of audio is due.
+
+        Returns False once the clock has been finished.
+        """
+        if not self.is_lockstep():
+            delay = self._origin + self._produced / self._speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            return not self._finished
+
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._finished or self._produced < self._now
+            )
+            return not self._finished
+
+    def advance(self, seconds: float):
+        """Record that `seconds` of audio were pushed."""
+        with self._condition:
+            self._produced += seconds
+            self._condition.notify_all()
+
+    def finish(self):
+        """Release all waiters (end of file / stop)."""
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
@@ -3,6 +3,9 @@ import requests
 import json
 
 
+# (connect, read) seconds -- a hung backend must not stall the caller
+REQUEST_TIMEOUT = (2.0, 5.0)
+
 
 # ------------------------------------------------------------ #
 # Requests Handler 
@@ -14,7 +17,7 @@ def send_post_request(url: str, data: dict):
     """
 
     try:
-        response = requests.post(url, json=data)
+        response = requests.post(url, json=data, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()  # Raise an error for bad responses
         return response.json()  # Return the JSON response
     except requests.exceptions.RequestException as e:
@@ -27,7 +30,7 @@ def send_get_request(url: str, params: dict = None):
     """
     
     try:
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()  # Raise an error for bad responses
         return response.json()  # Return the JSON response
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,116 @@
+import collections
+import threading
+
+from typing import Any, Iterator, Tuple
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+# events waiting for the consumer -- the oldest is dropped past this
+DEFAULT_MAX_PENDING = 32
+
+
+# ------------------------------------------------------------ #
+# Segment Events
+# ------------------------------------------------------------ #
+
+
+class SegmentEventQueue:
+    """
+    Bounded queue of live segment events between the decoder and a (slow)
+    consumer, e.g. the thread posting them to the backend.
+
+    - publish(..., merge=True) replaces the state of the last pending event
+      instead of queueing another one, so a consumer that falls behind gets
+      the latest state of a segment, not every intermediate one
+    - events published with a decode id are provisional: drop(decode)
+      removes the pending ones of a cancelled decode, confirm(decode) keeps
+      them. Events only merge with events of the same decode.
+    - clear() starts a new session generation; pending events of the old
+      session are not delivered
+    - events dropped because the consumer was behind are counted
+      (get_dropped), reported on the first drop and again on close()
+    """
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING):
+        self._max_pending = max_pending
+        # [event, segment, decode id]
+        self._events = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._generation = 0
+        self._dropped = 0
+
+    def publish(self, event: Any, segment: Any, decode: int = None, merge: bool = False):
+        with self._cond:
+            _last = self._events[-1] if self._events else None
+            if merge and _last is not None and _last[2] == decode:
+                _last[1] = segment
+                return
+
+            if len(self._events) >= self._max_pending:
+                self._events.popleft()
+                self._dropped += 1
+                if self._dropped == 1:
+                    print("Segment event consumer is behind, dropping the oldest events")
+            self._events.append([event, segment, decode])
+            self._cond.notify()
+
+    def drop(self, decode: int):
+        """Forget the pending events of a cancelled decode."""
+        with self._cond:
+            _kept = [x for x in self._events if x[2] != decode]
+            self._events.clear()
+            self._events.extend(_kept)
+
+    def confirm(self, decode: int):
+        """The decode completed -- its pending events stand."""
+        with self._cond:
+            for item in self._events:
+                if item[2] == decode:
+                    item[2] = None
+
+    def clear(self):
+        """New session -- pending events of the old one are not delivered."""
+        with self._cond:
+            self._generation += 1
+            self._events.clear()
+
+    def close(self):
+        """End iter() once the pending events are consumed."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._dropped:
+            print(f"Segment event consumer fell behind, {self._dropped} events dropped")
+
+    def iter(self, timeout: float = None) -> Iterator[Tuple[Any, Any]]:
+        """
+        Yield (event, segment) as they are published.
+
+        Ends after close() or once no event arrived within `timeout` seconds.
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._events or self._closed, timeout=timeout)
+                if not self._events:
+                    return
+                _event, _segment, _ = self._events.popleft()
+            yield (_event, _segment)
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_generation(self) -> int:
+        """Bumped by every clear()."""
+        return self._generation
+
+    def get_dropped(self) -> int:
+        """Events dropped because the consumer was behind."""
+        return self._dropped
+
+    def __len__(self):
+        with self._cond:
+            return len(self._events)
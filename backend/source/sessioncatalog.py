@@ -0,0 +1,369 @@
+import glob
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from typing import List
+
+from source.sessionformat import SessionFile
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+CATALOG_FILE = "catalog.sqlite3"
+SESSION_SUFFIX = ".session"
+
+# characters of transcript kept in the catalog for listings
+EXCERPT_CHARS = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    duration REAL NOT NULL,
+    segment_count INTEGER NOT NULL,
+    excerpt TEXT NOT NULL,
+    codec TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_start_time ON sessions (start_time);
+"""
+
+# full-text index over segment text, one row per segment
+_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS segment_text USING fts5 (
+    text,
+    session_id UNINDEXED,
+    segment_index UNINDEXED,
+    t0 UNINDEXED,
+    t1 UNINDEXED,
+    start_sample UNINDEXED,
+    end_sample UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+_COLUMNS = "session_id, filename, start_time, duration, segment_count, excerpt, codec"
+
+
+# ------------------------------------------------------------ #
+# Catalog
+# ------------------------------------------------------------ #
+
+
+class SessionEntry:
+    """Catalog row of a stored session -- no audio / segments attached."""
+
+    def __init__(
+        self,
+        session_id: str,
+        filename: str,
+        start_time: float,
+        duration: float,
+        segment_count: int,
+        excerpt: str,
+        codec: str = None,
+    ):
+        self.session_id = session_id
+        self.filename = filename
+        self.start_time = start_time
+        self.duration = duration
+        self.segment_count = segment_count
+        self.excerpt = excerpt
+        self.codec = codec
+
+    def __repr__(self):
+        return (
+            f"SessionEntry({self.session_id}, {time.ctime(self.start_time)}, "
+            f"{self.duration:.1f} s, {self.segment_count} segments)"
+        )
+
+
+class SearchHit:
+    """A segment matching a transcript search -- session, time range + audio range."""
+
+    def __init__(
+        self,
+        session_id: str,
+        segment_index: int,
+        t0: int,
+        t1: int,
+        start_sample: int,
+        end_sample: int,
+        text: str,
+        snippet: str,
+        score: float,
+    ):
+        self.session_id = session_id
+        self.segment_index = segment_index
+        self.t0 = t0
+        self.t1 = t1
+        self.start_sample = start_sample
+        self.end_sample = end_sample
+        self.text = text
+        self.snippet = snippet
+        # bm25, lower is better
+        self.score = score
+
+    def __repr__(self):
+        return f"SearchHit({self.session_id}, {self.t0} - {self.t1} ms, {self.snippet!r})"
+
+
+def _fts_query(text: str) -> str:
+    """Plain words -> fts5 query matching all of them (no fts5 syntax)."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+class SessionCatalog:
+    """
+    Session store directory + a SQLite index of its session files.
+
+    Each session is one session file (source.sessionformat) in `directory`;
+    save_session() writes it and records id, start time, duration, segment
+    count and a transcript excerpt in the catalog. Listing and filtering
+    only touch the catalog, open_session() reads the segment table and maps
+    the audio lazily.
+
+    Segment text is also indexed (FTS5) as sessions are added; search()
+    returns ranked, time coded hits and get_hit_audio() decodes just the
+    audio of a hit.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(directory, CATALOG_FILE), check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.executescript(_SEARCH_SCHEMA)
+        self._db.commit()
+
+    # ------------------------------------------------------------ #
+    # store functions
+
+    def save_session(self, save, start_time: float = None, codec: str = None) -> SessionEntry:
+        """
+        Store a WhisperCoreSave as a new session and index it.
+
+        start_time is the wall clock start of the session (defaults to now);
+        codec archives the audio (see WhisperCoreSave.save).
+        """
+        if start_time is None:
+            start_time = time.time()
+        session_id = (
+            time.strftime("%Y%m%d-%H%M%S", time.localtime(start_time))
+            + "-"
+            + uuid.uuid4().hex[:8]
+        )
+        _filename = os.path.join(self._directory, session_id + SESSION_SUFFIX)
+
+        # readers never see a half written session
+        _tmp = _filename + ".tmp"
+        save.save(_tmp, metadata={"session_id": session_id, "start_time": start_time}, codec=codec)
+        os.replace(_tmp, _filename)
+        return self.add_file(_filename)
+
+    def add_file(self, filename: str) -> SessionEntry:
+        """Index an existing session file (header + segment table are read)."""
+        session = SessionFile(filename)
+        _metadata = session.get_metadata()
+        _rate = session.get_sample_rate()
+        _text = " ".join(x["text"].strip() for x in session.get_segments() if x["text"].strip())
+
+        entry = SessionEntry(
+            _metadata.get(
+                "session_id", os.path.splitext(os.path.basename(filename))[0]
+            ),
+            os.path.relpath(filename, self._directory),
+            _metadata.get("start_time", os.path.getmtime(filename)),
+            # the whole session span -- evicted audio before first_sample included
+            (session.get_first_sample() + session.get_num_samples()) / _rate,
+            sum(1 for x in session.get_segments() if x["text"].strip()),
+            _text[:EXCERPT_CHARS],
+            session.get_codec(),
+        )
+        # segment rows for the search index (older saves lack sample offsets)
+        _segments = [
+            (
+                x["text"].strip(),
+                entry.session_id,
+                i,
+                x["t0"],
+                x["t1"],
+                x.get("start_sample", int(x["t0"] * _rate / 1000)),
+                x.get("end_sample", int(x["t1"] * _rate / 1000)),
+            )
+            for i, x in enumerate(session.get_segments())
+            if x["text"].strip()
+        ]
+
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO sessions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.session_id,
+                    entry.filename,
+                    entry.start_time,
+                    entry.duration,
+                    entry.segment_count,
+                    entry.excerpt,
+                    entry.codec,
+                ),
+            )
+            self._db.execute(
+                "DELETE FROM segment_text WHERE session_id = ?", (entry.session_id,)
+            )
+            self._db.executemany(
+                "INSERT INTO segment_text (text, session_id, segment_index, t0, t1, "
+                "start_sample, end_sample) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                _segments,
+            )
+        return entry
+
+    def remove_session(self, session_id: str, delete_file: bool = True):
+        entry = self.get_session(session_id)
+        if entry is None:
+            return
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM segment_text WHERE session_id = ?", (session_id,))
+        if delete_file:
+            _filename = os.path.join(self._directory, entry.filename)
+            if os.path.exists(_filename):
+                os.remove(_filename)
+
+    def rebuild(self) -> int:
+        """Re-index the directory (session files added / removed by hand)."""
+        _files = glob.glob(os.path.join(glob.escape(self._directory), "*" + SESSION_SUFFIX))
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sessions")
+            self._db.execute("DELETE FROM segment_text")
+        for filename in _files:
+            try:
+                self.add_file(filename)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping session file {filename}: {e}")
+        return self.count()
+
+    # ------------------------------------------------------------ #
+    # query functions
+
+    def list_sessions(
+        self,
+        since: float = None,
+        until: float = None,
+        min_duration: float = None,
+        text: str = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[SessionEntry]:
+        """Newest first; start time range, minimum duration, excerpt substring."""
+        _where = []
+        _params = []
+        if since is not None:
+            _where.append("start_time >= ?")
+            _params.append(since)
+        if until is not None:
+            _where.append("start_time < ?")
+            _params.append(until)
+        if min_duration is not None:
+            _where.append("duration >= ?")
+            _params.append(min_duration)
+        if text:
+            _where.append("excerpt LIKE ? ESCAPE '\\'")
+            _escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            _params.append(f"%{_escaped}%")
+
+        _query = f"SELECT {_COLUMNS} FROM sessions"
+        if _where:
+            _query += " WHERE " + " AND ".join(_where)
+        _query += " ORDER BY start_time DESC LIMIT ? OFFSET ?"
+        _params += [limit, offset]
+
+        with self._lock:
+            rows = self._db.execute(_query, _params).fetchall()
+        return [SessionEntry(*row) for row in rows]
+
+    def get_session(self, session_id: str) -> SessionEntry:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_COLUMNS} FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return SessionEntry(*row) if row is not None else None
+
+    def open_session(self, session_id: str) -> SessionFile:
+        """Segments are read now, audio is mapped / decoded on first access."""
+        entry = self.get_session(session_id)
+        if entry is None:
+            raise KeyError(f"Unknown session: {session_id}")
+        return SessionFile(os.path.join(self._directory, entry.filename))
+
+    def search(
+        self, query: str, limit: int = 20, offset: int = 0, raw: bool = False
+    ) -> List[SearchHit]:
+        """
+        Ranked (bm25) segments matching all words of `query`.
+
+        raw=True passes `query` through as fts5 syntax (phrases, OR, NEAR,
+        prefix*).
+        """
+        if not raw:
+            query = _fts_query(query)
+            if not query:
+                return []
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT session_id, segment_index, t0, t1, start_sample, end_sample, text, "
+                "snippet(segment_text, 0, '[', ']', '...', 12), bm25(segment_text) "
+                "FROM segment_text WHERE segment_text MATCH ? "
+                "ORDER BY rank LIMIT ? OFFSET ?",
+                (query, limit, offset),
+            ).fetchall()
+        return [SearchHit(*row) for row in rows]
+
+    def get_hit_audio(self, hit: SearchHit, padding_seconds: float = 0.0) -> np.ndarray:
+        """
+        Audio of a search hit (session dtype) -- only its blocks are decoded.
+
+        Raises ValueError when the hit starts before the stored audio
+        (evicted before the session was stored); its end and the padding are
+        clamped to the stored samples.
+        """
+        session = self.open_session(hit.session_id)
+        _first = session.get_first_sample()
+        _end = _first + session.get_num_samples()
+        if hit.start_sample < _first:
+            raise ValueError(
+                f"Audio of {hit} is not in session {hit.session_id} "
+                f"(samples {_first} - {_end})"
+            )
+        _padding = int(padding_seconds * session.get_sample_rate())
+        _start_sample = max(_first, hit.start_sample - _padding)
+        return session.get_audio_range_samples(
+            _start_sample, max(_start_sample, min(_end, hit.end_sample + _padding))
+        )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_directory(self) -> str:
+        return self._directory
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,375 @@
+import bisect
+import io
+import json
+import struct
+
+import numpy as np
+
+from typing import Any, Dict, Iterable, List
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+MAGIC = b"WCSESSN\x00"
+VERSION = 2  # 2: compressed audio section
+
+# magic, version, flags, sample rate, dtype code, reserved,
+# first sample, sample count, audio offset, audio bytes,
+# segment table offset, segment table bytes
+HEADER_FORMAT = "<8sHHIHH6Q"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)  # 68
+
+# bit 0 is reserved (never written)
+# audio section = independently decodable codec blocks + a seek index
+FLAG_COMPRESSED_AUDIO = 1 << 1
+SUPPORTED_FLAGS = FLAG_COMPRESSED_AUDIO
+
+DTYPE_CODES = {
+    np.dtype(np.float32): 1,
+    np.dtype(np.int16): 2,
+}
+DTYPES = {code: dtype for dtype, code in DTYPE_CODES.items()}
+
+# the audio section starts on a page boundary so it maps cleanly
+AUDIO_ALIGNMENT = 4096
+
+# archive codecs (soundfile format, subtype per sample dtype)
+# flac is lossless for int16 sessions (float32 ones are kept at 24 bit),
+# opus is lossy but several times smaller
+CODECS = {
+    "flac": ("FLAC", {np.dtype(np.int16): "PCM_16", np.dtype(np.float32): "PCM_24"}),
+    "opus": ("OGG", {np.dtype(np.int16): "OPUS", np.dtype(np.float32): "OPUS"}),
+}
+
+# samples per codec block = the least a range read decodes
+DEFAULT_CODEC_BLOCK_SECONDS = 10.0
+
+# opus smears the last frame of a stream -- blocks are encoded with this much
+# of the next block appended, which is cut off again when decoding
+CODEC_BLOCK_OVERLAP_SECONDS = {"flac": 0.0, "opus": 0.02}
+
+
+def _encode_block(samples: np.ndarray, sample_rate: int, codec: str) -> bytes:
+    import soundfile
+
+    _format, _subtypes = CODECS[codec]
+    _buffer = io.BytesIO()
+    soundfile.write(
+        _buffer, samples, sample_rate, format=_format, subtype=_subtypes[samples.dtype]
+    )
+    return _buffer.getvalue()
+
+
+def _decode_block(data: bytes, dtype: np.dtype) -> np.ndarray:
+    import soundfile
+
+    samples, _ = soundfile.read(io.BytesIO(data), dtype=np.dtype(dtype).name)
+    return samples
+
+
+def _rebuffer(audio_blocks: Iterable[np.ndarray], dtype: np.dtype, block_samples: int):
+    """Regroup audio blocks into block_samples sized arrays (last one shorter)."""
+    _buffer = np.empty(block_samples, dtype=dtype)
+    _count = 0
+    for block in audio_blocks:
+        _offset = 0
+        while _offset < len(block):
+            _n = min(block_samples - _count, len(block) - _offset)
+            _buffer[_count : _count + _n] = block[_offset : _offset + _n]
+            _count += _n
+            _offset += _n
+            if _count == block_samples:
+                yield _buffer
+                _buffer = np.empty(block_samples, dtype=dtype)
+                _count = 0
+    if _count:
+        yield _buffer[:_count]
+
+
+# ------------------------------------------------------------ #
+# Writer
+# ------------------------------------------------------------ #
+
+
+def _align(offset: int, alignment: int) -> int:
+    return -(-offset // alignment) * alignment
+
+
+def write_session(
+    filename: str,
+    sample_rate: int,
+    dtype: np.dtype,
+    first_sample: int,
+    audio_blocks: Iterable[np.ndarray],
+    segments: List[Dict[str, Any]],
+    metadata: Dict[str, Any] = None,
+    codec: str = None,
+    codec_block_seconds: float = DEFAULT_CODEC_BLOCK_SECONDS,
+):
+    """
+    Write a session file.
+
+    Layout:
+    [1] fixed header (HEADER_FORMAT)
+    [2] audio section -- one contiguous raw PCM run, page aligned
+    [3] segment table -- JSON {"metadata", "segments"}; each segment carries
+        start_sample / end_sample, absolute stream sample indices (like
+        first_sample, not offsets into the audio section)
+
+    audio_blocks are written in order as they are iterated, so the whole
+    session never has to be in memory at once.
+
+    Archive mode (codec="flac" / "opus", needs soundfile): the audio section
+    holds codec_block_seconds blocks, each a complete flac / ogg-opus
+    stream, and the table gets an "audio_index" of [first sample, byte
+    offset, byte length] per block.
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported sample dtype: {dtype}")
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec} (choices: {', '.join(CODECS)})")
+
+    flags = 0
+    table = {"metadata": dict(metadata or {}), "segments": segments}
+    if codec is not None:
+        flags |= FLAG_COMPRESSED_AUDIO
+        table["metadata"]["audio_codec"] = codec
+        table["audio_index"] = []
+
+    with open(filename, "wb") as f:
+        # header is written last, once the section sizes are known
+        audio_offset = _align(HEADER_SIZE, AUDIO_ALIGNMENT)
+        f.seek(audio_offset)
+
+        num_samples = 0
+        if codec is not None:
+            _block_samples = max(1, int(codec_block_seconds * sample_rate))
+            _overlap = int(CODEC_BLOCK_OVERLAP_SECONDS[codec] * sample_rate)
+
+            def encode(block: np.ndarray, lookahead: np.ndarray):
+                _data = _encode_block(
+                    np.concatenate((block, lookahead)) if len(lookahead) else block,
+                    sample_rate,
+                    codec,
+                )
+                table["audio_index"].append(
+                    [num_samples, f.tell() - audio_offset, len(_data)]
+                )
+                f.write(_data)
+                return len(block)
+
+            # blocks are encoded one behind to see the start of the next one
+            _previous = None
+            for block in _rebuffer(audio_blocks, dtype, _block_samples):
+                if _previous is not None:
+                    num_samples += encode(_previous, block[:_overlap])
+                _previous = block
+            if _previous is not None:
+                num_samples += encode(_previous, _previous[:0])
+        else:
+            for block in audio_blocks:
+                block = np.ascontiguousarray(block, dtype=dtype)
+                f.write(memoryview(block).cast("B"))
+                num_samples += len(block)
+        audio_bytes = f.tell() - audio_offset
+
+        table_offset = f.tell()
+        table_bytes = f.write(json.dumps(table, separators=(",", ":")).encode("utf-8"))
+
+        f.seek(0)
+        f.write(
+            struct.pack(
+                HEADER_FORMAT,
+                MAGIC,
+                VERSION,
+                flags,
+                sample_rate,
+                DTYPE_CODES[dtype],
+                0,
+                first_sample,
+                num_samples,
+                audio_offset,
+                audio_bytes,
+                table_offset,
+                table_bytes,
+            )
+        )
+
+
+# ------------------------------------------------------------ #
+# Reader
+# ------------------------------------------------------------ #
+
+
+class SessionFile:
+    """
+    Reader for session files written by write_session.
+
+    Opening only reads the header and the segment table; the audio section
+    is np.memmap-ed on first access, so opening a multi-hour session costs
+    the same as opening a short one.
+    """
+
+    def __init__(self, filename: str):
+        self._filename = filename
+
+        with open(filename, "rb") as f:
+            _header = f.read(HEADER_SIZE)
+            if len(_header) < HEADER_SIZE or _header[:8] != MAGIC:
+                raise ValueError(f"Not a WhisperCore session file: {filename}")
+
+            (
+                _,
+                self._version,
+                self._flags,
+                self._sample_rate,
+                _dtype_code,
+                _,
+                self._first_sample,
+                self._num_samples,
+                self._audio_offset,
+                self._audio_bytes,
+                _table_offset,
+                _table_bytes,
+            ) = struct.unpack(HEADER_FORMAT, _header)
+
+            if self._version > VERSION:
+                raise ValueError(
+                    f"Unsupported session file version {self._version} (max {VERSION})"
+                )
+            if self._flags & ~SUPPORTED_FLAGS:
+                raise ValueError(f"Unsupported session file flags: {self._flags:#x}")
+            if _dtype_code not in DTYPES:
+                raise ValueError(f"Unknown sample dtype code: {_dtype_code}")
+            self._dtype = DTYPES[_dtype_code]
+
+            f.seek(_table_offset)
+            _table = json.loads(f.read(_table_bytes).decode("utf-8"))
+
+        self._metadata = _table["metadata"]
+        self._segments = _table["segments"]
+        self._audio = None
+
+        # archive mode -- block start samples for bisect + last decoded block
+        self._audio_index = _table.get("audio_index", [])
+        self._block_starts = [x[0] for x in self._audio_index]
+        self._block_cache = (-1, None)
+
+    # ------------------------------------------------------------ #
+    # audio
+
+    def get_audio(self) -> np.ndarray:
+        """All samples (storage dtype) as a read-only memmap (decoded if compressed)."""
+        if self._audio is None:
+            if self._num_samples == 0:
+                self._audio = np.zeros(0, dtype=self._dtype)
+            elif self._flags & FLAG_COMPRESSED_AUDIO:
+                self._audio = np.concatenate(
+                    [self._get_block(i) for i in range(len(self._audio_index))]
+                )
+            else:
+                self._audio = np.memmap(
+                    self._filename,
+                    dtype=self._dtype,
+                    mode="r",
+                    offset=self._audio_offset,
+                    shape=(self._num_samples,),
+                )
+        return self._audio
+
+    def get_audio_range_samples(self, start_sample: int, end_sample: int = -1) -> np.ndarray:
+        """Samples between two absolute (session) sample indices."""
+        if end_sample == -1:
+            end_sample = self._first_sample + self._num_samples
+        _start = max(0, start_sample - self._first_sample)
+        _end = max(_start, min(self._num_samples, end_sample - self._first_sample))
+        if self._audio is not None or not self._flags & FLAG_COMPRESSED_AUDIO:
+            return self.get_audio()[_start:_end]
+        if _start == _end:
+            return np.zeros(0, dtype=self._dtype)
+
+        # only decode the blocks the range touches
+        first = bisect.bisect_right(self._block_starts, _start) - 1
+        last = bisect.bisect_right(self._block_starts, _end - 1) - 1
+        _blocks = [self._get_block(i) for i in range(first, last + 1)]
+        _audio = _blocks[0] if len(_blocks) == 1 else np.concatenate(_blocks)
+        _offset = self._block_starts[first]
+        return _audio[_start - _offset : _end - _offset]
+
+    def _get_block(self, index: int) -> np.ndarray:
+        if self._block_cache[0] == index:
+            return self._block_cache[1]
+        _start, _offset, _length = self._audio_index[index]
+        _end = (
+            self._audio_index[index + 1][0]
+            if index + 1 < len(self._audio_index)
+            else self._num_samples
+        )
+        with open(self._filename, "rb") as f:
+            f.seek(self._audio_offset + _offset)
+            # drop the overlap into the next block
+            samples = _decode_block(f.read(_length), self._dtype)[: _end - _start]
+        self._block_cache = (index, samples)
+        return samples
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_segments(self) -> List[Dict[str, Any]]:
+        return self._segments
+
+    def get_metadata(self) -> Dict[str, Any]:
+        return self._metadata
+
+    def get_sample_rate(self) -> int:
+        return self._sample_rate
+
+    def get_dtype(self) -> np.dtype:
+        return self._dtype
+
+    def get_first_sample(self) -> int:
+        return self._first_sample
+
+    def get_num_samples(self) -> int:
+        return self._num_samples
+
+    def get_version(self) -> int:
+        return self._version
+
+    def get_codec(self) -> str:
+        """Archive codec of the audio section (None for raw PCM)."""
+        return self._metadata.get("audio_codec")
+
+    def get_audio_bytes(self) -> int:
+        return self._audio_bytes
+
+
+# ------------------------------------------------------------ #
+# Archive
+# ------------------------------------------------------------ #
+
+
+def archive_session(
+    filename: str,
+    archive_filename: str,
+    codec: str = "flac",
+    codec_block_seconds: float = DEFAULT_CODEC_BLOCK_SECONDS,
+):
+    """Re-write a session file with a compressed audio section."""
+    session = SessionFile(filename)
+    _audio = session.get_audio()
+    _step = max(1, int(codec_block_seconds * session.get_sample_rate()))
+    write_session(
+        archive_filename,
+        sample_rate=session.get_sample_rate(),
+        dtype=session.get_dtype(),
+        first_sample=session.get_first_sample(),
+        audio_blocks=(_audio[i : i + _step] for i in range(0, len(_audio), _step)),
+        segments=session.get_segments(),
+        metadata=session.get_metadata(),
+        codec=codec,
+        codec_block_seconds=codec_block_seconds,
+    )
@@ -0,0 +1,474 @@
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from typing import Any, Dict, Iterator, List, Tuple
+
+from source.sessionformat import DTYPE_CODES, DTYPES, SessionFile, write_session
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+JOURNAL_MAGIC = b"WCJRNL\x00\x00"
+JOURNAL_VERSION = 1
+
+# magic, version, dtype code, sample rate, generation
+JOURNAL_HEADER_FORMAT = "<8sHHIQ"
+JOURNAL_HEADER_SIZE = struct.calcsize(JOURNAL_HEADER_FORMAT)
+
+# record type, payload bytes, crc32 of the payload
+RECORD_FORMAT = "<BII"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# record types
+RECORD_AUDIO = 1  # <Q start sample> + raw pcm (journal dtype)
+RECORD_SEGMENT = 2  # json {"index", "timestamp", "t0", "t1", "text"}
+RECORD_RESET = 3  # empty -- the stream was reset
+
+AUDIO_RECORD_FORMAT = "<Q"
+AUDIO_RECORD_SIZE = struct.calcsize(AUDIO_RECORD_FORMAT)
+
+# seconds between checkpoints = journal tail replayed on recovery
+DEFAULT_CHECKPOINT_INTERVAL = 60.0
+
+# appended to files found at the journal paths that cannot be recovered
+LEGACY_SUFFIX = ".legacy"
+
+# a crashed run's session is recovered to `filename`.previous-<time>
+PREVIOUS_SUFFIX = ".previous"
+ARCHIVE_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def _fsync_dir(path: str):
+    _fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(_fd)
+    finally:
+        os.close(_fd)
+
+
+def _generation_files(filename: str, extension: str) -> List[tuple]:
+    """(generation, path) of the `filename`.<gen>`extension` files, oldest first."""
+    result = []
+    for path in glob.glob(glob.escape(filename) + ".*" + extension):
+        _generation = path[len(filename) + 1 : -len(extension)]
+        if _generation.isdigit():
+            result.append((int(_generation), path))
+    return sorted(result)
+
+
+def _journal_files(filename: str) -> List[tuple]:
+    """(generation, path) of the journals next to `filename`, oldest first."""
+    return _generation_files(filename, ".journal")
+
+
+def _part_files(filename: str) -> List[tuple]:
+    """(generation, path) of the checkpoint parts next to `filename`, oldest first."""
+    return _generation_files(filename, ".part")
+
+
+def _archive_path(path: str) -> str:
+    """`path` if it is free, else `path`-2, -3, ... -- archives are never overwritten."""
+    _candidate = path
+    _count = 1
+    while os.path.exists(_candidate):
+        _count += 1
+        _candidate = f"{path}-{_count}"
+    return _candidate
+
+
+# ------------------------------------------------------------ #
+# Recovery
+# ------------------------------------------------------------ #
+
+
+class RecoveredSession:
+    """Session state rebuilt from the last checkpoint + the journal tail."""
+
+    def __init__(self, sample_rate: int, dtype: np.dtype):
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype(dtype)
+        self.metadata: Dict[str, Any] = {}
+        self.first_sample = 0
+        self.segments: List[Dict[str, Any]] = []
+        self._blocks: List[np.ndarray] = []
+        self._total_samples = 0
+
+    def _append_audio(self, start_sample: int, samples: np.ndarray):
+        if not self._blocks:
+            self.first_sample = self._total_samples = start_sample
+        # checkpoint and journal overlap around the cut -- keep the first copy
+        _skip = self._total_samples - start_sample
+        if _skip >= len(samples):
+            return
+        if _skip < 0:
+            # never happens for a consistent journal, keep sample indices right
+            self._blocks.append(np.zeros(-_skip, dtype=self.dtype))
+            _skip = 0
+        self._blocks.append(samples[_skip:])
+        self._total_samples = start_sample + len(samples)
+
+    def _set_segment(self, segment: Dict[str, Any]):
+        _index = segment.pop("index")
+        if _index < len(self.segments):
+            self.segments[_index] = segment
+        else:
+            self.segments.append(segment)
+
+    def _reset(self):
+        self.first_sample = 0
+        self.segments = []
+        self._blocks = []
+        self._total_samples = 0
+
+    def _apply_part(self, part: SessionFile):
+        """Apply a checkpoint part (see SessionJournal.checkpoint)."""
+        if part.get_metadata().get("reset"):
+            self._reset()
+        if part.get_num_samples():
+            self._append_audio(part.get_first_sample(), np.array(part.get_audio()))
+        for segment in part.get_segments():
+            self._set_segment(dict(segment))
+
+    def get_audio(self) -> np.ndarray:
+        """All recovered samples (journal dtype), starting at first_sample."""
+        if not self._blocks:
+            return np.zeros(0, dtype=self.dtype)
+        return np.concatenate(self._blocks)
+
+    def get_num_samples(self) -> int:
+        return self._total_samples - self.first_sample
+
+
+class _CheckpointPart(RecoveredSession):
+    """The changes of one journal generation -- what a checkpoint part holds."""
+
+    def __init__(self, sample_rate: int, dtype: np.dtype):
+        super().__init__(sample_rate, dtype)
+        self.reset = False
+        # segment index -> its latest state
+        self.segment_updates: Dict[int, Dict[str, Any]] = {}
+
+    def _set_segment(self, segment: Dict[str, Any]):
+        self.segment_updates[segment["index"]] = segment
+
+    def _reset(self):
+        super()._reset()
+        self.reset = True
+        self.segment_updates = {}
+
+
+def _read_records(f) -> Iterator[Tuple[int, bytes]]:
+    """(type, payload) of the intact records; raises EOFError at a torn tail."""
+    while True:
+        _record = f.read(RECORD_SIZE)
+        if len(_record) < RECORD_SIZE:
+            if _record:
+                raise EOFError("torn record header")
+            return
+        _type, _length, _crc = struct.unpack(RECORD_FORMAT, _record)
+        _payload = f.read(_length)
+        # torn tail -- everything after the last complete record is lost
+        if len(_payload) < _length or zlib.crc32(_payload) != _crc:
+            raise EOFError("torn record")
+        yield _type, _payload
+
+
+def _replay_journal(path: str, session: RecoveredSession) -> bool:
+    """Apply the intact records of a journal; False if it was torn / invalid."""
+    with open(path, "rb") as f:
+        _header = f.read(JOURNAL_HEADER_SIZE)
+        if len(_header) < JOURNAL_HEADER_SIZE or _header[:8] != JOURNAL_MAGIC:
+            return False
+
+        try:
+            for _type, _payload in _read_records(f):
+                if _type == RECORD_AUDIO:
+                    (_start,) = struct.unpack_from(AUDIO_RECORD_FORMAT, _payload)
+                    session._append_audio(
+                        _start,
+                        np.frombuffer(
+                            _payload, dtype=session.dtype, offset=AUDIO_RECORD_SIZE
+                        ),
+                    )
+                elif _type == RECORD_SEGMENT:
+                    session._set_segment(json.loads(_payload.decode("utf-8")))
+                elif _type == RECORD_RESET:
+                    session._reset()
+        except EOFError:
+            return False
+    return True
+
+
+def recover_session(filename: str) -> RecoveredSession:
+    """
+    Rebuild a session from its checkpoint parts and journal tail.
+
+    Every generation is read from its checkpoint part if there is one (the
+    part holds the whole generation), else from its journal up to the last
+    intact record. `filename` itself is never read. Returns None when there
+    is nothing to recover.
+    """
+    session = None
+    _parts = dict(_part_files(filename))
+    _journals = dict(_journal_files(filename))
+    for generation in sorted(set(_parts) | set(_journals)):
+        if generation in _parts:
+            part = SessionFile(_parts[generation])
+            if session is None:
+                session = RecoveredSession(part.get_sample_rate(), part.get_dtype())
+            session._apply_part(part)
+            continue
+
+        path = _journals[generation]
+        if session is None:
+            with open(path, "rb") as f:
+                _header = f.read(JOURNAL_HEADER_SIZE)
+            if len(_header) < JOURNAL_HEADER_SIZE or _header[:8] != JOURNAL_MAGIC:
+                continue
+            _, _, _dtype_code, _sample_rate, _ = struct.unpack(
+                JOURNAL_HEADER_FORMAT, _header
+            )
+            session = RecoveredSession(_sample_rate, DTYPES[_dtype_code])
+        if not _replay_journal(path, session):
+            print(f"Session journal {path} ends in a torn record, tail dropped")
+    return session
+
+
+# ------------------------------------------------------------ #
+# Journal
+# ------------------------------------------------------------ #
+
+
+class SessionJournal:
+    """
+    Append-only journal of a session + periodic checkpoints.
+
+    Files:
+    - `filename`.<gen>.journal    -- records of generation <gen>
+    - `filename`.<gen>.part       -- generation <gen> compacted by a checkpoint
+      (session file, sessionformat)
+
+    Audio blocks and segment changes are appended as they happen (flushed to
+    the OS per record, fsync-ed on checkpoint / close). checkpoint() starts a
+    new journal generation and compacts the previous one into its part, so
+    each checkpoint only writes what was appended since the last one,
+    recovery only replays records after the last checkpoint and shutdown
+    only has to fsync the journal.
+
+    Leftovers of a previous (crashed) run are recovered into
+    `filename`.previous-<time> when the journal is opened (unreadable ones
+    get a .legacy suffix instead); neither overwrites an earlier
+    archive. `filename` itself is left alone.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        sample_rate: int,
+        sample_dtype: np.dtype = np.int16,
+        checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+    ):
+        self._filename = filename
+        self._sample_rate = sample_rate
+        self._dtype = np.dtype(sample_dtype)
+        if self._dtype not in DTYPE_CODES:
+            raise ValueError(f"Unsupported sample dtype: {self._dtype}")
+
+        self._checkpoint_interval = checkpoint_interval
+        self._last_checkpoint = time.monotonic()
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+
+        self._archive_previous()
+        self._generation = 0
+        self._file = None
+        self._open_journal(self._generation)
+
+    def _get_leftovers(self) -> List[str]:
+        """Part / journal files of an earlier run."""
+        _paths = [x[1] for x in _part_files(self._filename) + _journal_files(self._filename)]
+        return _paths + glob.glob(glob.escape(self._filename) + ".*.part.tmp")
+
+    def _archive_previous(self):
+        """Keep a crashed run's session instead of overwriting it."""
+        if not self._get_leftovers():
+            return
+
+        try:
+            session = recover_session(self._filename)
+        except (ValueError, KeyError) as e:
+            # unreadable leftovers are kept as they are, not deleted
+            print(f"Could not recover previous session: {e}")
+            for path in self._get_leftovers():
+                os.replace(path, _archive_path(path + LEGACY_SUFFIX))
+            return
+
+        if session is not None:
+            _previous = _archive_path(
+                f"{self._filename}{PREVIOUS_SUFFIX}-{time.strftime(ARCHIVE_TIME_FORMAT)}"
+            )
+            write_session(
+                _previous,
+                sample_rate=session.sample_rate,
+                dtype=session.dtype,
+                first_sample=session.first_sample,
+                audio_blocks=[session.get_audio()],
+                segments=session.segments,
+                metadata=session.metadata,
+            )
+            print(
+                f"Recovered previous session ({len(session.segments)} segments, "
+                f"{session.get_num_samples() / session.sample_rate:.1f} s) -> {_previous}"
+            )
+
+        for path in self._get_leftovers():
+            os.remove(path)
+
+    def _open_journal(self, generation: int):
+        _path = f"{self._filename}.{generation}.journal"
+        self._file = open(_path, "wb")
+        self._file.write(
+            struct.pack(
+                JOURNAL_HEADER_FORMAT,
+                JOURNAL_MAGIC,
+                JOURNAL_VERSION,
+                DTYPE_CODES[self._dtype],
+                self._sample_rate,
+                generation,
+            )
+        )
+        self._file.flush()
+        self._bytes_since_checkpoint = 0
+
+    # ------------------------------------------------------------ #
+    # records
+
+    def _append(self, record_type: int, *payload: bytes):
+        _crc = 0
+        _length = 0
+        for part in payload:
+            _crc = zlib.crc32(part, _crc)
+            _length += len(part)
+
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(struct.pack(RECORD_FORMAT, record_type, _length, _crc))
+            for part in payload:
+                self._file.write(part)
+            # in the page cache -- survives a crash of this process
+            self._file.flush()
+            self._bytes_since_checkpoint += RECORD_SIZE + _length
+
+    def append_audio(self, start_sample: int, samples: np.ndarray):
+        """Journal a block of samples (journal dtype) starting at `start_sample`."""
+        if samples.dtype != self._dtype:
+            raise ValueError(f"Expected {self._dtype} samples, got {samples.dtype}")
+        self._append(
+            RECORD_AUDIO,
+            struct.pack(AUDIO_RECORD_FORMAT, start_sample),
+            memoryview(np.ascontiguousarray(samples)).cast("B"),
+        )
+
+    def append_segment(
+        self, index: int, timestamp: float, t0: int, t1: int, text: str
+    ):
+        """Journal the current state of segment `index`."""
+        self._append(
+            RECORD_SEGMENT,
+            json.dumps(
+                {"index": index, "timestamp": timestamp, "t0": t0, "t1": t1, "text": text},
+                separators=(",", ":"),
+            ).encode("utf-8"),
+        )
+
+    def append_reset(self):
+        self._append(RECORD_RESET)
+
+    # ------------------------------------------------------------ #
+    # checkpoints
+
+    def is_checkpoint_due(self) -> bool:
+        return time.monotonic() - self._last_checkpoint >= self._checkpoint_interval
+
+    def checkpoint(self):
+        """
+        Compact the journal written since the last checkpoint into a part.
+
+        The journal switches to a new generation first; the closed one is
+        then written as `filename`.<gen>.part -- its audio and the latest
+        state of every segment it changed -- and removed. A part that
+        contains a reset makes the older parts obsolete, they are removed.
+        """
+        with self._checkpoint_lock:
+            self._last_checkpoint = time.monotonic()
+            with self._lock:
+                if self._file is None:
+                    return
+                _old = self._file
+                _generation = self._generation
+                self._generation += 1
+                self._open_journal(self._generation)
+            os.fsync(_old.fileno())
+            _old.close()
+
+            _journal = f"{self._filename}.{_generation}.journal"
+            part = _CheckpointPart(self._sample_rate, self._dtype)
+            _replay_journal(_journal, part)
+
+            if part.reset or part.segment_updates or part.get_num_samples():
+                _part = f"{self._filename}.{_generation}.part"
+                _tmp = _part + ".tmp"
+                write_session(
+                    _tmp,
+                    sample_rate=self._sample_rate,
+                    dtype=self._dtype,
+                    first_sample=part.first_sample,
+                    audio_blocks=[part.get_audio()],
+                    segments=[part.segment_updates[x] for x in sorted(part.segment_updates)],
+                    metadata={"reset": part.reset},
+                )
+                with open(_tmp, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(_tmp, _part)
+                _fsync_dir(_part)
+            os.remove(_journal)
+
+            if part.reset:
+                for generation, path in _part_files(self._filename):
+                    if generation < _generation:
+                        os.remove(path)
+
+    def close(self):
+        """Make the journal durable -- no state is rewritten on shutdown."""
+        with self._checkpoint_lock, self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_filename(self) -> str:
+        return self._filename
+
+    def get_generation(self) -> int:
+        return self._generation
+
+    def get_sample_dtype(self) -> np.dtype:
+        return self._dtype
+
+    def get_bytes_since_checkpoint(self) -> int:
+        return self._bytes_since_checkpoint
@@ -0,0 +1,147 @@
+import threading
+
+from typing import Dict
+
+
+# ------------------------------------------------------------ #
+# CONSTANTS
+# ------------------------------------------------------------ #
+
+# fraction of the update interval a decode may take
+DEFAULT_TARGET_UTILIZATION = 0.8
+
+# smoothing of the measured decode time / real-time factor
+DEFAULT_RTF_SMOOTHING = 0.3
+
+# undecoded audio (in update intervals) that counts as falling behind
+FALLING_BEHIND_INTERVALS = 3.0
+
+
+# ------------------------------------------------------------ #
+# Scheduler
+# ------------------------------------------------------------ #
+
+
+class AdaptiveScheduler:
+    """
+    Picks the update interval and decode window from the measured speed of
+    whisper on this machine.
+
+    Both the decode time and rtf (real-time factor = decode seconds / audio
+    seconds) are smoothed over the last decodes:
+    - interval = decode time / target_utilization, clamped to
+      [min_interval, max_interval] -- fast machines update as often as
+      allowed, slow ones back off instead of queueing decodes
+    - window: a full window decode takes about rtf * window seconds, the
+      window shrinks (down to min_window_seconds) until that fits the
+      longest interval
+
+    The scheduler is falling behind when even the smallest settings cannot
+    keep up, or when the undecoded backlog grows past a few intervals.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 0.25,
+        max_interval: float = 2.0,
+        min_window_seconds: float = 5.0,
+        max_window_seconds: float = 15.0,
+        target_utilization: float = DEFAULT_TARGET_UTILIZATION,
+        rtf_smoothing: float = DEFAULT_RTF_SMOOTHING,
+    ):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError(
+                f"Invalid interval bounds: {min_interval} - {max_interval}"
+            )
+        if not 0 < min_window_seconds <= max_window_seconds:
+            raise ValueError(
+                f"Invalid window bounds: {min_window_seconds} - {max_window_seconds}"
+            )
+
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._min_window = min_window_seconds
+        self._max_window = max_window_seconds
+        self._target_utilization = target_utilization
+        self._rtf_smoothing = rtf_smoothing
+        self._lock = threading.Lock()
+
+        # measurements
+        self._rtf = None
+        self._decode_seconds = None
+        self._backlog = 0.0
+
+        # chosen parameters
+        self._interval = min_interval
+        self._window = max_window_seconds
+
+    # ------------------------------------------------------------ #
+    # measurements
+
+    def record_decode(self, decode_seconds: float, audio_seconds: float):
+        """Feed the wall time of one transcribe_audio call and its clip length."""
+        if audio_seconds <= 0:
+            return
+        with self._lock:
+            self._rtf = self._smooth(self._rtf, decode_seconds / audio_seconds)
+            self._decode_seconds = self._smooth(self._decode_seconds, decode_seconds)
+            self._update()
+
+    def _smooth(self, average: float, value: float) -> float:
+        if average is None:
+            return value
+        return average + self._rtf_smoothing * (value - average)
+
+    def record_backlog(self, backlog_seconds: float):
+        """Feed the seconds of stored audio no finished decode has covered yet."""
+        with self._lock:
+            self._backlog = max(0.0, backlog_seconds)
+
+    def _update(self):
+        # as often as the decode time allows
+        interval = self._decode_seconds / self._target_utilization
+
+        # a full window decode must fit the longest interval
+        window = self._max_window
+        if self._rtf * window > self._max_interval * self._target_utilization:
+            window = self._max_interval * self._target_utilization / self._rtf
+
+        self._window = min(self._max_window, max(self._min_window, window))
+        self._interval = min(self._max_interval, max(self._min_interval, interval))
+
+    # ------------------------------------------------------------ #
+    # helper functions
+
+    def get_interval(self) -> float:
+        """Seconds between decode requests."""
+        return self._interval
+
+    def get_window_seconds(self) -> float:
+        """Longest clip a partial decode should cover."""
+        return self._window
+
+    def get_rtf(self) -> float:
+        """Smoothed real-time factor (None before the first decode)."""
+        return self._rtf
+
+    def get_backlog_seconds(self) -> float:
+        return self._backlog
+
+    def is_falling_behind(self) -> bool:
+        with self._lock:
+            if self._rtf is None:
+                return False
+            # a minimum window decode does not fit the longest interval
+            if self._rtf * self._min_window > self._max_interval:
+                return True
+            return self._backlog > FALLING_BEHIND_INTERVALS * self._interval
+
+    def get_params(self) -> Dict[str, float]:
+        """Chosen parameters + the measurements they are based on."""
+        return {
+            "interval": self._interval,
+            "window_seconds": self._window,
+            "rtf": self._rtf,
+            "backlog_seconds": self._backlog,
+            "falling_behind": self.is_falling_behind(),
+        }
@@ -1,27 +1,37 @@
-import ffmpeg
 import pyaudio
 import wave
 import os
 import time
 import numpy as np
 import threading
+import bisect
 
 import pvporcupine
 import json
 
-from concurrent.futures import ThreadPoolExecutor
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import wait as wait_futures
 from queue import Queue
-from typing import List, Tuple, Dict, Any
+from functools import partial
+from typing import List, Tuple, Dict, Any, Union, Callable
 
-from pywhispercpp.model import Model as WhisperModel
 from pywhispercpp.model import Segment as WhisperSegment
 import traceback
 
-import pickle
-
-
 from source import requesthandler
+from source.audiobuffer import AudioRingBuffer
+from source.audioprocessing import AudioPreprocessor, VoiceActivityDetector
+from source.audiodecoder import FFmpegStreamDecoder, decode_audio_file
+from source.replayclock import SystemClock, ReplayClock, REPLAY_LOCKSTEP
+from source import pipelinestate
+from source.pipelinestate import PipelineState
+from source.localagreement import LocalAgreement, COMMIT_TOLERANCE_MILLIS
+from source.updatescheduler import AdaptiveScheduler
+from source.sessionformat import SessionFile, write_session
+from source.sessionjournal import SessionJournal, recover_session
+from source.sessioncatalog import SessionCatalog
+from source.segmentevents import SegmentEventQueue
+from source.decoderprocess import DecoderProcess
 
 
 from dotenv import load_dotenv
@@ -37,6 +47,50 @@ SEGMENT_UPDATED = 2
 
 BACKEND_IP = os.environ.get("BACKEND_IP", "http://localhost:5001")
 
+# AsyncMicrophone ring consumers -- each reads on its own thread / cursor
+WAKE_CONSUMER = "wake"
+WHISPER_CONSUMER = "whisper"
+AUDIO_DATA_CONSUMER = "audio_data"
+CAPTURE_CONSUMER = "capture"
+
+# seconds of raw frames the portaudio callback can queue for the mic thread
+CAPTURE_BUFFER_SECONDS = 2.0
+
+# AudioStorage sample formats -- float32 [-1.0, 1.0] or compact int16 pcm
+STORAGE_DTYPES = (np.float32, np.int16)
+INT16_TO_FLOAT32 = np.float32(1.0 / 32768.0)
+FLOAT32_TO_INT16 = np.float32(32768.0)
+
+# pywhispercpp keeps params set on the model between calls, so every decode
+# sets the ones the streaming policies change
+DECODE_PARAMS = {
+    "token_timestamps": False,
+    "max_len": 0,
+    "split_on_word": False,
+    "initial_prompt": "",
+}
+# one segment per word (with timestamps) for LocalAgreement
+WORD_DECODE_PARAMS = {
+    "token_timestamps": True,
+    "max_len": 1,
+    "split_on_word": True,
+}
+
+# LocalAgreement streaming
+DEFAULT_MAX_WINDOW_SECONDS = 15.0
+SENTENCE_END = (".", "?", "!")
+
+# after this many cancelled partials in a row the next one always finishes,
+# otherwise a model slower than real time would never produce a partial
+MAX_CONSECUTIVE_CANCELS = 2
+
+# ------------------------------------------------------------ #
+# decode cancellation
+# ------------------------------------------------------------ #
+
+# per thread result of the last decode -- aborted (decoder child killed) or not
+_decode_local = threading.local()
+
 # ------------------------------------------------------------ #
 # API functions
 # ------------------------------------------------------------ #
@@ -95,19 +149,37 @@ class AsyncMicrophone(threading.Thread):
         chunk_size: int,
         picovoice_phrase_files: List[str],
         filename: str = None,
-        global_run_config: Dict[str, Any] = None,
+        pipeline_state: PipelineState = None,
+        buffer_seconds: float = 30.0,
+        capture_mode: str = "callback",
+        preroll_seconds: float = 1.5,
+        replay_speed: float = 1.0,
     ):
         super().__init__(daemon=True, name=f"AsyncMicrophone-{int(time.time())}")
 
         self._audio = pyaudio.PyAudio()
         self._stream = None
         self._is_running = False
-        self._audio_queue: Queue[np.array] = Queue()
-        self._audio_queue_lock = threading.RLock()
 
-        # Add buffer for accumulating audio data
-        self._audio_buffer = np.array([], dtype=np.float32)
-        self._buffer_lock = threading.RLock()
+        # preallocated capture buffer (single producer: this thread)
+        # always holds at least the pre-roll window
+        self._preroll_samples = int(desired_config.sample_rate * preroll_seconds)
+        self._ring_buffer = AudioRingBuffer(
+            max(int(desired_config.sample_rate * buffer_seconds), self._preroll_samples)
+        )
+        # cursor used by get_audio_data() / clear_audio_data()
+        self._read_cursor = 0
+
+        # capture mode: "callback" (portaudio pushes frames) or "blocking"
+        if capture_mode not in ("callback", "blocking"):
+            raise ValueError(f"Unknown capture mode: {capture_mode}")
+        self._capture_mode = capture_mode
+        self._audio_available = threading.Event()
+
+        # callback mode: raw int16 frames as portaudio delivers them, drained
+        # (downmix + resample) by this thread -- created once the stream opens
+        self._capture_ring = None
+        self._capture_cursor = 0
 
         # Store the original larger chunk size for whisper
         self._whisper_chunk_size = chunk_size
@@ -130,7 +202,11 @@ class AsyncMicrophone(threading.Thread):
         self._is_file = filename is not None
         self._filename = filename
 
-        self._GLOBAL_ARGS = global_run_config
+        # files are replayed on a virtual clock (1x, Nx or lockstep), live
+        # capture runs on the wall clock
+        self._clock = ReplayClock(replay_speed) if self._is_file else SystemClock()
+
+        self._pipeline_state = pipeline_state
 
         # create picovoice model instance
         self._porcupine_phrase_files = picovoice_phrase_files
@@ -139,12 +215,36 @@ class AsyncMicrophone(threading.Thread):
             keyword_paths=self._porcupine_phrase_files,
         )
 
-        if filename:
+        # wake word detection reads porcupine sized frames out of the ring
+        self._wake_cursor = 0
+        self._wake_detected_cursor = 0
+        self._wake_scratch = np.zeros(self._porcupine.frame_length, dtype=np.float32)
+        self._wake_frame = np.zeros(self._porcupine.frame_length, dtype=np.int16)
+        self._frames_per_buffer = self._porcupine.frame_length
+
+        if filename and filename.endswith(".wav"):
             self._audio_config = AudioConfig.get_config_from_wav(filename)
             self._sample_rate = self._audio_config.sample_rate
             self._audio_format = self._audio_config.audio_format
             self._channels = self._audio_config.channels
 
+        # downmix + resample from the source format to the desired format
+        self._preprocessor = AudioPreprocessor(
+            self._sample_rate, self._channels, desired_config.sample_rate
+        )
+
+    def _set_source_config(self, audio_config: AudioConfig):
+        """Switch the source format (e.g. after opening a file) and rebuild the preprocessor."""
+        self._audio_config = audio_config
+        self._sample_rate = audio_config.sample_rate
+        self._audio_format = audio_config.audio_format
+        self._channels = audio_config.channels
+        self._bytes_per_sample = audio_config.get_bytes_per_sample()
+        self._bytes_per_second = audio_config.get_bytes_per_second()
+        self._preprocessor = AudioPreprocessor(
+            self._sample_rate, self._channels, self._desired_config.sample_rate
+        )
+
     def run(self):
         """Start the audio stream and process audio data."""
 
@@ -154,84 +254,72 @@ class AsyncMicrophone(threading.Thread):
             if not os.path.exists(self._filename):
                 raise FileNotFoundError(f"File not found: {self._filename}")
 
-            # if not wav, use ffmpeg
-            if not self._filename.endswith(".wav"):
-                # convert to wav
-                print(f"Converting {self._filename} to wav format...")
-                out_file = self._filename.replace(".m4a", ".wav")
-                ffmpeg.input(self._filename).output(
-                    out_file,
-                    ar=self._desired_config.sample_rate,
-                    ac=self._desired_config.channels,
-                    acodec="pcm_s16le",
-                    format="wav",
-                ).run()
-                self._filename = out_file
-
-            # open wav file
-            wf = wave.open(self._filename, "rb")
-
-            # verify file format matches audio_config
-            if (
-                not wf.getframerate() == self._sample_rate
-                or not wf.getnchannels() == self._channels
-                or not wf.getsampwidth() == self._audio_config.get_bytes_per_sample()
-            ):
-                # use ffmpeg to convert to correct format
-                print(
-                    f"File format does not match audio_config. Converting {self._filename} to correct format..."
-                )
-                out_file = self._filename.replace(".wav", "_converted.wav")
-                ffmpeg.input(self._filename).output(
-                    out_file,
-                    ar=self._desired_config.sample_rate,
-                    ac=self._desired_config.channels,
-                    acodec="pcm_s16le",
-                    format="wav",
-                ).run()
-                self._filename = out_file
+            # 16-bit wav files are read directly (rate / channel mismatches are
+            # handled in memory by the preprocessor), anything else is streamed
+            # through an ffmpeg decode pipe -- no converted files on disk
+            wf = None
+            if self._filename.endswith(".wav"):
                 wf = wave.open(self._filename, "rb")
-                print(
-                    f"Converted {self._filename} to correct format: {self._sample_rate}Hz, {self._channels} channels, {self._audio_config.get_bytes_per_sample()} bytes per sample"
+                if not wf.getsampwidth() == pyaudio.get_sample_size(pyaudio.paInt16):
+                    wf.close()
+                    wf = None
+
+            if wf is None:
+                print(f"Decoding {self._filename} through ffmpeg...")
+                wf = FFmpegStreamDecoder(
+                    self._filename,
+                    sample_rate=self._desired_config.sample_rate,
+                    channels=self._desired_config.channels,
                 )
 
+            # stream at the file's native rate / channels
+            self._set_source_config(
+                AudioConfig(wf.getframerate(), wf.getnchannels(), pyaudio.paInt16)
+            )
+            print(
+                f"Reading {self._sample_rate}Hz, {self._channels} channel audio -> {self._desired_config.sample_rate}Hz mono"
+            )
+
             # begin reading from file at same rate of time as real life
             print(f"Reading from file: {self._filename}")
             self._is_running = True
             while self._is_running:
+                # pause while a session is wrapped up -- a file has no wake
+                # word, so the next session is armed right after it (before
+                # waiting on the clock: a lockstep replay only demands audio
+                # once a session runs)
+                if self._pipeline_state.is_in(pipelinestate.IDLE, pipelinestate.COMPLETING):
+                    print("Pausing microphone recording...")
+                    if self._pipeline_state.wait_for(pipelinestate.IDLE) == pipelinestate.STOPPED:
+                        break
+                    self._wake_detected_cursor = self._ring_buffer.get_write_cursor()
+                    self._pipeline_state.transition(
+                        pipelinestate.LISTENING, expected=(pipelinestate.IDLE,)
+                    )
+
+                # wait until the replay clock wants more audio
+                if not self._clock.wait_for_demand():
+                    break
+
                 raw = wf.readframes(self._chunk_size)
                 if not raw:
                     break
 
-                # convert raw bytes to float32 normalized
-                audio_data = (
-                    np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+                # convert + push into the ring buffer
+                self._push_audio(raw)
+                self._clock.advance(
+                    len(raw) / (self._channels * self._bytes_per_sample) / self._sample_rate
                 )
 
-                # if multi-channel, average to mono
-                if self._channels > 1:
-                    audio_data = np.mean(
-                        audio_data.reshape(-1, self._channels), axis=1
-                    ).astype(np.float32)
-                    audio_data = audio_data[0]
-
-                # enqueue for processing
-                with self._audio_queue_lock:
-                    self._audio_queue.put(audio_data)
-
-                # sleep to maintain sample rate
-                time.sleep(self._chunk_size / self._sample_rate)
-
-                # pause if not enabled
-                if not self._GLOBAL_ARGS["enable_mic"]:
-                    print("Pausing microphone recording...")
-
-                    # wait until enabled again
-                    while not self._GLOBAL_ARGS["enable_mic"]:
-                        time.sleep(0.1)
-
             wf.close()
+            self._clock.finish()
             print("Finished reading file.")
+
+            # the replay ends with the file -- once the last session is
+            # wrapped up the pipeline stops
+            if self._is_running:
+                self._pipeline_state.wait_for(pipelinestate.IDLE)
+                self._pipeline_state.stop()
             return
         else:
             # ------------------------------------------------------------ #
@@ -252,71 +340,63 @@ class AsyncMicrophone(threading.Thread):
             # _input = 0
             print(f"Selected device: {_mic_choices[_input-1]}")
 
+            if self._desired_config.sample_rate != self._porcupine.sample_rate:
+                print(
+                    f"Warning: porcupine expects {self._porcupine.sample_rate}Hz audio, capture buffer is {self._desired_config.sample_rate}Hz"
+                )
+
             # open mic stream
+            # - callback mode: portaudio copies raw frames into the capture
+            #   ring on its own thread, this thread preprocesses them
+            # - blocking mode: this thread reads the stream itself
+            if self._capture_mode == "callback":
+                # whole frames only, so a wrap never splits one
+                self._capture_ring = AudioRingBuffer(
+                    int(self._sample_rate * CAPTURE_BUFFER_SECONDS) * self._channels,
+                    dtype=np.int16,
+                )
+                self._capture_cursor = 0
             self._stream = self._audio.open(
                 format=self._audio_format,
                 channels=self._channels,
                 rate=self._sample_rate,
                 input=True,
                 input_device_index=_input,
+                frames_per_buffer=self._frames_per_buffer,
+                stream_callback=(
+                    self._stream_callback if self._capture_mode == "callback" else None
+                ),
             )
-            print("Recording...")
+            print(f"Recording ({self._capture_mode} mode)...")
 
             # ------------------------------------------------------------ #
             # start recording
 
             try:
                 self._is_running = True
-                while self._is_running:
-
-                    # Check if we should process audio
-                    self._GLOBAL_ARGS["mic_mutex"].acquire()
-                    if self._GLOBAL_ARGS["enable_mic"]:
-                        self._GLOBAL_ARGS["mic_mutex"].release()
+                self._wake_cursor = self._ring_buffer.get_write_cursor()
+                if self._capture_mode == "callback":
+                    self._stream.start_stream()
 
+                while self._is_running:
+                    if self._capture_mode == "callback":
+                        # wait for the callback to deliver new frames
+                        self._audio_available.wait(timeout=0.1)
+                        self._audio_available.clear()
+                        self._drain_capture()
+                    else:
                         # read audio data from stream
                         audio_data = self._stream.read(
-                            self._chunk_size, exception_on_overflow=False
+                            self._frames_per_buffer, exception_on_overflow=False
                         )
-                        audio_data = np.frombuffer(audio_data, dtype=np.int16)
-                        audio_data = audio_data.astype(np.float32) / 32768.0
-
-                        # convert into 1 channel if multiple channels
-                        if self._channels > 1:
-                            # finds avg b/t channels
-                            audio_data = np.mean(
-                                # converts into 2d array with 2 cols
-                                # 1 col for each channel
-                                audio_data.reshape(-1, self._channels),
-                                axis=1,
-                            ).astype(np.float32)
-
-                            # take first col
-                            audio_data = audio_data[0]
-
-                        # push audio into queue + thread safe
-                        with self._audio_queue_lock:
-                            self._audio_queue.put(audio_data)
+                        self._push_audio(audio_data)
 
+                    # whisper reads the ring on its own schedule -- only the
+                    # wake word detector is driven from this thread
+                    if self._pipeline_state.is_in(pipelinestate.IDLE):
+                        self._detect_wake_word()
                     else:
-                        self._GLOBAL_ARGS["mic_mutex"].release()
-                        # ------------------------------------------------ #
-                        # Read small frames for wake word detection
-                        audio_data = self._stream.read(
-                            self._porcupine._frame_length, exception_on_overflow=False
-                        )
-                        # run porcupine code
-                        audio_data = np.frombuffer(audio_data, dtype=np.int16)
-
-                        # Wake word detection
-                        pvporcupine_result = self._porcupine.process(audio_data)
-
-                        if pvporcupine_result >= 0:
-                            print("Wake word detected! Starting recording...")
-                            with self._GLOBAL_ARGS["wake_word_mutex"]:
-                                self._GLOBAL_ARGS["wake_word_detected"] = True
-                            with self._GLOBAL_ARGS["mic_mutex"]:
-                                self._GLOBAL_ARGS["enable_mic"] = True
+                        self._wake_cursor = self._ring_buffer.get_write_cursor()
 
             except KeyboardInterrupt:
                 print("Recording stopped by user.")
@@ -335,6 +415,62 @@ class AsyncMicrophone(threading.Thread):
     def stop(self):
         """Stop the audio stream."""
         self._is_running = False
+        self._audio_available.set()
+        self._clock.finish()
+
+    def _stream_callback(self, in_data, frame_count, time_info, status):
+        """PortAudio callback -- only copies the raw frames into the capture ring."""
+        self._capture_ring.write_int16(in_data)
+        self._audio_available.set()
+        return (None, pyaudio.paContinue if self._is_running else pyaudio.paComplete)
+
+    def _detect_wake_word(self):
+        """Run porcupine over every complete frame captured since the last call."""
+        frame_length = self._porcupine.frame_length
+        write_cursor = self._ring_buffer.get_write_cursor()
+        self._wake_cursor = max(self._wake_cursor, self._ring_buffer.get_oldest_cursor())
+
+        while self._wake_cursor + frame_length <= write_cursor:
+            frame = self._ring_buffer.read_range(
+                self._wake_cursor,
+                self._wake_cursor + frame_length,
+                contiguous=True,
+                consumer=WAKE_CONSUMER,
+            )
+            self._wake_cursor += frame_length
+
+            # float32 -> int16 into reused buffers
+            np.multiply(frame, 32768.0, out=self._wake_scratch)
+            np.clip(self._wake_scratch, -32768.0, 32767.0, out=self._wake_scratch)
+            np.copyto(self._wake_frame, self._wake_scratch, casting="unsafe")
+
+            # Wake word detection
+            if self._porcupine.process(self._wake_frame) >= 0:
+                print("Wake word detected! Starting recording...")
+                # audio after the wake word is picked up from here
+                self._wake_detected_cursor = self._wake_cursor
+                self._pipeline_state.transition(
+                    pipelinestate.LISTENING, expected=(pipelinestate.IDLE,)
+                )
+                return
+
+    def _drain_capture(self):
+        """Preprocess the frames the callback captured since the last call."""
+        views, self._capture_cursor = self._capture_ring.read_since(
+            self._capture_cursor, consumer=CAPTURE_CONSUMER
+        )
+        for view in views:
+            self._push_audio(view)
+
+    def _push_audio(self, raw: Union[bytes, np.ndarray]):
+        """Convert raw int16 PCM to float32 mono at the desired rate and write it into the ring buffer."""
+        if self._preprocessor.is_passthrough():
+            # int16 -> float32 happens in place inside the ring
+            self._ring_buffer.write_int16(raw)
+            return
+
+        # downmix + resample, then copy into the ring
+        self._ring_buffer.write(self._preprocessor.process(raw))
 
     # ------------------------------------------------------------ #
     # helper functions
@@ -360,40 +496,103 @@ class AsyncMicrophone(threading.Thread):
     def get_bytes_per_second(self) -> int:
         return self._bytes_per_second
 
-    def get_audio_data(self) -> List[bytes]:
-        """Flush audio data from the queue."""
-        result = []
+    def get_clock(self):
+        """Clock that audio timing should be measured against (virtual for file replay)."""
+        return self._clock
+
+    def is_replay(self) -> bool:
+        """True if audio comes from a file instead of a live device."""
+        return self._is_file
 
-        # clear queue
-        with self._audio_queue_lock:
-            while not self._audio_queue.empty():
-                result.append(self._audio_queue.get())
+    def get_ring_buffer(self) -> AudioRingBuffer:
+        return self._ring_buffer
 
+    def get_write_cursor(self) -> int:
+        """Absolute sample count written so far -- use as a read_since() cursor."""
+        return self._ring_buffer.get_write_cursor()
+
+    def get_wake_cursor(self) -> int:
+        """Ring cursor right after the last detected wake word."""
+        return self._wake_detected_cursor
+
+    def get_preroll_cursor(self) -> int:
+        """Ring cursor `preroll_seconds` before the last detected wake word."""
+        return max(
+            self._ring_buffer.get_oldest_cursor(),
+            self._wake_detected_cursor - self._preroll_samples,
+        )
+
+    def read_since(
+        self, cursor: int, contiguous: bool = False, consumer: str = WHISPER_CONSUMER
+    ) -> Tuple[Union[List[np.ndarray], np.ndarray], int]:
+        """
+        Read all audio captured after `cursor`.
+
+        Returns (views, new_cursor) -- see AudioRingBuffer.read_since.
+        """
+        return self._ring_buffer.read_since(cursor, contiguous=contiguous, consumer=consumer)
+
+    def get_audio_data(self) -> List[np.ndarray]:
+        """Flush audio data captured since the last call (as ring views)."""
+        result, self._read_cursor = self._ring_buffer.read_since(
+            self._read_cursor, consumer=AUDIO_DATA_CONSUMER
+        )
         return result
 
     def clear_audio_data(self):
-        """Clear the audio queue."""
-        with self._audio_queue_lock:
-            while not self._audio_queue.empty():
-                self._audio_queue.get()
+        """Drop all audio captured so far."""
+        self._read_cursor = self._ring_buffer.get_write_cursor()
+
+
+def _convert_samples(src: np.ndarray, dst: np.ndarray):
+    """Copy `src` into `dst`, converting between float32 and int16 pcm."""
+    if src.dtype == dst.dtype:
+        dst[:] = src
+    elif dst.dtype == np.int16:
+        dst[:] = np.clip(np.rint(src * FLOAT32_TO_INT16), -32768, 32767)
+    else:
+        np.multiply(src, INT16_TO_FLOAT32, out=dst, casting="unsafe")
 
 
 class AudioChunk:
     """Audio chunk with proper timing calculations."""
 
+    # initial capacity when none is given (grows by doubling)
+    DEFAULT_CAPACITY = 4096
+
     def __init__(
         self,
         audio_config: AudioConfig,
         default_data: np.ndarray = None,
         start_time: float = 0.0,
+        capacity: int = 0,
+        start_sample: int = None,
+        buffer: np.ndarray = None,
+        dtype=np.float32,
     ):
         self._audio_config = audio_config
         self._sample_rate = audio_config.sample_rate
 
-        # Store audio as float32 [-1.0, 1.0]
-        self._samples = (
-            default_data if default_data is not None else np.array([], dtype=np.float32)
+        # integer position of the first sample -- exact, unlike start_time
+        if start_sample is None:
+            start_sample = int(round(start_time * self._sample_rate))
+        self._start_sample = start_sample
+        start_time = start_sample / self._sample_rate
+
+        # Store audio as float32 [-1.0, 1.0] (or int16 pcm) in a preallocated
+        # buffer (or a caller supplied one, e.g. a np.memmap), _samples is a
+        # view of the filled prefix
+        _initial = (
+            default_data if default_data is not None else np.array([], dtype=dtype)
         )
+        if buffer is not None:
+            self._buffer = buffer
+        else:
+            self._buffer = np.empty(
+                max(capacity or self.DEFAULT_CAPACITY, len(_initial)), dtype=dtype
+            )
+        _convert_samples(_initial, self._buffer[: len(_initial)])
+        self._samples = self._buffer[: len(_initial)]
 
         # Time tracking (in seconds)
         self._start_time = start_time
@@ -401,14 +600,28 @@ class AudioChunk:
         self._end_time = start_time + (self._num_samples / self._sample_rate)
 
     def append_audio_data(self, audio_data: np.ndarray):
-        """Append audio data to the chunk."""
+        """Append audio data to the chunk (amortized O(1) per sample)."""
         if len(audio_data) == 0:
             return
 
-        self._samples = np.concatenate((self._samples, audio_data))
-        self._num_samples = len(self._samples)
+        # grow by doubling when the buffer is full
+        _needed = self._num_samples + len(audio_data)
+        if _needed > len(self._buffer):
+            _grown = np.empty(
+                max(_needed, len(self._buffer) * 2), dtype=self._buffer.dtype
+            )
+            _grown[: self._num_samples] = self._samples
+            self._buffer = _grown
+
+        _convert_samples(audio_data, self._buffer[self._num_samples : _needed])
+        self._num_samples = _needed
+        self._samples = self._buffer[:_needed]
         self._end_time = self._start_time + (self._num_samples / self._sample_rate)
 
+    def get_remaining_capacity(self) -> int:
+        """Number of samples that fit before the buffer has to grow."""
+        return len(self._buffer) - self._num_samples
+
     def get_audio_from_time(
         self, start_time: float, end_time: float = -1
     ) -> np.ndarray:
@@ -436,99 +649,436 @@ class AudioChunk:
         # Return the slice
         return self._samples[start_sample:end_sample]
 
+    def get_audio_from_samples(self, start_sample: int, end_sample: int) -> np.ndarray:
+        """Get a view of the audio between two absolute sample indices (clamped to this chunk)."""
+        start = max(0, start_sample - self._start_sample)
+        end = min(self._num_samples, end_sample - self._start_sample)
+        if start >= end:
+            return self._samples[:0]
+        return self._samples[start:end]
+
+    def get_start_sample(self) -> int:
+        return self._start_sample
+
+    def get_end_sample(self) -> int:
+        return self._start_sample + self._num_samples
+
     def get_audio_duration(self) -> float:
         """Get duration of the audio in seconds."""
         return self._num_samples / self._sample_rate
 
     def get_samples(self) -> np.ndarray:
-        """Get all audio samples."""
+        """Get all audio samples (in the chunk's storage dtype)."""
         return self._samples
 
+    def get_dtype(self) -> np.dtype:
+        return self._buffer.dtype
+
     def __len__(self):
         """Get the number of samples."""
         return self._num_samples
 
 
+class AudioStorageSnapshot:
+    """
+    Immutable view of an AudioStorage at one point in time.
+
+    Holds the chunk list and the published sample count. Storage is append
+    only and samples are written before they are published, so everything
+    below total_samples is never modified again -- reading through a
+    snapshot needs no lock.
+    """
+
+    def __init__(
+        self,
+        chunks: Tuple[AudioChunk, ...],
+        chunk_starts: Tuple[int, ...],
+        first_sample: int,
+        total_samples: int,
+        committed_sample: int,
+        sequence: int,
+        read_scratch=None,
+    ):
+        self.chunks = chunks
+        self.chunk_starts = chunk_starts
+        self.first_sample = first_sample
+        self.total_samples = total_samples
+        self.committed_sample = committed_sample
+        self.sequence = sequence
+        self._read_scratch = read_scratch
+
+    def get_audio_range_samples(
+        self, start_sample: int, end_sample: int = -1
+    ) -> np.ndarray:
+        """Get float32 audio between two sample indices (see AudioStorage)."""
+        # Handle default end
+        if end_sample == -1 or end_sample > self.total_samples:
+            end_sample = self.total_samples
+        start_sample = max(self.first_sample, start_sample)
+        if start_sample >= end_sample:
+            return np.array([], dtype=np.float32)
+
+        # binary search for the chunks holding the first / last sample
+        first = bisect.bisect_right(self.chunk_starts, start_sample) - 1
+        last = bisect.bisect_right(self.chunk_starts, end_sample - 1) - 1
+
+        _float = self.chunks[first].get_dtype() == np.float32
+        if first == last and _float:
+            _start = self.chunk_starts[first]
+            return self.chunks[first]._buffer[start_sample - _start : end_sample - _start]
+
+        # spans chunks / needs widening -- fill a single output buffer
+        if _float or self._read_scratch is None:
+            result = np.empty(end_sample - start_sample, dtype=np.float32)
+        else:
+            result = self._read_scratch(end_sample - start_sample)
+        _offset = 0
+        for i in range(first, last + 1):
+            _start = self.chunk_starts[i]
+            _buffer = self.chunks[i]._buffer
+            _lo = max(start_sample, _start) - _start
+            _hi = min(end_sample, _start + len(_buffer)) - _start
+            _convert_samples(_buffer[_lo:_hi], result[_offset : _offset + _hi - _lo])
+            _offset += _hi - _lo
+        return result[:_offset]
+
+    def get_chunk_samples(self, index: int) -> np.ndarray:
+        """Published samples of chunk `index` (in the storage dtype)."""
+        _start = self.chunk_starts[index]
+        _buffer = self.chunks[index]._buffer
+        return _buffer[: max(0, min(len(_buffer), self.total_samples - _start))]
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __len__(self):
+        return len(self.chunks)
+
+
 class AudioStorage:
-    """Audio storage with correct timing and sample handling."""
+    """
+    Audio storage with correct timing and sample handling.
+
+    Audio is addressed by integer sample index internally; second / millisecond
+    ranges are converted once at the edges so float arithmetic cannot drift.
+    Chunks are indexed by start sample and looked up with a binary search.
+
+    Retention (optional):
+    - max_retained_duration: hard cap (seconds) on audio kept in memory, the
+      oldest whole chunks are evicted once it is exceeded
+    - evict_committed: evict chunks that end before the commit point set by
+      commit_before() (WhisperCore commits everything before the t0 of the
+      segment it is still decoding)
+    - spill_sink: callable(AudioChunk) receiving every evicted chunk, e.g. a
+      WavSpillSink -- otherwise evicted audio is dropped
+
+    Backing (optional):
+    - backing_file: keep the samples in a raw PCM file instead of RAM.
+      Every chunk is a np.memmap of its own region of the file, so range
+      reads inside a chunk are zero-copy views of the page cache and resident
+      memory stays small. Sample n lives at byte offset n * itemsize.
+      reset() unlinks the file and starts the next session in a new one at
+      the same path, so snapshots / saves taken before the reset keep
+      reading their own audio (the old mapping lives until it is dropped).
+
+    Sample format:
+    - sample_dtype=np.float32: ranges inside a chunk are returned as views
+    - sample_dtype=np.int16: half the memory / disk. Ranges are widened to
+      float32 into a per-thread scratch buffer -- the returned array is only
+      valid until the calling thread's next range read.
+
+    Concurrency: one writer (append / commit / reset, serialised by
+    _audio_cache_lock) and any number of lock-free readers. The writer
+    fills samples first and then publishes a new AudioStorageSnapshot with a
+    single reference assignment, so readers never wait behind an append and
+    an append never waits behind a range copy. Resets bump a seqlock style
+    sequence (odd while in progress); readers retry a copy that overlapped
+    one.
+
+    Sample indices stay absolute after eviction. Ranges that reach into
+    evicted audio are clamped to the oldest retained sample.
+    """
+
+    def __init__(
+        self,
+        audio_config: AudioConfig,
+        max_chunk_duration: float = 10.0,
+        max_retained_duration: float = None,
+        evict_committed: bool = False,
+        spill_sink=None,
+        backing_file: str = None,
+        sample_dtype=np.float32,
+    ):
+        if np.dtype(sample_dtype) not in [np.dtype(x) for x in STORAGE_DTYPES]:
+            raise ValueError(f"Unsupported sample dtype: {np.dtype(sample_dtype)}")
 
-    def __init__(self, audio_config: AudioConfig, max_chunk_duration: float = 10.0):
         self._audio_config = audio_config
         self._sample_rate = audio_config.sample_rate
+        self._total_samples = 0
         self._total_duration = 0.0
 
-        # Audio storage in chunks
+        # Audio storage in chunks + start sample of each chunk (sorted)
         self._chunks = []
+        self._chunk_starts = []
         self._audio_cache_lock = threading.RLock()
         self._max_chunk_duration = max_chunk_duration  # seconds per chunk
 
+        # every chunk is preallocated to hold exactly max_chunk_duration
+        self._chunk_capacity = max(1, int(max_chunk_duration * self._sample_rate))
+
+        # retention policy
+        self._max_retained_samples = (
+            None
+            if max_retained_duration is None
+            else int(max_retained_duration * self._sample_rate)
+        )
+        self._evict_committed = evict_committed
+        self._spill_sink = spill_sink
+        self._committed_sample = 0
+        self._evicted_samples = 0  # == start sample of the oldest retained chunk
+
+        # storage format + per reader float32 scratch for widening int16 reads
+        self._sample_dtype = np.dtype(sample_dtype)
+        self._scratch_local = threading.local()
+
+        # disk backing
+        self._backing_file = backing_file
+        self._backing_handle = None
+        if backing_file is not None:
+            self._backing_handle = open(backing_file, "w+b")
+
+        # published state for lock-free readers
+        self._sequence = 0
+        self._snapshot = None
+        self._publish()
+
     def append_audio(self, audio_data: np.ndarray):
         """Add audio data to storage."""
         if len(audio_data) == 0:
             return
 
         with self._audio_cache_lock:
-            # Create first chunk if needed
-            if not self._chunks:
-                self._chunks.append(AudioChunk(self._audio_config))
-
-            # If current chunk is full, create a new one
-            current_chunk = self._chunks[-1]
-            if current_chunk.get_audio_duration() >= self._max_chunk_duration:
-                new_chunk = AudioChunk(
-                    self._audio_config, start_time=self._total_duration
+            _offset = 0
+            while _offset < len(audio_data):
+                # If there is no chunk or the current one is full, create a new one
+                if not self._chunks or self._chunks[-1].get_remaining_capacity() == 0:
+                    self._chunks.append(
+                        AudioChunk(
+                            self._audio_config,
+                            capacity=self._chunk_capacity,
+                            start_sample=self._total_samples,
+                            buffer=self._map_chunk(self._total_samples),
+                            dtype=self._sample_dtype,
+                        )
+                    )
+                    self._chunk_starts.append(self._total_samples)
+                current_chunk = self._chunks[-1]
+
+                # Add as much data as fits in the current chunk
+                _count = min(
+                    current_chunk.get_remaining_capacity(), len(audio_data) - _offset
                 )
-                self._chunks.append(new_chunk)
-                current_chunk = new_chunk
+                current_chunk.append_audio_data(audio_data[_offset : _offset + _count])
+                _offset += _count
+
+                # Update totals
+                self._total_samples += _count
+                self._total_duration = self._total_samples / self._sample_rate
+
+            self._apply_retention()
+            self._publish()
+
+    def _publish(self):
+        """Publish the writer's state to readers (writer lock held)."""
+        self._snapshot = AudioStorageSnapshot(
+            tuple(self._chunks),
+            tuple(self._chunk_starts),
+            self._evicted_samples,
+            self._total_samples,
+            self._committed_sample,
+            self._sequence,
+            read_scratch=self._get_read_scratch,
+        )
+
+    def snapshot(self) -> AudioStorageSnapshot:
+        """Current published state -- safe to read from any thread without locking."""
+        return self._snapshot
+
+    # ------------------------------------------------------------ #
+    # disk backing
+
+    def _map_chunk(self, start_sample: int) -> np.ndarray:
+        """Map the file region for a chunk starting at `start_sample` (None if in memory)."""
+        if self._backing_handle is None:
+            return None
+
+        _itemsize = self._sample_dtype.itemsize
+        _end = (start_sample + self._chunk_capacity) * _itemsize
+        # grow the (sparse) file so the region exists before mapping it
+        self._backing_handle.truncate(_end)
+        return np.memmap(
+            self._backing_handle,
+            dtype=self._sample_dtype,
+            mode="r+",
+            offset=start_sample * _itemsize,
+            shape=(self._chunk_capacity,),
+        )
+
+    def is_disk_backed(self) -> bool:
+        return self._backing_handle is not None
+
+    def get_backing_file(self) -> str:
+        return self._backing_file
+
+    def flush(self):
+        """Write dirty pages of a disk backed storage out to the file."""
+        for chunk in self._snapshot:
+            if isinstance(chunk._buffer, np.memmap):
+                chunk._buffer.flush()
+
+    def close(self):
+        """Flush and close the backing file (storage must not be used afterwards)."""
+        with self._audio_cache_lock:
+            if self._backing_handle is None:
+                return
+            self.flush()
+            self._sequence += 1
+            self._chunks = []
+            self._chunk_starts = []
+            self._publish()
+            self._sequence += 1
+            # trim the unused tail of the last chunk region
+            self._backing_handle.truncate(
+                self._total_samples * self._sample_dtype.itemsize
+            )
+            self._backing_handle.close()
+            self._backing_handle = None
 
-            # Add the data
-            current_chunk.append_audio_data(audio_data)
+    # ------------------------------------------------------------ #
+    # retention
 
-            # Update total duration
-            added_duration = len(audio_data) / self._sample_rate
-            self._total_duration += added_duration
+    def commit_before(self, sample: int):
+        """Mark all audio before `sample` as committed (no longer re-decoded)."""
+        with self._audio_cache_lock:
+            self._committed_sample = max(self._committed_sample, sample)
+            self._apply_retention()
+            self._publish()
+
+    def _apply_retention(self):
+        """Evict the chunks the retention policy no longer needs."""
+        evict_before = self._evicted_samples
+        if self._evict_committed:
+            evict_before = max(evict_before, self._committed_sample)
+        if self._max_retained_samples is not None:
+            evict_before = max(
+                evict_before, self._total_samples - self._max_retained_samples
+            )
+
+        # only whole chunks -- never the one currently being filled
+        _count = 0
+        while (
+            _count < len(self._chunks) - 1
+            and self._chunks[_count].get_end_sample() <= evict_before
+        ):
+            _count += 1
+        if _count:
+            self._evict_chunks(_count)
+
+    def _evict_chunks(self, count: int):
+        """Drop (or spill) the oldest `count` chunks."""
+        evicted = self._chunks[:count]
+        del self._chunks[:count]
+        del self._chunk_starts[:count]
+        self._evicted_samples = evicted[-1].get_end_sample()
+
+        if self._spill_sink is not None:
+            for chunk in evicted:
+                self._spill_sink(chunk)
+
+    def get_audio_range_samples(
+        self, start_sample: int, end_sample: int = -1
+    ) -> np.ndarray:
+        """
+        Get float32 audio data between two sample indices (lock-free).
+
+        float32 storage: a range inside a single chunk is returned as a view
+        (do not modify it); a range spanning chunks is copied into one
+        preallocated array.
+        int16 storage: the range is widened into the thread's read scratch.
+        """
+        while True:
+            _sequence = self._sequence
+            if _sequence & 1:
+                # reset in progress
+                time.sleep(0)
+                continue
+
+            result = self._snapshot.get_audio_range_samples(start_sample, end_sample)
+            if self._sequence == _sequence:
+                return result
+
+    def _get_read_scratch(self, size: int) -> np.ndarray:
+        """Calling thread's float32 scratch of at least `size` samples (grows by doubling)."""
+        _scratch = getattr(self._scratch_local, "buffer", None)
+        if _scratch is None or len(_scratch) < size:
+            _scratch = np.empty(
+                max(size, 0 if _scratch is None else len(_scratch) * 2),
+                dtype=np.float32,
+            )
+            self._scratch_local.buffer = _scratch
+        return _scratch[:size]
 
     def get_audio_range_seconds(
         self, start_sec: float, end_sec: float = -1
     ) -> np.ndarray:
         """Get audio data for a time range in seconds."""
-        with self._audio_cache_lock:
-            # Handle default end time
-            if end_sec == -1:
-                end_sec = self._total_duration
-
-            # Validate inputs
-            if start_sec < 0:
-                start_sec = 0
-            if end_sec > self._total_duration:
-                end_sec = self._total_duration
-            if start_sec >= end_sec:
-                return np.array([], dtype=np.float32)
-
-            # Collect audio from chunks
-            result = np.array([], dtype=np.float32)
-            for chunk in self._chunks:
-                chunk_data = chunk.get_audio_from_time(start_sec, end_sec)
-                if len(chunk_data) > 0:
-                    result = np.concatenate((result, chunk_data))
-
-            return result
+        return self.get_audio_range_samples(
+            self.seconds_to_samples(start_sec),
+            self.seconds_to_samples(end_sec) if end_sec != -1 else -1,
+        )
 
     def get_audio_range_millis(self, start_ms: int, end_ms: int = -1) -> np.ndarray:
         """Get audio data for a time range in milliseconds."""
-        # Convert milliseconds to seconds and use the seconds method
-        start_sec = start_ms / 1000.0
-        end_sec = end_ms / 1000.0 if end_ms != -1 else -1
-        return self.get_audio_range_seconds(start_sec, end_sec)
+        return self.get_audio_range_samples(
+            self.millis_to_samples(start_ms),
+            self.millis_to_samples(end_ms) if end_ms != -1 else -1,
+        )
+
+    def get_total_samples(self) -> int:
+        """Get total number of samples appended (including evicted audio)."""
+        return self._snapshot.total_samples
+
+    def get_sample_dtype(self) -> np.dtype:
+        return self._sample_dtype
+
+    def get_first_sample(self) -> int:
+        """Get the index of the oldest sample still held in memory."""
+        return self._snapshot.first_sample
+
+    def get_retained_samples(self) -> int:
+        """Get number of samples held in memory."""
+        _snapshot = self._snapshot
+        return _snapshot.total_samples - _snapshot.first_sample
 
     def get_total_duration_seconds(self) -> float:
         """Get total duration of all audio in seconds."""
-        with self._audio_cache_lock:
-            return self._total_duration
+        return self._snapshot.total_samples / self._sample_rate
 
     def get_total_duration_millis(self) -> int:
         """Get total duration of all audio in milliseconds."""
-        return int(self.get_total_duration_seconds() * 1000)
+        return self._snapshot.total_samples * 1000 // self._sample_rate
+
+    def seconds_to_samples(self, seconds: float) -> int:
+        """Convert seconds to a sample index."""
+        return int(round(seconds * self._sample_rate))
+
+    def millis_to_samples(self, millis: int) -> int:
+        """Convert milliseconds to a sample index."""
+        return int(millis) * self._sample_rate // 1000
+
+    def samples_to_millis(self, samples: int) -> int:
+        """Convert a sample index to milliseconds."""
+        return samples * 1000 // self._sample_rate
 
     def seconds_to_millis(self, seconds: float) -> int:
         """Convert seconds to milliseconds."""
@@ -541,73 +1091,181 @@ class AudioStorage:
     def reset(self):
         """Reset the audio storage."""
         with self._audio_cache_lock:
+            # odd sequence -- readers retry until the reset is published
+            self._sequence += 1
             self._chunks = []
+            self._chunk_starts = []
+            self._total_samples = 0
             self._total_duration = 0.0
+            self._committed_sample = 0
+            self._evicted_samples = 0
+            self._publish()
+            self._sequence += 1
+
+            # new session, new file -- chunks mapped before the reset keep
+            # the old (unlinked) file alive and unchanged
+            if self._backing_handle is not None:
+                self._backing_handle.close()
+                os.remove(self._backing_file)
+                self._backing_handle = open(self._backing_file, "w+b")
 
     def __iter__(self):
-        """Iterate over chunks."""
-        for chunk in self._chunks:
+        """Iterate over the published chunks."""
+        for chunk in self._snapshot:
             yield chunk
 
 
+class WavSpillSink:
+    """Spill sink for AudioStorage -- appends evicted chunks to a 16-bit wav file."""
+
+    def __init__(self, filename: str, audio_config: AudioConfig):
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._wav = wave.open(filename, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(audio_config.sample_rate)
+
+    def __call__(self, chunk: AudioChunk):
+        _pcm = np.empty(len(chunk), dtype=np.int16)
+        _convert_samples(chunk.get_samples(), _pcm)
+        with self._lock:
+            self._wav.writeframes(_pcm.tobytes())
+
+    def get_filename(self) -> str:
+        return self._filename
+
+    def close(self):
+        with self._lock:
+            self._wav.close()
+
+
 class WhisperCoreSave:
+    """
+    Saved transcription stream -- the audio storage snapshot + segments at
+    the time the save was taken (a later reset does not affect it).
+    """
+
     def __init__(self, audio_storage: AudioStorage, segments: List[WhisperSegment]):
         self._audio_storage = audio_storage
-        self._saved_segments = segments
+        self._snapshot = audio_storage.snapshot()
+        self._saved_segments = list(segments)
 
     # ------------------------------------------------------------ #
     # io functions
 
-    def save(self, save_file: str):
+    def save(self, save_file: str, metadata: dict = None, codec: str = None):
         """
-        Save the current state to a single file.
+        Save the current state to a single file (see source.sessionformat).
 
         File Format:
-        [1] Header Segment
-        [2] Whisper Model Config
-        [3] Audio File Storage
-        [4] Whisper Segment Storage
+        [1] Fixed Header (version, sample format, section offsets)
+        [2] Audio Section (contiguous raw PCM, memmap-able)
+        [3] Segment Table (JSON: audio config + segments with sample indices)
 
+        The audio is always copied into the file -- a disk backed storage's
+        file is reused by later sessions. `metadata` is stored in the segment
+        table next to the audio config.
+
+        codec="flac" / "opus" archives the session: the audio section is
+        stored as compressed blocks with a seek index (see write_session).
         """
-        # 15 in length
-        _header = b"WhisperCoreSave"
-
-        # model config
-        _config_chunk = {"bytes": pickle.dumps(self._audio_storage._audio_config)}
-
-        # model audio chunks
-        _audio_chunks = {
-            "count": len(self._audio_storage._chunks),
-            "duration": self._audio_storage.get_total_duration_millis(),
-            "max_chunk_duration": self._audio_storage._max_chunk_duration,
-            "chunks": [],
-        }
-        for i, chunk in enumerate(self._audio_storage._chunks):
-            _audio_chunks["chunks"].append(
+        _snapshot = self._snapshot
+        _storage = self._audio_storage
+        _config = _storage._audio_config
+
+        # segment table
+        _segments = []
+        for chunk in self._saved_segments:
+            _segments.append(
                 {
-                    "index": i,
-                    "start_time": chunk._start_time,
-                    "end_time": chunk._end_time,
-                    "samples": chunk.get_samples(),
+                    "timestamp": chunk.timestamp,
+                    "t0": chunk.segment.t0,
+                    "t1": chunk.segment.t1,
+                    "start_sample": _storage.millis_to_samples(int(chunk.segment.t0)),
+                    "end_sample": _storage.millis_to_samples(int(chunk.segment.t1)),
+                    "text": chunk.segment.text,
                 }
             )
 
-        # segment data
-        _segment_data = {
-            "count": len(self._saved_segments),
-            "segments": [pickle.dumps(seg) for seg in self._saved_segments],
-        }
+        write_session(
+            save_file,
+            sample_rate=_config.sample_rate,
+            dtype=_storage.get_sample_dtype(),
+            first_sample=_snapshot.first_sample,
+            audio_blocks=(
+                _snapshot.get_chunk_samples(i) for i in range(len(_snapshot))
+            ),
+            segments=_segments,
+            metadata={
+                "channels": _config.channels,
+                "audio_format": _config.audio_format,
+                "max_chunk_duration": _storage._max_chunk_duration,
+                **(metadata or {}),
+            },
+            codec=codec,
+        )
 
-        result = {
-            "header": _header,
-            "config": _config_chunk,
-            "audio_chunks": _audio_chunks,
-            "segment_data": _segment_data,
-        }
+    @staticmethod
+    def load(save_file: str) -> "WhisperCoreSave":
+        """Load a saved state (audio is copied out of the memmapped file)."""
+        session = SessionFile(save_file)
+        return WhisperCoreSave._from_session(
+            session.get_sample_rate(),
+            session.get_dtype(),
+            session.get_first_sample(),
+            session.get_audio(),
+            session.get_metadata(),
+            session.get_segments(),
+        )
+
+    @staticmethod
+    def recover(save_file: str) -> "WhisperCoreSave":
+        """Recover a journaled session (checkpoint parts + journal tail), None if absent."""
+        session = recover_session(save_file)
+        if session is None:
+            return None
+        return WhisperCoreSave._from_session(
+            session.sample_rate,
+            session.dtype,
+            session.first_sample,
+            session.get_audio(),
+            session.metadata,
+            session.segments,
+        )
 
-        # write to file as json
-        with open(save_file, "wb") as f:
-            pickle.dump(result, f)
+    @staticmethod
+    def _from_session(
+        sample_rate: int,
+        dtype: np.dtype,
+        first_sample: int,
+        audio: np.ndarray,
+        metadata: dict,
+        segments: list,
+    ) -> "WhisperCoreSave":
+        storage = AudioStorage(
+            AudioConfig(
+                sample_rate,
+                metadata.get("channels", 1),
+                metadata.get("audio_format", pyaudio.paInt16),
+            ),
+            max_chunk_duration=metadata.get("max_chunk_duration", 10.0),
+            sample_dtype=dtype,
+        )
+        # keep absolute sample indices -- evicted audio stays evicted
+        storage._total_samples = first_sample
+        storage._evicted_samples = first_sample
+        storage._committed_sample = first_sample
+        storage.append_audio(audio)
+        storage._publish()
+
+        segments = [
+            WhisperSegmentChunk(
+                x["timestamp"], WhisperSegment(t0=x["t0"], t1=x["t1"], text=x["text"])
+            )
+            for x in segments
+        ]
+        return WhisperCoreSave(storage, segments)
 
 
 class WhisperSegmentChunk:
@@ -625,32 +1283,145 @@ class WhisperCore:
 
     Data Retrieval:
     - user can only retrieve transcription data
+
+    Streaming policies (update_stream):
+    - default: re-decode from the t0 of the last segment to the end
+    - local_agreement=True: decode word timestamps and commit words once two
+      consecutive decodes agree on them (LocalAgreement). Decodes start at the
+      end of the committed words, are conditioned on the committed text via
+      initial_prompt and never exceed max_window_seconds of audio.
+
+    Two pass (optional):
+    - `model` should then be a fast model (tiny / base) for the partials
+    - final_model: a more accurate model that re-decodes the whole session
+      once on its own worker (finalize_async). Each model decodes in its own
+      DecoderProcess, so partials keep flowing while the final pass runs
+
+    Live segments (optional):
+    - stream_segments=True: segments are published the moment whisper.cpp
+      finalizes them (new_segment_callback) instead of after the whole
+      decode. iter_segment_events() yields (SEGMENT_UPDATED /
+      NEW_SEGMENT_CREATED, segment) events in the same sequence the
+      update_stream results describe, ending with each decode's result.
+      Pending updates of a segment are merged into one event (latest
+      state), events of a cancelled decode that were not consumed yet are
+      dropped and a reset drops the old session's pending events.
+
+    Scheduling (optional):
+    - scheduler: an AdaptiveScheduler fed with the speed of every completed
+      partial decode; its window replaces max_window_seconds. Without one a
+      fixed max_window_seconds scheduler only measures the decode speed
+      (get_decode_rtf). The window bounds LocalAgreement decodes only: the
+      default policy re-decodes the whole live segment, whose text replaces
+      the segment, so a shorter clip would cut the segment's start off
+
+    Persistence (optional):
+    - journal: a SessionJournal that audio blocks and segment changes are
+      appended to as they happen; it is compacted into a checkpoint every
+      checkpoint interval on its own worker (WhisperCoreSave.recover reads
+      it back). close_journal() on shutdown only fsyncs the journal.
     """
 
     def __init__(
         self,
         model: str,
         audio_storage: AudioStorage,
+        clock=None,
+        vad: VoiceActivityDetector = None,
+        local_agreement: bool = False,
+        max_window_seconds: float = DEFAULT_MAX_WINDOW_SECONDS,
+        final_model: str = None,
+        scheduler: AdaptiveScheduler = None,
+        stream_segments: bool = False,
+        journal: SessionJournal = None,
         **kwargs,
     ):
         self._audio_storage = audio_storage
-        self._model = WhisperModel(model, **kwargs)
-        self._model_lock = threading.RLock()
+        # wall clock, or the mic's virtual clock when replaying a file
+        self._clock = clock if clock is not None else SystemClock()
+        # whisper_full holds the GIL -- the model decodes in its own process
+        self._model = DecoderProcess(model, **kwargs)
+
+        # optional second pass model + its own worker
+        self._final_model = None
+        self._final_model_lock = threading.RLock()
+        self._final_pool = None
+        if final_model is not None:
+            # a process of its own, so it decodes alongside the partials
+            self._final_model = DecoderProcess(final_model, **kwargs)
+            self._final_pool = ThreadPoolExecutor(max_workers=1)
 
         # results container
         self._results_container = []
         self._results_container_lock = threading.RLock()
         self._whisper_model_lock = threading.RLock()
 
-        # threading
+        # threading -- update_stream_async runs decodes on the single worker,
+        # at most one running + one queued (coalesced) update
         self._thread_pool = ThreadPoolExecutor(max_workers=1)
+        self._async_lock = threading.Lock()
+        self._running_update: Future = None
+        self._pending_update: Future = None
+
+        # stale partial decodes are cancelled (newer request queued / reset)
+        self._reset_requested = False
+        self._gate_speech_sample = 0
+        self._consecutive_cancels = 0
+        self._decode_stats = {
+            "decodes": 0,
+            "cancelled": 0,
+            "decode_seconds": 0.0,
+            "audio_seconds": 0.0,
+            "saved_seconds": 0.0,
+        }
+
+        # adaptive cadence / window + how far finished decodes reach. Without
+        # a scheduler a fixed window one still measures the decode speed.
+        if scheduler is None:
+            scheduler = AdaptiveScheduler(
+                min_window_seconds=max_window_seconds, max_window_seconds=max_window_seconds
+            )
+        self._scheduler = scheduler
+        self._clip_horizon_sample = 0
+        self._decoded_horizon_sample = 0
+
+        # live segment events (tagged with the decode that published them)
+        self._stream_segments = stream_segments
+        self._segment_events = SegmentEventQueue()
+        self._decode_count = 0
+        self._live_decode = None
+
+        # append-only session journal + its checkpoint worker
+        self._journal = journal
+        self._journaled_segments = 0
+        self._checkpoint_future: Future = None
+        self._checkpoint_pool = None
+        if journal is not None:
+            self._checkpoint_pool = ThreadPoolExecutor(max_workers=1)
 
         # inactivity detection system
-        self._last_activity = [time.time(), None]
+        self._last_activity = [self._clock.time(), None]
+
+        # optional voice activity gate -- skips decodes during silence
+        self._vad = vad
+        self._last_decoded_speech_sample = 0
+
+        # optional LocalAgreement policy + committed words of the live segment
+        self._agreement = LocalAgreement() if local_agreement else None
+        self._segment_words = []
 
     # ------------------------------------------------------------ #
     # audio processing / transcription functions
 
+    def append_audio(self, audio_data: np.ndarray):
+        """Add new audio to storage (and run it through the VAD + journal)."""
+        _start_sample = self._audio_storage.get_total_samples()
+        self._audio_storage.append_audio(audio_data)
+        if self._vad is not None:
+            self._vad.process(audio_data)
+        if self._journal is not None and len(audio_data):
+            self._journal_audio(_start_sample, audio_data)
+
     def update_stream(self) -> Tuple[int, WhisperSegment]:
         """Updates the transcription with new audio data using correct time handling."""
 
@@ -660,16 +1431,20 @@ class WhisperCore:
         #   - add results to results container
         #   - update audio storage with new results
 
+        if self._agreement is not None:
+            result = self._update_stream_agreement()
+            self._journal_segments()
+            return result
+
         # STEP 1
         start_millis = 0
-        end_millis = -1  # always the end
 
         with self._results_container_lock:
             # find the proper start of the audio
             if not len(self._results_container):
                 # add empty segment item
                 _obj = WhisperSegmentChunk(
-                    time.time(),
+                    self._clock.time(),
                     WhisperSegment(
                         t0=0,
                         t1=0,
@@ -682,11 +1457,9 @@ class WhisperCore:
                 # yes results, start from end of last results
                 start_millis = int(self._results_container[-1].segment.t0)
 
-        # STEP 2
-        with self._audio_storage._audio_cache_lock:
-            audio_clip = self._audio_storage.get_audio_range_millis(
-                start_millis, end_millis
-            )
+        # STEP 1.5 + 2 -- voice activity gate, then read the clip. No decode
+        # window here: the result replaces the whole live segment.
+        start_millis, audio_clip = self._get_stream_clip(start_millis)
         if len(audio_clip) == 0:
             # no audio data to process
             return (-1, 0)
@@ -694,9 +1467,21 @@ class WhisperCore:
         # print("Audio Clip Size", len(audio_clip))
         # print("Audio Clip Duration", len(audio_clip) / self._audio_storage._sample_rate)
 
-        # STEP 3
-        results = self.transcribe_audio(audio_clip)
-        if len(results) == 0:
+        # STEP 3 -- the first segment replaces the last one, the rest are new
+        _streamed = [0]
+
+        def on_segment(seg: WhisperSegment):
+            self._publish_segment(
+                NEW_SEGMENT_CREATED if _streamed[0] else SEGMENT_UPDATED,
+                WhisperSegment(
+                    t0=seg.t0 + start_millis, t1=seg.t1 + start_millis, text=seg.text
+                ),
+                live=True,
+            )
+            _streamed[0] += 1
+
+        results = self._decode_stream_clip(audio_clip, on_segment=on_segment)
+        if results is None or len(results) == 0:
             # no results to process
             return (-1, 0)
 
@@ -707,16 +1492,7 @@ class WhisperCore:
             seg.text = seg.text.strip()
 
         # just check last segment for updates + etc -- detection algo
-        if (
-            self._last_activity[1] is not None
-            and self._last_activity[1] != results[-1].text
-        ):
-            # update last activity
-            self._last_activity[0] = time.time()
-            self._last_activity[1] = results[-1].text
-        if not self._last_activity[1]:
-            self._last_activity[0] = time.time()
-            self._last_activity[1] = results[-1].text
+        self._update_activity(results[-1].text)
 
         # STEP 5
         # update results container with new results
@@ -727,23 +1503,395 @@ class WhisperCore:
 
             # only change timestamp if text changes
             if _old_text.strip() != _new_text.strip():
-                self._results_container[-1].timestamp = time.time()
+                self._results_container[-1].timestamp = self._clock.time()
 
             if len(results) > 1:
                 # add new results
                 for seg in results[1:]:
                     # add new segment to results container
                     self._results_container.append(
-                        WhisperSegmentChunk(time.time(), seg)
+                        WhisperSegmentChunk(self._clock.time(), seg)
                     )
-                return (NEW_SEGMENT_CREATED, results[-1])
+
+                # everything before the segment still being decoded is final
+                self._audio_storage.commit_before(
+                    self._audio_storage.millis_to_samples(int(results[-1].t0))
+                )
+                result = (NEW_SEGMENT_CREATED, results[-1])
             else:
-                return (SEGMENT_UPDATED, results[-1])
+                result = (SEGMENT_UPDATED, results[-1])
+
+        # segments already went out live -- just confirm the last one
+        if _streamed[0] == len(results):
+            self._publish_segment(SEGMENT_UPDATED, results[-1])
+        else:
+            self._publish_segment(*result)
+        self._journal_segments()
+        return result
+
+    def update_stream_async(self) -> Future:
+        """
+        Queue an update_stream() on the worker thread.
 
-    def transcribe_audio(self, audio_data: np.array, **kwargs):
+        Returns a Future resolving to update_stream()'s result. Requests are
+        coalesced: while a decode runs only one more is queued, and since it
+        reads storage when it starts it covers the newest audio. Callers that
+        ask again before it starts get the same Future back.
+        """
+        with self._async_lock:
+            if self._pending_update is not None:
+                return self._pending_update
+
+            future = Future()
+            self._pending_update = future
+            if self._running_update is None:
+                # placeholder until the worker picks the request up
+                self._running_update = future
+                self._thread_pool.submit(self._drain_updates)
+            return future
+
+    def _drain_updates(self):
+        """Worker loop -- run queued updates until none are left."""
+        while True:
+            with self._async_lock:
+                future = self._pending_update
+                self._pending_update = None
+                self._running_update = future
+                if future is None:
+                    return
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.update_stream())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def wait_for_updates(self, timeout: float = None) -> bool:
+        """Block until queued / running async updates are done (False on timeout)."""
+        with self._async_lock:
+            _futures = [
+                f for f in (self._running_update, self._pending_update) if f is not None
+            ]
+        _, not_done = wait_futures(_futures, timeout=timeout)
+        return not not_done
+
+    def _update_stream_agreement(self) -> Tuple[int, WhisperSegment]:
+        """update_stream with the LocalAgreement policy."""
+
+        # STEP 1 -- start at the end of the committed words
+        with self._results_container_lock:
+            if not len(self._results_container):
+                self._results_container.append(
+                    WhisperSegmentChunk(
+                        self._clock.time(), WhisperSegment(t0=0, t1=0, text="")
+                    )
+                )
+        start_millis, audio_clip = self._get_stream_clip(
+            self._agreement.get_committed_end(),
+            int(self._scheduler.get_window_seconds() * 1000),
+        )
+        if len(audio_clip) == 0:
+            return (-1, 0)
+
+        # STEP 2 -- word level decode conditioned on the committed text,
+        # words are shown live as tentative text of the live segment
+        _committed_end = self._agreement.get_committed_end()
+        _live_words = list(self._segment_words)
+        _live_t0 = self._results_container[-1].segment.t0
+
+        def on_segment(seg: WhisperSegment):
+            _t0 = seg.t0 + start_millis
+            if _t0 > _committed_end - COMMIT_TOLERANCE_MILLIS and seg.text:
+                _live_words.append((_t0, seg.t1 + start_millis, seg.text))
+                self._publish_segment(
+                    SEGMENT_UPDATED, self._make_segment(_live_words, _live_t0), live=True
+                )
+
+        results = self._decode_stream_clip(
+            audio_clip,
+            on_segment=on_segment,
+            initial_prompt=self._agreement.get_prompt(),
+            **WORD_DECODE_PARAMS,
+        )
+        if results is None:
+            return (-1, 0)
+
+        # the window moved past words that never reached agreement
+        committed = self._agreement.force_commit_before(start_millis)
+        committed += self._agreement.insert(
+            [
+                (int(seg.t0) + start_millis, int(seg.t1) + start_millis, seg.text)
+                for seg in results
+            ]
+        )
+
+        # audio before the committed words is never decoded again
+        self._audio_storage.commit_before(
+            self._audio_storage.millis_to_samples(self._agreement.get_committed_end())
+        )
+
+        # STEP 3 -- committed words fill the live segment, a sentence end closes it
+        created = False
+        with self._results_container_lock:
+            for word in committed:
+                self._segment_words.append(word)
+                if word[2].endswith(SENTENCE_END):
+                    self._results_container[-1].segment = self._make_segment(
+                        self._segment_words
+                    )
+                    self._results_container.append(
+                        WhisperSegmentChunk(
+                            self._clock.time(),
+                            WhisperSegment(t0=word[1], t1=word[1], text=""),
+                        )
+                    )
+                    self._segment_words = []
+                    created = True
+
+            # live segment = its committed words + the tentative tail
+            _live = self._results_container[-1]
+            _segment = self._make_segment(
+                self._segment_words + self._agreement.get_tentative_words(),
+                _live.segment.t0,
+            )
+            if _live.segment.text != _segment.text:
+                _live.timestamp = self._clock.time()
+            _live.segment = _segment
+
+        self._update_activity(_segment.text)
+        result = (NEW_SEGMENT_CREATED if created else SEGMENT_UPDATED, _segment)
+        self._publish_segment(*result)
+        return result
+
+    def _make_segment(self, words: list, start_millis: int = 0) -> WhisperSegment:
+        """Join (t0, t1, text) words into one segment."""
+        if not words:
+            return WhisperSegment(t0=start_millis, t1=start_millis, text="")
+        return WhisperSegment(
+            t0=words[0][0],
+            t1=words[-1][1],
+            text=" ".join(w[2] for w in words),
+        )
+
+    def _update_activity(self, text: str):
+        """Inactivity detection -- activity is any change of the latest text."""
+        if self._last_activity[1] is not None and self._last_activity[1] != text:
+            # update last activity
+            self._last_activity[0] = self._clock.time()
+            self._last_activity[1] = text
+        if not self._last_activity[1]:
+            self._last_activity[0] = self._clock.time()
+            self._last_activity[1] = text
+
+    def _get_stream_clip(
+        self, start_millis: int, max_window_millis: int = None
+    ) -> Tuple[int, np.ndarray]:
+        """
+        Audio to decode from `start_millis` on -> (start_millis, clip).
+
+        The clip is trimmed to speech when a VAD is set, never starts before
+        evicted audio and is at most `max_window_millis` long (the start is
+        moved up). An empty clip means there is nothing to decode.
+        """
+        _empty = np.array([], dtype=np.float32)
+        end_millis = -1  # always the end
+        self._clip_horizon_sample = self._audio_storage.get_total_samples()
+
+        # voice activity gate
+        if self._vad is not None:
+            # nothing new was said since the last decode
+            last_speech_sample = self._vad.get_last_speech_sample()
+            if last_speech_sample <= self._last_decoded_speech_sample:
+                self._decoded_horizon_sample = self._clip_horizon_sample
+                return (start_millis, _empty)
+
+            # trim leading / trailing silence off the clip
+            bounds = self._vad.get_speech_bounds(
+                self._audio_storage.millis_to_samples(start_millis),
+                self._clip_horizon_sample,
+            )
+            if bounds is None:
+                self._decoded_horizon_sample = self._clip_horizon_sample
+                return (start_millis, _empty)
+            # only counts as decoded once the decode is not cancelled
+            self._gate_speech_sample = last_speech_sample
+            start_millis = self._audio_storage.samples_to_millis(bounds[0])
+            end_millis = self._audio_storage.samples_to_millis(bounds[1])
+
+        # never start before audio that was evicted from storage
+        start_millis = max(
+            start_millis,
+            self._audio_storage.samples_to_millis(self._audio_storage.get_first_sample()),
+        )
+
+        # bound the decode window
+        if max_window_millis is not None:
+            _end = (
+                end_millis
+                if end_millis != -1
+                else self._audio_storage.get_total_duration_millis()
+            )
+            start_millis = max(start_millis, _end - max_window_millis)
+
+        # lock-free snapshot read, ingest is never blocked
+        return (
+            start_millis,
+            self._audio_storage.get_audio_range_millis(start_millis, end_millis),
+        )
+
+    # ------------------------------------------------------------ #
+    # final pass
+
+    def finalize_async(self) -> Future:
+        """
+        Final transcript of the session so far -> Future[List[WhisperSegment]].
+
+        With a final_model the retained session audio is copied out and
+        re-decoded on the final pass worker; without one (or if the final
+        pass finds nothing) the streaming segments are returned.
+        """
+        with self._results_container_lock:
+            streaming = [
+                WhisperSegment(t0=x.segment.t0, t1=x.segment.t1, text=x.segment.text)
+                for x in self._results_container
+            ]
+
+        if self._final_model is None:
+            future = Future()
+            future.set_result(streaming)
+            return future
+
+        # copy -- storage is reset for the next session while this runs
+        _snapshot = self._audio_storage.snapshot()
+        audio_data = np.array(
+            self._audio_storage.get_audio_range_samples(
+                _snapshot.first_sample, _snapshot.total_samples
+            )
+        )
+        start_millis = self._audio_storage.samples_to_millis(_snapshot.first_sample)
+        return self._final_pool.submit(
+            self._run_final_pass, audio_data, start_millis, streaming
+        )
+
+    def _run_final_pass(
+        self, audio_data: np.ndarray, start_millis: int, streaming: list
+    ) -> List[WhisperSegment]:
+        if len(audio_data) == 0:
+            return streaming
+
+        results = self.transcribe_audio(audio_data, final=True)
+        if not results:
+            return streaming
+        for seg in results:
+            seg.t0 += start_millis
+            seg.t1 += start_millis
+        return results
+
+    # ------------------------------------------------------------ #
+    # decode cancellation
+
+    def _is_stale(self) -> bool:
+        """A partial decode is stale once a newer one is queued or a reset is due."""
+        if self._reset_requested:
+            return True
+        return (
+            self._pending_update is not None
+            and self._consecutive_cancels < MAX_CONSECUTIVE_CANCELS
+        )
+
+    def _decode_stream_clip(self, audio_clip: np.ndarray, **kwargs) -> list:
+        """
+        transcribe_audio for partial decodes -- None if it was cancelled.
+
+        A stale clip is skipped before it reaches the decoder; a running one
+        is aborted by the DecoderProcess (its child is killed and restarted).
+        Saved seconds are an estimate: the clip's expected decode time (from
+        the measured RTF) minus the time it already ran.
+        """
+        _audio_seconds = len(audio_clip) / self._audio_storage._sample_rate
+        _estimate = _audio_seconds * (self._scheduler.get_rtf() or 0.0)
+        if self._is_stale():
+            self._record_cancel(_estimate)
+            return None
+
+        _decode_local.aborted = False
+        self._decode_count += 1
+        self._live_decode = self._decode_count
+        _start = time.perf_counter()
+        try:
+            results = self.transcribe_audio(
+                audio_clip, should_continue=lambda: not self._is_stale(), **kwargs
+            )
+        finally:
+            _decode = self._live_decode
+            self._live_decode = None
+        _elapsed = time.perf_counter() - _start
+
+        if _decode_local.aborted:
+            # its live segments describe a transcript that was thrown away
+            self._segment_events.drop(_decode)
+            self._record_cancel(max(0.0, _estimate - _elapsed))
+            return None
+        self._segment_events.confirm(_decode)
+
+        # completed decode -- update stats + the decode speed estimate
+        self._consecutive_cancels = 0
+        self._last_decoded_speech_sample = max(
+            self._last_decoded_speech_sample, self._gate_speech_sample
+        )
+        self._decoded_horizon_sample = max(
+            self._decoded_horizon_sample, self._clip_horizon_sample
+        )
+        self._scheduler.record_decode(_elapsed, _audio_seconds)
+        self._decode_stats["decodes"] += 1
+        self._decode_stats["decode_seconds"] += _elapsed
+        self._decode_stats["audio_seconds"] += _audio_seconds
+        return results
+
+    def _record_cancel(self, saved_seconds: float):
+        self._consecutive_cancels += 1
+        self._decode_stats["cancelled"] += 1
+        self._decode_stats["saved_seconds"] += saved_seconds
+
+    def get_decode_stats(self) -> Dict[str, float]:
+        """Partial decode counters, incl. the (estimated) decode seconds saved by cancellation."""
+        return dict(self._decode_stats)
+
+    def get_backlog_seconds(self) -> float:
+        """Seconds of stored audio that no finished decode has covered yet."""
+        _backlog = self._audio_storage.get_total_samples() - self._decoded_horizon_sample
+        return max(0, _backlog) / self._audio_storage._sample_rate
+
+    def get_scheduler(self) -> AdaptiveScheduler:
+        return self._scheduler
+
+    def get_decode_rtf(self) -> float:
+        """Smoothed decode seconds per second of audio (None before the first decode)."""
+        return self._scheduler.get_rtf()
+
+    # ------------------------------------------------------------ #
+    # transcription functions
+
+    def transcribe_audio(
+        self,
+        audio_data: np.array,
+        should_continue: Callable[[], bool] = None,
+        final: bool = False,
+        on_segment: Callable[[WhisperSegment], None] = None,
+        **kwargs,
+    ):
         """
         Transcribe audio data
 
+        should_continue: polled while the decode runs, returning False aborts
+        it right away (see DecoderProcess). _decode_local.aborted tells
+        whether this thread's last decode was aborted (results are then
+        empty)
+        final: use the final pass model (if there is one)
+        on_segment: called (on this thread) with every segment as soon as
+        whisper.cpp finalizes it -- times in millis relative to the clip
+
         kwargs:
         - language: str
 
@@ -763,47 +1911,145 @@ class WhisperCore:
             )
 
         # transcribe audio data
-        with self._whisper_model_lock:
-            results = self._model.transcribe(
+        _model, _lock = self._model, self._whisper_model_lock
+        if final and self._final_model is not None:
+            _model, _lock = self._final_model, self._final_model_lock
+        with _lock:
+            results, _decode_local.aborted = _model.transcribe(
                 audio_data,
-                **kwargs,
+                {**DECODE_PARAMS, **kwargs},
+                on_segment=(
+                    None if on_segment is None else partial(self._on_new_segment, on_segment)
+                ),
+                should_continue=should_continue,
             )
 
         # process results
-        for seg in results:
-            seg.t0 *= 10
-            seg.t1 *= 10
-            seg.text = seg.text.strip()
+        return [self._to_segment(x) for x in results]
+
+    def _to_segment(self, raw: tuple) -> WhisperSegment:
+        """whisper.cpp (t0, t1, text) in centiseconds -> segment in millis."""
+        return WhisperSegment(t0=raw[0] * 10, t1=raw[1] * 10, text=raw[2].strip())
+
+    def _on_new_segment(self, on_segment: Callable[[WhisperSegment], None], raw: tuple):
+        """Convert a live segment like transcribe_audio's results."""
+        on_segment(self._to_segment(raw))
+
+    def close_decoders(self):
+        """Stop the decoder processes (no transcription afterwards)."""
+        self._model.close()
+        if self._final_model is not None:
+            self._final_model.close()
+
+    # ------------------------------------------------------------ #
+    # session journal
+
+    def _journal_audio(self, start_sample: int, audio_data: np.ndarray):
+        _dtype = self._journal.get_sample_dtype()
+        if audio_data.dtype != _dtype:
+            _block = np.empty(len(audio_data), dtype=_dtype)
+            _convert_samples(audio_data, _block)
+            audio_data = _block
+        self._journal.append_audio(start_sample, audio_data)
+
+        if self._journal.is_checkpoint_due():
+            self.checkpoint_async()
+
+    def _journal_segments(self):
+        """Journal the segments changed since the last call (live one + new ones)."""
+        if self._journal is None:
+            return
+        with self._results_container_lock:
+            _count = len(self._results_container)
+            # only the last segment is ever edited, earlier ones are final
+            for i in range(max(0, min(self._journaled_segments, _count) - 1), _count):
+                _chunk = self._results_container[i]
+                self._journal.append_segment(
+                    i,
+                    _chunk.timestamp,
+                    _chunk.segment.t0,
+                    _chunk.segment.t1,
+                    _chunk.segment.text,
+                )
+            self._journaled_segments = _count
+
+    def checkpoint_async(self) -> Future:
+        """Compact the journal into a checkpoint on the checkpoint worker."""
+        with self._async_lock:
+            if self._checkpoint_future is None or self._checkpoint_future.done():
+                self._checkpoint_future = self._checkpoint_pool.submit(self._journal.checkpoint)
+                self._checkpoint_future.add_done_callback(self._on_checkpoint_done)
+            return self._checkpoint_future
+
+    def _on_checkpoint_done(self, future: Future):
+        if future.exception() is not None:
+            print(f"Session checkpoint failed: {future.exception()}")
+
+    def close_journal(self):
+        """Finish a running checkpoint and make the journal durable."""
+        if self._journal is None:
+            return
+        with self._async_lock:
+            _future = self._checkpoint_future
+        if _future is not None:
+            wait_futures([_future])
+        self._journal.close()
+
+    # ------------------------------------------------------------ #
+    # live segment events
+
+    def _publish_segment(self, event: int, segment: WhisperSegment, live: bool = False):
+        """
+        Queue a segment event; live=True tags it with the running decode
+        (dropped if that decode gets cancelled before it is consumed).
+        """
+        if not self._stream_segments:
+            return
+        _decode = None
+        if live:
+            if self._is_stale():
+                # being cancelled -- its segments are thrown away anyway
+                return
+            _decode = self._live_decode
+        self._segment_events.publish(
+            event, segment, _decode, merge=event == SEGMENT_UPDATED
+        )
 
-        return list(results)
+    def iter_segment_events(self, timeout: float = None):
+        """
+        Yield (event, segment) live segment events as they are published.
+
+        Blocks for the next event; ends after close_segment_events() or once
+        no event arrived within `timeout` seconds.
+        """
+        return self._segment_events.iter(timeout)
+
+    def close_segment_events(self):
+        """End the iter_segment_events() generator (after the pending events)."""
+        self._segment_events.close()
+
+    def get_session_generation(self) -> int:
+        """Bumped by every reset_stream / restore_save."""
+        return self._segment_events.get_generation()
 
     def transcribe_file(self, audio_file: str, **kwargs):
-        """Transcribe audio file."""
+        """Transcribe audio file (any format ffmpeg can decode)."""
         # check if file exists
         if not os.path.exists(audio_file):
             raise FileNotFoundError(f"File not found: {audio_file}")
 
-        # check if file is wav format
-        if not audio_file.endswith(".wav"):
-            raise ValueError("File must be in wav format")
-
-        # transcribe audio file
-        with self._whisper_model_lock:
-            results = self._model.transcribe(
-                audio_file,
-                **kwargs,
-            )
-
-        # process results
-        for seg in results:
-            seg.t0 *= 10
-            seg.t1 *= 10
-            seg.text = seg.text.strip()
-
-        return list(results)
+        # decode straight into memory through an ffmpeg pipe
+        return self.transcribe_audio(decode_audio_file(audio_file), **kwargs)
 
     def reset_stream(self, save: bool = False) -> WhisperCoreSave:
         """Reset the transcription stream."""
+        # cancel stale decodes, never reset underneath a running one
+        self._reset_requested = True
+        self.wait_for_updates()
+        self._reset_requested = False
+        # events of the old session are not delivered anymore
+        self._segment_events.clear()
+
         instance = None
         if save:
             instance = WhisperCoreSave(
@@ -819,23 +2065,59 @@ class WhisperCore:
             self._audio_storage.reset()
 
         # reset the last activity
-        self._last_activity = [time.time(), None]
+        self._last_activity = [self._clock.time(), None]
+
+        # reset the voice activity gate
+        if self._vad is not None:
+            self._vad.reset()
+        self._last_decoded_speech_sample = 0
+        self._gate_speech_sample = 0
+        self._clip_horizon_sample = 0
+        self._decoded_horizon_sample = 0
+
+        # reset the streaming policy
+        if self._agreement is not None:
+            self._agreement.reset()
+        self._segment_words = []
+
+        # the journal starts over too -- the checkpoint is nearly empty now
+        if self._journal is not None:
+            self._journal.append_reset()
+            self._journaled_segments = 0
+            self.checkpoint_async()
 
         print(self._last_activity)
         return instance
 
     def get_save(self) -> WhisperCoreSave:
         """Get the current state of the transcription stream."""
-        return WhisperCoreSave(
-            self._audio_storage,
-            self._results_container,
-        )
+        with self._results_container_lock:
+            return WhisperCoreSave(
+                self._audio_storage,
+                self._results_container,
+            )
 
     def restore_save(self, save: WhisperCoreSave):
         """Restore the transcription stream from a saved state."""
+        self._segment_events.clear()
         with self._results_container_lock:
             self._audio_storage = save._audio_storage
             self._results_container = save._saved_segments
+            self._journaled_segments = len(self._results_container)
+
+        # journaled state before the restore no longer applies -- the
+        # restored one is journaled from scratch (checkpoints are incremental)
+        if self._journal is not None:
+            self._journal.append_reset()
+            _snapshot = save._snapshot
+            _start_sample = _snapshot.first_sample
+            for i in range(len(_snapshot)):
+                _block = _snapshot.get_chunk_samples(i)
+                self._journal_audio(_start_sample, _block)
+                _start_sample += len(_block)
+            self._journaled_segments = 0
+            self._journal_segments()
+            self.checkpoint_async()
 
     def has_new_phrases(self, timeout: float = 1.0) -> bool:
         """
@@ -852,7 +2134,7 @@ class WhisperCore:
         #     return True  # Always return true immediately after reset
 
         # Normal timing check
-        time_since_activity = time.time() - self._last_activity[0]
+        time_since_activity = self._clock.time() - self._last_activity[0]
         return time_since_activity < timeout
 
 
@@ -862,26 +2144,19 @@ class WhisperCore:
 
 
 def run_whisper_core(
-    toggles: Dict[str, Any],
+    pipeline_state: PipelineState,
 ):
     """
-    Toggles = {
-        # mic
-        "enable_mic": False,
-        "mic_mutex": threading.RLock(),
-
-        # whispercore
-        "enable_whispercore": False,
-        "whispercore_mutex": threading.RLock(),
+    pipeline_state is shared with the mic thread:
 
-        # wake word
-        "wake_word_detected": False,
-        "wake_word_mutex": threading.RLock(),
+        IDLE -> LISTENING -> TRANSCRIBING -> COMPLETING -> IDLE
 
-
-        # for thread -- disables duplicates
-        "threads_mutex": threading.RLock(),
-    }
+    - IDLE: mic runs wake word detection, whispercore waits
+    - LISTENING: wake word detected, whispercore resets + resumes
+      (REPLAY_FILE: the mic arms every session itself and stops the
+      pipeline at the end of the file)
+    - TRANSCRIBING: whispercore streams audio into whisper
+    - COMPLETING: inactivity reached, session results are sent out
 
 
     Whenever these events happen:
@@ -895,7 +2170,11 @@ def run_whisper_core(
 
     """
 
-    with toggles["threads_controller_mutex"]:
+    # blocks until the socket server is up
+    pipeline_state.wait_until_ready()
+    print("Waited for socket server to start")
+
+    with pipeline_state.get_controller_lock():
         # check if threads are running
         active_threads = threading.enumerate()
         existing_mics = [
@@ -912,41 +2191,100 @@ def run_whisper_core(
                 mic.join(timeout=1.0)
             return
 
-    with toggles["threads_controller_mutex"]:
-        # blocks until we reach
-        print("Waited for socket server to start")
-        pass
-
     # ------------------------------------------------------------ #
     # create objects
 
     # start printing out mic audio
-    UPDATE_INTERVAL = 0.25
+    # decode cadence + window adapt to the measured decode speed within these
+    MIN_UPDATE_INTERVAL = 0.25
+    MAX_UPDATE_INTERVAL = 2.0
+    MIN_WINDOW_SECONDS = 5.0
     WHISPERCORE_INACTIVITY_TIMEOUT = 2.0  # seconds
+    PREROLL_SECONDS = 1.5  # audio kept from before the wake word fired
+    MAX_RETAINED_SECONDS = 300.0  # in memory audio cap per wake session
+    CHECKPOINT_INTERVAL = 60.0  # seconds of journal replayed after a crash
 
     SAMPLE_RATE = 16000  # samples per sec
     CHUNK_SIZE = 1024 * 4  # samples per chunk
     FORMAT = pyaudio.paInt16  # 16-bit signed int
     CHANNELS = 1  # channels
 
-    A_CONFIG = AudioConfig(SAMPLE_RATE, CHANNELS, FORMAT)
+    # native device format -- downmixed + resampled to SAMPLE_RATE mono in memory
+    MIC_SAMPLE_RATE = int(os.environ.get("MIC_SAMPLE_RATE", SAMPLE_RATE))
+    MIC_CHANNELS = int(os.environ.get("MIC_CHANNELS", CHANNELS))
+
+    A_CONFIG = AudioConfig(MIC_SAMPLE_RATE, MIC_CHANNELS, FORMAT)
     WHISPER_CONFIG = AudioConfig(SAMPLE_RATE, 1, FORMAT)
 
+    # optional file replay instead of the mic -- 1.0 = realtime, N = Nx,
+    # "lockstep" = as fast as transcription keeps up
+    REPLAY_FILE = os.environ.get("REPLAY_FILE") or None
+    REPLAY_SPEED = os.environ.get("REPLAY_SPEED", "1.0")
+    replay_speed = (
+        REPLAY_LOCKSTEP if REPLAY_SPEED == "lockstep" else float(REPLAY_SPEED)
+    )
+
     mic = AsyncMicrophone(
         A_CONFIG,
         WHISPER_CONFIG,
         chunk_size=CHUNK_SIZE,
-        # filename="whispercpp-audio-test.wav",
-        global_run_config=toggles,
+        filename=REPLAY_FILE,
+        replay_speed=replay_speed,
+        pipeline_state=pipeline_state,
+        preroll_seconds=PREROLL_SECONDS,
         picovoice_phrase_files=[
             "assets/porcupine/Hey-SONA_en_mac_v3_0_0.ppn",
         ],
     )
 
-    audio_storage = AudioStorage(WHISPER_CONFIG)
+    # optional second pass model for the session_completion transcript
+    FINAL_MODEL_FILE = os.environ.get("WHISPER_FINAL_MODEL_FILE")
+
+    # optional session store -- every finished session is archived (flac)
+    # and indexed in the catalog from its own worker
+    SESSION_STORE_DIR = os.environ.get("WHISPER_SESSION_STORE")
+    catalog = SessionCatalog(SESSION_STORE_DIR) if SESSION_STORE_DIR else None
+    store_pool = ThreadPoolExecutor(max_workers=1)
+
+    # committed audio is dropped (unless the final pass re-decodes it), the
+    # rest is capped at MAX_RETAINED_SECONDS. Archived sessions keep all of
+    # their audio -- set AUDIO_STORAGE_FILE to keep it out of RAM then.
+    _keep_session_audio = catalog is not None
+    audio_storage = AudioStorage(
+        WHISPER_CONFIG,
+        max_retained_duration=None if _keep_session_audio else MAX_RETAINED_SECONDS,
+        evict_committed=FINAL_MODEL_FILE is None and not _keep_session_audio,
+        # set to keep session audio in a memory mapped file instead of RAM
+        backing_file=os.environ.get("AUDIO_STORAGE_FILE"),
+        # mic audio is 16-bit to begin with -- store it that way
+        sample_dtype=np.int16,
+    )
+    clock = mic.get_clock()
+    scheduler = AdaptiveScheduler(
+        min_interval=MIN_UPDATE_INTERVAL,
+        max_interval=MAX_UPDATE_INTERVAL,
+        min_window_seconds=MIN_WINDOW_SECONDS,
+        max_window_seconds=DEFAULT_MAX_WINDOW_SECONDS,
+    )
     whisper = WhisperCore(
         os.environ.get("WHISPER_MODEL_FILE", "assets/models/ggml-small.en.bin"),
         audio_storage,
+        clock=clock,
+        vad=VoiceActivityDetector(SAMPLE_RATE),
+        # commit agreed words, decode at most 15s per tick
+        local_agreement=True,
+        max_window_seconds=DEFAULT_MAX_WINDOW_SECONDS,
+        final_model=FINAL_MODEL_FILE,
+        scheduler=scheduler,
+        # publish segments while whisper is still decoding
+        stream_segments=True,
+        # journal the session as it happens instead of saving on exit
+        journal=SessionJournal(
+            os.environ.get("WHISPER_SESSION_FILE", "whispercpp-audio-test.save"),
+            SAMPLE_RATE,
+            sample_dtype=np.int16,
+            checkpoint_interval=CHECKPOINT_INTERVAL,
+        ),
         # redirect_whispercpp_logs_to="stdout",
     )
 
@@ -961,109 +2299,174 @@ def run_whisper_core(
     # start the model
     try:
 
+        # read position inside the mic ring buffer (a replay is read from
+        # its first sample on)
+        mic_cursor = 0 if mic.is_replay() else mic.get_write_cursor()
+
+        # async decodes that have not finished yet (their segments are
+        # reported live by the forwarding thread)
+        pending_updates = []
+
+        # wall clock start of the current session (for the catalog)
+        session_start_time = time.time()
+
+        def report_update(result: Tuple[int, WhisperSegment]):
+            if result[0] == SEGMENT_UPDATED:
+                requesthandler.send_post_request(
+                    BACKEND_IP + "/whispercore/segment_update",
+                    {
+                        "start_time": result[1].t0,
+                        "end_time": result[1].t1,
+                        "transcription": result[1].text,
+                    },
+                )
+            elif result[0] == NEW_SEGMENT_CREATED:
+                requesthandler.send_post_request(
+                    BACKEND_IP + "/whispercore/segment_creation",
+                    {
+                        "start_time": result[1].t0,
+                        "end_time": result[1].t1,
+                        "transcription": result[1].text,
+                    },
+                )
+
+        # forward live segment events as soon as whisper publishes them
+        def forward_segment_events():
+            for event in whisper.iter_segment_events():
+                report_update(event)
+
+        threading.Thread(
+            target=forward_segment_events, name="WhisperCoreEvents", daemon=True
+        ).start()
+
         running = True
         while running:
 
             # ------------------------------------------------------------- #
-            # pause the whispercore if not toggled
-            toggles["whispercore_mutex"].acquire()
-            if not toggles["enable_whispercore"]:
-                toggles["whispercore_mutex"].release()
+            # pause the whispercore until the wake word fires
+            if not pipeline_state.is_in(pipelinestate.TRANSCRIBING):
 
                 # debug
                 print("\n" * 2)
                 print("Pausing WhisperCore processing...")
 
-                # pause
-                while True:
-                    with toggles["wake_word_mutex"]:
-                        if toggles["wake_word_detected"]:
-                            break
-                    time.sleep(0.1)
+                # pause -- woken immediately by the mic thread
+                if pipeline_state.wait_for(pipelinestate.LISTENING) == pipelinestate.STOPPED:
+                    break
 
                 print("Wake word detected, resuming processing...")
                 print("\n" * 2)
 
-                # wake word was detected, resume processing
-                with toggles["wake_word_mutex"]:
-                    toggles["wake_word_detected"] = False
-                with toggles["whispercore_mutex"]:
-                    toggles["enable_whispercore"] = True
-                print("Resuming WhisperCore processing...")
-
                 # send post request to turn on whispercore
                 requesthandler.send_post_request(
                     BACKEND_IP + "/whispercore/status",
                     {"status": "active"},
                 )
 
-                # reset the audio storage
+                # reset the audio storage + splice the pre-roll in at t=0 so
+                # speech overlapping the wake word is not lost. A replay has
+                # no wake word -- it continues where the last session stopped
                 whisper.reset_stream()
+                if not mic.is_replay():
+                    mic_cursor = mic.get_preroll_cursor()
+                session_start_time = time.time()
+
+                # wake word was detected, resume processing
+                pipeline_state.transition(pipelinestate.TRANSCRIBING)
+                print(
+                    f"Resuming WhisperCore processing... (wake latency: {pipeline_state.get_latency(pipelinestate.LISTENING, pipelinestate.TRANSCRIBING) * 1000:.1f} ms)"
+                )
 
             # ------------------------------------------------------------ #
             # get start time
-            start_time = time.time()
+            start_time = clock.time()
 
             print("# --------------------------------------------- #")
             # retrieve audio data for this segment
             print("Recording Audio...")
-            with mic._audio_queue_lock:
-                _audio_batch: List[np.array] = mic.get_audio_data()
+            _audio_batch, mic_cursor = mic.read_since(mic_cursor)
 
             # get stats
             _blob_count = len(_audio_batch)
             _audio_size = sum([len(x) for x in _audio_batch])
-            _audio_time = _audio_size / mic.get_bytes_per_second()
+            _audio_time = _audio_size / WHISPER_CONFIG.get_sample_rate()
 
-            # add audio to storage
+            # add audio to storage (copies out of the ring views)
             for blob in _audio_batch:
-                audio_storage.append_audio(blob)
+                whisper.append_audio(blob)
 
-            result = whisper.update_stream()
-            if result[0] == SEGMENT_UPDATED:
-                requesthandler.send_post_request(
-                    BACKEND_IP + "/whispercore/segment_update",
-                    {
-                        "start_time": result[1].t0,
-                        "end_time": result[1].t1,
-                        "transcription": result[1].text,
-                    },
-                )
-            elif result[0] == NEW_SEGMENT_CREATED:
-                requesthandler.send_post_request(
-                    BACKEND_IP + "/whispercore/segment_creation",
-                    {
-                        "start_time": result[1].t0,
-                        "end_time": result[1].t1,
-                        "transcription": result[1].text,
-                    },
-                )
+            # decode on the worker -- coalesced while whisper is busy, so
+            # the loop keeps its cadence even when decoding is slow
+            update = whisper.update_stream_async()
+            if update not in pending_updates:
+                pending_updates.append(update)
+            if clock.is_lockstep():
+                # replay: every tick sees the decode of exactly its audio
+                whisper.wait_for_updates()
+
+            # collect finished decodes (raises if one failed)
+            while pending_updates and pending_updates[0].done():
+                pending_updates.pop(0).result()
 
             # ---------------------------------------------- #
             # logic to determine if continue detecting or not
             # if no new phrases in 1 second, end stt
+            if not whisper.has_new_phrases(WHISPERCORE_INACTIVITY_TIMEOUT):
+                # a decode still in flight may bring new text
+                whisper.wait_for_updates()
+                while pending_updates:
+                    pending_updates.pop(0).result()
+
             if not whisper.has_new_phrases(WHISPERCORE_INACTIVITY_TIMEOUT):
                 print("No new phrases detected, ending STT...")
-                # start blocking everything again
-                with toggles["whispercore_mutex"]:
-                    toggles["enable_whispercore"] = False
-                with toggles["mic_mutex"]:
-                    toggles["enable_mic"] = False
+                # wrap up the session
+                pipeline_state.transition(pipelinestate.COMPLETING)
 
                 # send post request to turn off whispercore
                 requesthandler.send_post_request(
                     BACKEND_IP + "/whispercore/status",
                     {"status": "inactive"},
                 )
-                requesthandler.send_post_request(
-                    BACKEND_IP + "/whispercore/session_completion",
-                    {
-                        "messages": [
-                            seg.segment.text for seg in whisper._results_container
-                        ]
-                    },
+
+                # final transcript -- sent from the final pass worker once it
+                # is done, the next session can already start meanwhile
+                def send_session_completion(future: Future):
+                    try:
+                        messages = [seg.text for seg in future.result()]
+                    except Exception as e:
+                        print(f"Final pass failed: {e}")
+                        return
+                    requesthandler.send_post_request(
+                        BACKEND_IP + "/whispercore/session_completion",
+                        {"messages": messages},
+                    )
+
+                whisper.finalize_async().add_done_callback(send_session_completion)
+
+                # archive the session -- the save snapshots it before the next reset
+                if catalog is not None:
+
+                    def report_stored(future: Future):
+                        try:
+                            print(f"Session stored: {future.result()}")
+                        except Exception as e:
+                            print(f"Storing session failed: {e}")
+
+                    store_pool.submit(
+                        catalog.save_session, whisper.get_save(), session_start_time, "flac"
+                    ).add_done_callback(report_stored)
+
+                _stats = whisper.get_decode_stats()
+                print(
+                    f"Decodes: {_stats['decodes']} ({_stats['decode_seconds']:.2f} s), "
+                    f"cancelled: {_stats['cancelled']} (saved ~{_stats['saved_seconds']:.2f} s)"
+                )
+
+                # back to wake word detection
+                pipeline_state.transition(pipelinestate.IDLE)
+                print(
+                    f"WhisperCore processing paused. (session: {pipeline_state.get_latency(pipelinestate.TRANSCRIBING, pipelinestate.COMPLETING):.2f} s)"
                 )
-                print("WhisperCore processing paused.")
 
             # --------------------------------------------- #
 
@@ -1091,19 +2494,30 @@ def run_whisper_core(
                 print(f"    Text: {seg.segment.text}")
                 print(f"    Start: {seg.segment.t0:.4f} ms")
                 print(f"    End: {seg.segment.t1:.4f} ms")
-                print(f"    Last Edited: {time.time() - seg.timestamp:.4f} seconds")
+                print(f"    Last Edited: {clock.time() - seg.timestamp:.4f} seconds")
 
             print(f"Total segments processed: {len(whisper._results_container)}")
 
+            # decode cadence / window picked from the measured decode speed
+            scheduler.record_backlog(whisper.get_backlog_seconds())
+            _params = scheduler.get_params()
+            print(
+                f"Scheduler: interval {_params['interval']:.2f} s, window {_params['window_seconds']:.1f} s, "
+                f"rtf {_params['rtf'] or 0.0:.3f}, backlog {_params['backlog_seconds']:.2f} s"
+            )
+            if _params["falling_behind"]:
+                print("WARNING: WhisperCore is falling behind real time")
+
             print()
 
             # --------------------------------------------- #
             # process audio
 
-            computational_delta = time.time() - start_time
-            if computational_delta < UPDATE_INTERVAL:
+            update_interval = scheduler.get_interval()
+            computational_delta = clock.time() - start_time
+            if computational_delta < update_interval:
                 # sleep for the remaining time
-                time.sleep(UPDATE_INTERVAL - computational_delta)
+                clock.sleep(update_interval - computational_delta)
 
     # ------------------------------------------------------------ #
 
@@ -1117,9 +2531,13 @@ def run_whisper_core(
                 f"File: {frame.filename}, Function: {frame.name}, Line: {frame.lineno}"
             )
     finally:
+        pipeline_state.stop()
+        whisper.close_segment_events()
         mic.stop()
         mic.join()
         print("Exiting...")
-        # save the data
-        whisper.get_save().save("whispercpp-audio-test.save")
+        # the session is already journaled -- just make it durable
+        whisper.close_journal()
+        store_pool.shutdown(wait=True)
+        whisper.close_decoders()
         os._exit(0)
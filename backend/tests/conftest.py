@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tests import the backend modules as `source.<module>`, like the app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,91 @@
+import numpy as np
+
+from source.audiobuffer import AudioRingBuffer
+
+
+def test_read_since_wraps_around():
+    ring = AudioRingBuffer(8)
+    ring.write(np.arange(6, dtype=np.float32))
+    data, cursor = ring.read_since(0)
+    assert cursor == 6
+    assert np.array_equal(np.concatenate(data), np.arange(6))
+
+    # 6 more samples wrap past the end of the 8 sample array
+    ring.write(np.arange(6, 12, dtype=np.float32))
+    views, cursor = ring.read_since(cursor)
+    assert cursor == 12
+    assert len(views) == 2
+    assert np.array_equal(np.concatenate(views), np.arange(6, 12))
+
+    contiguous, _ = ring.read_since(6, contiguous=True)
+    assert np.array_equal(contiguous, np.arange(6, 12))
+    assert len(ring) == 8
+    assert ring.get_oldest_cursor() == 4
+
+
+def test_write_int16_scales_to_float():
+    ring = AudioRingBuffer(4)
+    ring.write_int16(np.array([0, 16384, -32768], dtype=np.int16).tobytes())
+    data, _ = ring.read_since(0, contiguous=True)
+    assert np.allclose(data, [0.0, 0.5, -1.0])
+
+
+def test_oversized_write_keeps_newest_samples():
+    ring = AudioRingBuffer(4)
+    ring.write(np.arange(10, dtype=np.float32))
+    assert ring.get_write_cursor() == 10
+    assert ring.get_overrun_samples() == 6
+
+    data, _ = ring.read_since(0, contiguous=True)
+    assert np.array_equal(data, [6, 7, 8, 9])
+
+
+def test_lapped_consumer_is_clamped_and_counted():
+    ring = AudioRingBuffer(4)
+    ring.write(np.arange(3, dtype=np.float32))
+    ring.write(np.arange(3, 7, dtype=np.float32))
+
+    # the consumer still at cursor 0 lost samples 0 - 2
+    data, cursor = ring.read_since(0, contiguous=True)
+    assert cursor == 7
+    assert np.array_equal(data, [3, 4, 5, 6])
+    assert ring.get_overrun_samples() == 3
+
+    # producer and consumer overruns add up
+    ring.write(np.arange(5, dtype=np.float32))
+    assert ring.get_overrun_samples() == 4
+
+
+def test_read_range_is_clamped_to_written_samples():
+    ring = AudioRingBuffer(8)
+    ring.write(np.arange(4, dtype=np.float32))
+    assert ring.read_range(2, 100, contiguous=True).tolist() == [2, 3]
+    assert ring.read_range(5, 6, contiguous=True).size == 0
+
+
+def test_overruns_are_counted_per_consumer():
+    ring = AudioRingBuffer(4)
+    ring.write(np.arange(10, dtype=np.float32))
+
+    # two consumers on their own cursors / threads
+    ring.read_range(2, 10, consumer="wake")
+    ring.read_since(4, consumer="whisper")
+    ring.read_since(0, consumer="whisper")
+
+    assert ring.get_overrun_samples("wake") == 4
+    assert ring.get_overrun_samples("whisper") == 2 + 6
+    assert ring.get_overrun_samples("missing") == 0
+    # producer (6) + every consumer
+    assert ring.get_overrun_samples() == 6 + 4 + 8
+
+
+def test_int16_ring_keeps_raw_pcm():
+    ring = AudioRingBuffer(6, dtype=np.int16)
+    ring.write_int16(np.array([1, -2, 3, -4], dtype=np.int16).tobytes())
+    ring.write_int16(np.array([5, -6, 7, -8], dtype=np.int16))
+
+    views, cursor = ring.read_since(0)
+    assert cursor == 8
+    assert all(x.dtype == np.int16 for x in views)
+    # interleaved stereo frames stay whole across the wrap point
+    assert np.concatenate(views).reshape(-1, 2).tolist() == [[3, -4], [5, -6], [7, -8]]
@@ -0,0 +1,56 @@
+import shutil
+import wave
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ffmpeg")
+if shutil.which("ffmpeg") is None:
+    pytest.skip("ffmpeg binary not installed", allow_module_level=True)
+
+from source.audiodecoder import FFmpegStreamDecoder, decode_audio_file
+
+
+def _write_wav(filename: str, samples: np.ndarray, sample_rate: int, channels: int):
+    with wave.open(filename, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+
+
+def test_decode_audio_file_resamples_and_downmixes(tmp_path):
+    t = np.arange(48000) / 48000
+    tone = (0.25 * np.sin(2 * np.pi * 440.0 * t) * 32767).astype(np.int16)
+    filename = str(tmp_path / "stereo.wav")
+    _write_wav(filename, np.stack([tone, tone], axis=1).reshape(-1), 48000, 2)
+
+    audio = decode_audio_file(filename)
+    assert audio.dtype == np.float32
+    assert abs(len(audio) - 16000) <= 16
+    assert np.sqrt(np.mean(audio[1000:-1000] ** 2)) == pytest.approx(
+        0.25 / np.sqrt(2), rel=0.05
+    )
+
+
+def test_stream_decoder_reads_whole_frames(tmp_path):
+    filename = str(tmp_path / "mono.wav")
+    _write_wav(filename, np.arange(1000, dtype=np.int16), 16000, 1)
+
+    with FFmpegStreamDecoder(filename) as decoder:
+        data = b""
+        while True:
+            block = decoder.readframes(333)
+            if not block:
+                break
+            assert len(block) % 2 == 0
+            data += block
+    assert np.array_equal(np.frombuffer(data, dtype=np.int16), np.arange(1000))
+
+
+def test_decode_failure_raises(tmp_path):
+    filename = str(tmp_path / "broken.wav")
+    with open(filename, "wb") as f:
+        f.write(b"not audio")
+    with pytest.raises(RuntimeError):
+        decode_audio_file(filename)
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from source.audioprocessing import (
+    AudioPreprocessor,
+    PolyphaseResampler,
+    VoiceActivityDetector,
+)
+
+
+def _tone(seconds: float, sample_rate: int, frequency: float = 440.0) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+# ------------------------------------------------------------ #
+# resampling
+
+
+@pytest.mark.parametrize("input_rate", [48000, 44100, 8000])
+def test_resampler_blockwise_matches_one_shot(input_rate):
+    signal = _tone(1.0, input_rate)
+
+    one_shot = PolyphaseResampler(input_rate, 16000).process(signal)
+
+    resampler = PolyphaseResampler(input_rate, 16000)
+    blocks = []
+    for size in [1, 7, 1000, 4096, 333] * 50:
+        if not len(signal):
+            break
+        blocks.append(resampler.process(signal[:size]))
+        signal = signal[size:]
+    blocks.append(resampler.process(signal))
+
+    assert np.allclose(np.concatenate(blocks), one_shot, atol=1e-6)
+    assert abs(len(one_shot) - 16000) <= 1
+
+
+def test_resampler_keeps_a_passband_tone():
+    out = PolyphaseResampler(48000, 16000).process(_tone(1.0, 48000, 1000.0))
+    expected = _tone(1.0, 16000, 1000.0)
+
+    # skip the filter delay, compare levels + the spectral peak
+    steady = out[1000:-1000]
+    assert np.sqrt(np.mean(steady**2)) == pytest.approx(
+        np.sqrt(np.mean(expected**2)), rel=0.02
+    )
+    spectrum = np.abs(np.fft.rfft(steady))
+    assert np.argmax(spectrum) * 16000 / len(steady) == pytest.approx(1000.0, abs=5)
+
+
+def test_preprocessor_downmixes_int16_stereo():
+    left = (_tone(0.5, 16000) * 32767).astype(np.int16)
+    interleaved = np.stack([left, left], axis=1).reshape(-1)
+
+    preprocessor = AudioPreprocessor(16000, 2, 16000)
+    out = preprocessor.process(interleaved.tobytes())
+    assert out.dtype == np.float32
+    assert np.allclose(out, left / 32768.0, atol=1e-4)
+
+
+# ------------------------------------------------------------ #
+# voice activity detection
+
+
+def _speech_like(seconds: float, sample_rate: int) -> np.ndarray:
+    """Voiced harmonics -- low flatness, loud."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voiced = sum(np.sin(2 * np.pi * k * 150.0 * t) / k for k in range(1, 8))
+    return (0.2 * voiced).astype(np.float32)
+
+
+def test_vad_trims_silence_around_speech():
+    rate = 16000
+    noise = np.random.default_rng(0).standard_normal(2 * rate).astype(np.float32) * 1e-4
+    audio = np.concatenate([noise, _speech_like(1.0, rate), noise])
+
+    vad = VoiceActivityDetector(rate)
+    # odd block sizes -- frames straddle block boundaries
+    for i in range(0, len(audio), 1234):
+        vad.process(audio[i : i + 1234])
+
+    start, end = vad.get_speech_bounds(0, len(audio), padding_ms=0.0)
+    frame = int(rate * 0.03)
+    assert abs(start - 2 * rate) <= frame
+    # the hangover keeps 300 ms after the speech
+    assert abs(end - (3 * rate + int(0.3 * rate))) <= 2 * frame
+
+    padded = vad.get_speech_bounds(0, len(audio), padding_ms=200.0)
+    assert padded[0] == start - int(0.2 * rate)
+
+
+def test_vad_reports_no_speech_in_silence():
+    rate = 16000
+    vad = VoiceActivityDetector(rate)
+    vad.process(np.zeros(2 * rate, dtype=np.float32))
+    assert vad.get_speech_bounds(0, 2 * rate) is None
+    assert vad.get_last_speech_sample() == 0
+
+
+def test_vad_blockwise_matches_one_shot():
+    rate = 16000
+    noise = np.random.default_rng(1).standard_normal(rate).astype(np.float32) * 1e-4
+    audio = np.concatenate([noise, _speech_like(0.5, rate), noise, _speech_like(0.5, rate)])
+
+    one_shot = VoiceActivityDetector(rate)
+    one_shot.process(audio)
+
+    blockwise = VoiceActivityDetector(rate)
+    for i in range(0, len(audio), 1000):
+        blockwise.process(audio[i : i + 1000])
+
+    count = one_shot._frame_count
+    assert blockwise._frame_count == count
+    assert np.array_equal(blockwise._flags[:count], one_shot._flags[:count])
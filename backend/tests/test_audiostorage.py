@@ -0,0 +1,158 @@
+import wave
+
+import numpy as np
+import pytest
+
+for _module in ["pyaudio", "pvporcupine", "pywhispercpp", "dotenv", "ffmpeg"]:
+    pytest.importorskip(_module)
+
+from source.whispercore_main import (
+    AudioChunk,
+    AudioConfig,
+    AudioStorage,
+    WavSpillSink,
+    WhisperCoreSave,
+)
+
+CONFIG = AudioConfig(16000, 1, 8)
+
+
+def _noise(seconds: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return (0.1 * rng.standard_normal(int(seconds * 16000))).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.int16])
+def test_range_reads_across_chunks(dtype):
+    storage = AudioStorage(CONFIG, max_chunk_duration=1.0, sample_dtype=dtype)
+    audio = _noise(3.5, 0)
+    for i in range(0, len(audio), 4096):
+        storage.append_audio(audio[i : i + 4096])
+
+    assert storage.get_total_samples() == len(audio)
+    read = storage.get_audio_range_samples(10000, 40000)
+    tolerance = 0 if dtype == np.float32 else 1.0 / 32768
+    assert np.allclose(read, audio[10000:40000], atol=tolerance)
+
+
+def test_disk_backed_reset_keeps_earlier_snapshots(tmp_path):
+    storage = AudioStorage(
+        CONFIG,
+        max_chunk_duration=1.0,
+        backing_file=str(tmp_path / "backing.raw"),
+        sample_dtype=np.int16,
+    )
+    first = _noise(2.5, 1)
+    storage.append_audio(first)
+    snapshot = storage.snapshot()
+    save = WhisperCoreSave(storage, [])
+    expected = np.array(snapshot.get_audio_range_samples(0, len(first)))
+
+    # the next session writes the same sample indices
+    storage.reset()
+    second = _noise(2.5, 2)
+    storage.append_audio(second)
+
+    assert np.array_equal(snapshot.get_audio_range_samples(0, len(first)), expected)
+    assert np.allclose(
+        storage.get_audio_range_samples(0, len(second)), second, atol=1.0 / 32768
+    )
+
+    # a save taken before the reset still writes the first session
+    save.save(str(tmp_path / "first.session"))
+    loaded = WhisperCoreSave.load(str(tmp_path / "first.session"))
+    assert np.array_equal(
+        loaded._audio_storage.get_audio_range_samples(0, len(first)), expected
+    )
+    storage.close()
+
+
+def test_chunk_grows_by_doubling():
+    chunk = AudioChunk(CONFIG, capacity=4, start_sample=100)
+    chunk.append_audio_data(np.arange(3, dtype=np.float32))
+    assert chunk.get_remaining_capacity() == 1
+
+    chunk.append_audio_data(np.arange(3, 6, dtype=np.float32))
+    assert len(chunk) == 6
+    assert chunk.get_remaining_capacity() == 2
+    assert chunk.get_samples().tolist() == [0, 1, 2, 3, 4, 5]
+    # absolute sample indices
+    assert chunk.get_audio_from_samples(102, 104).tolist() == [2, 3]
+    assert chunk.get_end_sample() == 106
+
+
+def test_range_reads_at_chunk_boundaries():
+    storage = AudioStorage(CONFIG, max_chunk_duration=0.1)
+    audio = _noise(1.0, 3)
+    storage.append_audio(audio)
+
+    # 1600 samples per chunk
+    for start, end in [(0, 1600), (1599, 1601), (1600, 3200), (3000, 9000), (15000, -1)]:
+        expected = audio[start:] if end == -1 else audio[start:end]
+        assert np.array_equal(storage.get_audio_range_samples(start, end), expected)
+
+
+def test_retention_evicts_oldest_chunks_and_keeps_offsets():
+    evicted = []
+    storage = AudioStorage(
+        CONFIG,
+        max_chunk_duration=1.0,
+        max_retained_duration=2.5,
+        spill_sink=lambda chunk: evicted.append(chunk.get_start_sample()),
+    )
+    audio = _noise(5.0, 4)
+    for i in range(0, len(audio), 4000):
+        storage.append_audio(audio[i : i + 4000])
+
+    # whole chunks only, oldest first, never more than the limit asks for
+    assert evicted == [0, 16000]
+    assert storage.get_first_sample() == 32000
+    assert storage.get_retained_samples() == len(audio) - 32000
+    assert storage.get_total_samples() == len(audio)
+
+    # indices stay absolute, ranges into evicted audio are clamped
+    assert np.array_equal(storage.get_audio_range_samples(40000, 50000), audio[40000:50000])
+    assert np.array_equal(storage.get_audio_range_samples(0, 40000), audio[32000:40000])
+
+
+def test_committed_audio_is_evicted():
+    storage = AudioStorage(CONFIG, max_chunk_duration=1.0, evict_committed=True)
+    audio = _noise(3.5, 5)
+    storage.append_audio(audio)
+
+    # chunk [16000, 32000) is only partly committed
+    storage.commit_before(20000)
+    assert storage.get_first_sample() == 16000
+    storage.commit_before(32000)
+    assert storage.get_first_sample() == 32000
+    assert np.array_equal(storage.get_audio_range_samples(32000, -1), audio[32000:])
+
+
+def test_wav_spill_sink_writes_evicted_audio(tmp_path):
+    sink = WavSpillSink(str(tmp_path / "spill.wav"), CONFIG)
+    storage = AudioStorage(
+        CONFIG, max_chunk_duration=1.0, max_retained_duration=1.0, spill_sink=sink
+    )
+    audio = _noise(3.5, 6)
+    storage.append_audio(audio)
+    sink.close()
+
+    with wave.open(sink.get_filename(), "rb") as wf:
+        assert wf.getframerate() == 16000
+        spilled = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    assert len(spilled) == storage.get_first_sample() == 32000
+    assert np.allclose(spilled / 32768.0, audio[:32000], atol=1.0 / 32768)
+
+
+def test_snapshot_reads_survive_eviction():
+    storage = AudioStorage(CONFIG, max_chunk_duration=1.0, max_retained_duration=1.0)
+    audio = _noise(4.0, 7)
+    storage.append_audio(audio[:24000])
+    snapshot = storage.snapshot()
+
+    # the live storage drops the audio the snapshot still reads
+    storage.append_audio(audio[24000:])
+    assert storage.get_first_sample() > 0
+    assert snapshot.first_sample == 0
+    assert snapshot.total_samples == 24000
+    assert np.array_equal(snapshot.get_audio_range_samples(0, 24000), audio[:24000])
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from source.decoderprocess import DecoderProcess
+
+# pow() on big ints runs in C without releasing the GIL, like whisper_full
+# in pywhispercpp
+GIL_HOLD_EXPONENT = 3_000_000
+
+
+class FakeSegment:
+    def __init__(self, t0, t1, text):
+        self.t0 = t0
+        self.t1 = t1
+        self.text = text
+
+
+class FakeModel:
+    """Holds the GIL for the whole decode, one segment per second of audio."""
+
+    def __init__(self, model, fail=False):
+        if fail:
+            raise OSError(f"cannot load {model}")
+
+    def transcribe(self, audio, new_segment_callback=None, hold_gil=True, sleep=0.0, **params):
+        if params.get("raise_error"):
+            raise ValueError("bad params")
+        if hold_gil:
+            pow(3, GIL_HOLD_EXPONENT)
+        time.sleep(sleep)
+        results = []
+        for i in range(len(audio) // 16000):
+            results.append(FakeSegment(i * 100, (i + 1) * 100, f" second {i}"))
+            if new_segment_callback is not None:
+                new_segment_callback(results[-1])
+        return results
+
+
+def fake_factory(model, **kwargs):
+    return FakeModel(model, **kwargs)
+
+
+def _max_heartbeat_gap(decode) -> tuple:
+    """Run `decode` on a thread, return (longest gap of a 1ms heartbeat, decode seconds)."""
+    done = threading.Event()
+    elapsed = []
+
+    def run():
+        _start = time.perf_counter()
+        decode()
+        elapsed.append(time.perf_counter() - _start)
+        done.set()
+
+    thread = threading.Thread(target=run)
+    _last = time.perf_counter()
+    _gap = 0.0
+    thread.start()
+    while not done.is_set():
+        time.sleep(0.001)
+        _now = time.perf_counter()
+        _gap = max(_gap, _now - _last)
+        _last = _now
+    thread.join()
+    return _gap, elapsed[0]
+
+
+@pytest.fixture(scope="module")
+def decoder():
+    decoder = DecoderProcess("fake", model_factory=fake_factory)
+    yield decoder
+    decoder.close()
+
+
+def test_results_and_live_segments(decoder):
+    live = []
+    results, aborted = decoder.transcribe(
+        np.zeros(3 * 16000, dtype=np.float32), {"hold_gil": False}, on_segment=live.append
+    )
+    assert not aborted
+    assert results == [(0, 100, " second 0"), (100, 200, " second 1"), (200, 300, " second 2")]
+    assert live == results
+
+
+def test_decoding_in_process_stalls_other_threads(decoder):
+    audio = np.zeros(16000, dtype=np.float32)
+    in_process_gap, in_process_seconds = _max_heartbeat_gap(
+        lambda: FakeModel("fake").transcribe(audio)
+    )
+    process_gap, process_seconds = _max_heartbeat_gap(
+        lambda: decoder.transcribe(audio)
+    )
+    # in process the heartbeat waits for the whole decode
+    assert in_process_gap > 0.5 * in_process_seconds
+    # with the decoder process it keeps its cadence
+    assert process_gap < 0.25 * process_seconds
+    assert process_gap < 0.1
+
+
+def test_running_decode_is_aborted(decoder):
+    audio = np.zeros(16000, dtype=np.float32)
+    pid = decoder.get_pid()
+    deadline = time.perf_counter() + 0.2
+
+    # the child is killed mid decode ...
+    _start = time.perf_counter()
+    results, aborted = decoder.transcribe(
+        audio, {"sleep": 10.0}, should_continue=lambda: time.perf_counter() < deadline
+    )
+    assert aborted
+    assert results == []
+    assert time.perf_counter() - _start < 5.0
+    assert decoder.get_pid() != pid
+    assert decoder.get_restarts() == 1
+
+    # ... and its replacement decodes the next clip
+    results, aborted = decoder.transcribe(audio, {"hold_gil": False})
+    assert not aborted
+    assert results == [(0, 100, " second 0")]
+
+    # abort() from another thread
+    threading.Timer(0.2, decoder.abort).start()
+    results, aborted = decoder.transcribe(audio, {"sleep": 10.0})
+    assert aborted
+    assert decoder.get_restarts() == 2
+
+
+def test_errors(decoder):
+    with pytest.raises(RuntimeError, match="bad params"):
+        decoder.transcribe(np.zeros(16000, dtype=np.float32), {"raise_error": True})
+
+    # a failing segment handler does not leave messages behind
+    def on_segment(segment):
+        raise KeyError("handler")
+
+    with pytest.raises(KeyError):
+        decoder.transcribe(
+            np.zeros(2 * 16000, dtype=np.float32), {"hold_gil": False}, on_segment=on_segment
+        )
+    results, _ = decoder.transcribe(np.zeros(16000, dtype=np.float32), {"hold_gil": False})
+    assert results == [(0, 100, " second 0")]
+
+    with pytest.raises(RuntimeError, match="cannot load"):
+        DecoderProcess("missing", model_factory=fake_factory, fail=True)
+
+
+@pytest.mark.skipif(
+    (os.cpu_count() or 1) < 2, reason="needs two cores to decode in parallel"
+)
+def test_two_decoder_processes_overlap(decoder):
+    audio = np.zeros(16000, dtype=np.float32)
+    _, single_seconds = _max_heartbeat_gap(lambda: decoder.transcribe(audio))
+
+    second = DecoderProcess("fake", model_factory=fake_factory)
+    try:
+        thread = threading.Thread(target=second.transcribe, args=(audio,))
+        _start = time.perf_counter()
+        thread.start()
+        decoder.transcribe(audio)
+        thread.join()
+        both_seconds = time.perf_counter() - _start
+    finally:
+        second.close()
+    # two GIL holding decodes in one process would take twice as long
+    assert both_seconds < 1.5 * single_seconds
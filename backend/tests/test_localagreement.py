@@ -0,0 +1,72 @@
+from source.localagreement import LocalAgreement
+
+
+def _words(*words):
+    # (t0, t1, text) -- one word per 500 ms, starting at the given millis
+    return [(t0, t0 + 400, text) for t0, text in words]
+
+
+def test_words_commit_once_two_hypotheses_agree():
+    agreement = LocalAgreement()
+
+    assert agreement.insert(_words((0, "Turn"), (500, "on"))) == []
+    assert agreement.get_tentative_text() == "Turn on"
+
+    # case / punctuation do not matter, the newer hypothesis' words are kept
+    committed = agreement.insert(_words((0, "turn"), (500, "on,"), (1000, "the")))
+    assert [w[2] for w in committed] == ["turn", "on,"]
+    assert agreement.get_committed_end() == 900
+    assert agreement.get_tentative_text() == "the"
+
+    # next decode starts at the committed end and repeats "on"
+    committed = agreement.insert(_words((800, "on"), (1000, "the"), (1500, "lights")))
+    assert [w[2] for w in committed] == ["the"]
+    assert agreement.get_committed_text() == "turn on, the"
+    assert agreement.get_tentative_text() == "lights"
+
+
+def test_disagreement_keeps_the_newer_hypothesis():
+    agreement = LocalAgreement()
+    agreement.insert(_words((0, "write"), (500, "code")))
+
+    assert agreement.insert(_words((0, "right"), (500, "code"))) == []
+    assert agreement.get_tentative_text() == "right code"
+
+    committed = agreement.insert(_words((0, "right"), (500, "code")))
+    assert agreement.get_committed_text() == "right code"
+    assert len(committed) == 2
+
+
+def test_words_before_the_committed_end_are_dropped():
+    agreement = LocalAgreement()
+    agreement.insert(_words((0, "hello"), (500, "world")))
+    agreement.insert(_words((0, "hello"), (500, "world")))
+    assert agreement.get_committed_end() == 900
+
+    # a re-decode of already committed audio that whisper worded differently
+    assert agreement.insert(_words((100, "halo"), (1000, "again"))) == []
+    assert agreement.get_tentative_text() == "again"
+
+
+def test_force_commit_and_prompt():
+    agreement = LocalAgreement()
+    agreement.insert(_words((0, "one"), (500, "two"), (1000, "three")))
+
+    committed = agreement.force_commit_before(1000)
+    assert [w[2] for w in committed] == ["one", "two"]
+    assert agreement.get_tentative_text() == "three"
+
+    # the committed end moves past the last word
+    assert [w[2] for w in agreement.force_commit_before(5000)] == ["three"]
+    assert agreement.get_committed_end() == 5000
+    assert agreement.force_commit_before(6000) == []
+    assert agreement.get_committed_end() == 6000
+
+    # whole words from the end, within max_chars
+    assert agreement.get_prompt(max_chars=10) == "two three"
+    assert agreement.get_prompt(max_chars=9) == "three"
+    assert agreement.get_prompt() == "one two three"
+
+    agreement.reset()
+    assert agreement.get_committed_words() == []
+    assert agreement.get_committed_end() == 0
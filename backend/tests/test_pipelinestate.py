@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from source import pipelinestate
+from source.pipelinestate import PipelineState
+
+
+def test_session_cycle_and_latency():
+    state = PipelineState()
+    assert state.transition(pipelinestate.LISTENING)
+    assert state.transition(pipelinestate.TRANSCRIBING)
+    assert state.transition(pipelinestate.COMPLETING)
+    assert state.transition(pipelinestate.IDLE)
+
+    latency = state.get_latency(pipelinestate.LISTENING, pipelinestate.TRANSCRIBING)
+    assert latency is not None and latency >= 0.0
+    assert [h[1] for h in state.get_history()] == [
+        pipelinestate.IDLE,
+        pipelinestate.LISTENING,
+        pipelinestate.TRANSCRIBING,
+        pipelinestate.COMPLETING,
+        pipelinestate.IDLE,
+    ]
+
+
+def test_invalid_and_unexpected_transitions():
+    state = PipelineState()
+    with pytest.raises(ValueError):
+        state.transition(pipelinestate.TRANSCRIBING)
+
+    # compare-and-set style transition
+    assert not state.transition(pipelinestate.LISTENING, expected=(pipelinestate.COMPLETING,))
+    assert state.is_in(pipelinestate.IDLE)
+
+
+def test_wait_for_wakes_on_transition_and_stop():
+    state = PipelineState()
+    threading.Timer(0.05, state.transition, (pipelinestate.LISTENING,)).start()
+    assert state.wait_for(pipelinestate.LISTENING, timeout=1.0) == pipelinestate.LISTENING
+
+    assert state.wait_for(pipelinestate.COMPLETING, timeout=0.01) is None
+
+    threading.Timer(0.05, state.stop).start()
+    assert state.wait_for(pipelinestate.COMPLETING, timeout=1.0) == pipelinestate.STOPPED
+    with pytest.raises(ValueError):
+        state.transition(pipelinestate.IDLE)
@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from source.replayclock import REPLAY_LOCKSTEP, ReplayClock
+
+
+def test_lockstep_sleep_waits_for_the_producer():
+    clock = ReplayClock(REPLAY_LOCKSTEP)
+    assert clock.is_lockstep()
+    produced = []
+
+    def producer():
+        # 0.1s blocks, only as many as the consumer asked for
+        while clock.wait_for_demand():
+            produced.append(clock.time())
+            clock.advance(0.1)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+
+    clock.sleep(0.25)
+    assert clock.time() == pytest.approx(0.25)
+    # demand horizon 0.25 -> blocks at 0.0, 0.1, 0.2
+    assert len(produced) == 3
+
+    clock.sleep(0.25)
+    assert len(produced) == 5
+
+    clock.finish()
+    thread.join(timeout=1.0)
+    assert not thread.is_alive()
+
+
+def test_finish_releases_a_waiting_consumer():
+    clock = ReplayClock(REPLAY_LOCKSTEP)
+    threading.Timer(0.05, clock.finish).start()
+    # nobody produces -- only finish() ends the sleep
+    clock.sleep(1.0)
+    assert not clock.wait_for_demand()
+
+
+def test_realtime_speed_scales_virtual_time():
+    clock = ReplayClock(10.0)
+    assert not clock.is_lockstep()
+    clock.sleep(0.5)  # 0.05 s of wall time
+    assert clock.time() >= 0.5
+
+
+def test_negative_speed_is_rejected():
+    with pytest.raises(ValueError):
+        ReplayClock(-1.0)
@@ -0,0 +1,72 @@
+import threading
+
+from source.segmentevents import SegmentEventQueue
+
+CREATED = 1
+UPDATED = 2
+
+
+def _drain(queue):
+    return list(queue.iter(timeout=0))
+
+
+def test_updates_merge_into_the_pending_event():
+    queue = SegmentEventQueue()
+    queue.publish(CREATED, "a")
+    queue.publish(UPDATED, "ab", merge=True)
+    queue.publish(UPDATED, "abc", merge=True)
+    queue.publish(CREATED, "d")
+    queue.publish(UPDATED, "de", merge=True)
+
+    # a created segment stays created, with its latest state
+    assert _drain(queue) == [(CREATED, "abc"), (CREATED, "de")]
+    assert len(queue) == 0
+
+
+def test_bounded(capsys):
+    queue = SegmentEventQueue(max_pending=3)
+    for i in range(5):
+        queue.publish(CREATED, i)
+    assert _drain(queue) == [(CREATED, 2), (CREATED, 3), (CREATED, 4)]
+    assert queue.get_dropped() == 2
+    # counted, reported once
+    assert capsys.readouterr().out.count("behind") == 1
+
+
+def test_cancelled_decode_events_are_dropped():
+    queue = SegmentEventQueue()
+    queue.publish(UPDATED, "confirmed", merge=True)
+    # live events of a decode do not merge into confirmed state
+    queue.publish(UPDATED, "live 1", decode=1, merge=True)
+    queue.publish(CREATED, "live 1b", decode=1)
+    queue.drop(1)
+    assert _drain(queue) == [(UPDATED, "confirmed")]
+
+    queue.publish(UPDATED, "live 2", decode=2, merge=True)
+    queue.confirm(2)
+    # the decode's result merges into its confirmed live event
+    queue.publish(UPDATED, "result 2", merge=True)
+    assert _drain(queue) == [(UPDATED, "result 2")]
+
+
+def test_clear_starts_a_new_generation():
+    queue = SegmentEventQueue()
+    queue.publish(CREATED, "old session")
+    queue.clear()
+    assert queue.get_generation() == 1
+    queue.publish(CREATED, "new session")
+    assert _drain(queue) == [(CREATED, "new session")]
+
+
+def test_iter_blocks_until_published_and_drains_on_close():
+    queue = SegmentEventQueue()
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(queue.iter()))
+    thread.start()
+
+    queue.publish(CREATED, "a")
+    queue.publish(CREATED, "b")
+    queue.close()
+    thread.join(timeout=2.0)
+    assert not thread.is_alive()
+    assert received == [(CREATED, "a"), (CREATED, "b")]
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from source.sessioncatalog import SessionCatalog
+from source.sessionformat import write_session
+
+SAMPLE_RATE = 16000
+
+
+def _segment(t0: int, t1: int, text: str) -> dict:
+    return {
+        "timestamp": 0.0,
+        "t0": t0,
+        "t1": t1,
+        "start_sample": t0 * SAMPLE_RATE // 1000,
+        "end_sample": t1 * SAMPLE_RATE // 1000,
+        "text": text,
+    }
+
+
+def _add_session(catalog, name, first_sample, num_samples, segments, start_time=0.0):
+    audio = (np.arange(first_sample, first_sample + num_samples) % 20000).astype(np.int16)
+    filename = f"{catalog.get_directory()}/{name}.session"
+    write_session(
+        filename,
+        sample_rate=SAMPLE_RATE,
+        dtype=np.int16,
+        first_sample=first_sample,
+        audio_blocks=[audio],
+        segments=segments,
+        metadata={"session_id": name, "start_time": start_time},
+    )
+    return catalog.add_file(filename)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = SessionCatalog(str(tmp_path / "store"))
+    yield catalog
+    catalog.close()
+
+
+def test_duration_is_the_session_span(catalog):
+    # the first 20 s were evicted before the session was stored
+    entry = _add_session(
+        catalog, "a", 20 * SAMPLE_RATE, 10 * SAMPLE_RATE, [_segment(21000, 22000, " hi")]
+    )
+    assert entry.duration == pytest.approx(30.0)
+    assert catalog.list_sessions(min_duration=25.0)[0].session_id == "a"
+
+
+def test_search_ranks_and_locates_segments(catalog):
+    _add_session(
+        catalog,
+        "a",
+        0,
+        10 * SAMPLE_RATE,
+        [_segment(0, 2000, " turn on the lights"), _segment(3000, 5000, " what time is it")],
+        start_time=100.0,
+    )
+    _add_session(
+        catalog,
+        "b",
+        0,
+        10 * SAMPLE_RATE,
+        [_segment(1000, 2000, " lights lights off"), _segment(2000, 3000, " ")],
+        start_time=200.0,
+    )
+
+    hits = catalog.search("lights")
+    assert [hit.session_id for hit in hits] == ["b", "a"]
+    assert (hits[1].segment_index, hits[1].t0, hits[1].t1) == (0, 0, 2000)
+    assert "[lights]" in hits[1].snippet
+
+    # all words, stemmed (porter)
+    assert [hit.session_id for hit in catalog.search("turning light")] == ["a"]
+    assert catalog.search("lights time") == []
+    assert [hit.segment_index for hit in catalog.search('"time is"', raw=True)] == [1]
+    # fts5 syntax in plain queries is literal
+    assert catalog.search('"') == []
+
+    catalog.remove_session("b")
+    assert [hit.session_id for hit in catalog.search("lights")] == ["a"]
+
+
+def test_hit_audio(catalog):
+    _add_session(catalog, "a", 0, 10 * SAMPLE_RATE, [_segment(3000, 5000, " hello there")])
+    (hit,) = catalog.search("hello")
+
+    audio = catalog.get_hit_audio(hit)
+    assert np.array_equal(audio, np.arange(48000, 80000) % 20000)
+    padded = catalog.get_hit_audio(hit, padding_seconds=4.0)
+    # clamped to the session start
+    assert np.array_equal(padded, np.arange(0, 80000 + 64000) % 20000)
+
+
+def test_hit_audio_past_the_stored_end(catalog):
+    # the session was stored before the segment's audio was complete
+    _add_session(catalog, "a", 0, 10 * SAMPLE_RATE, [_segment(9000, 12000, " cut off")])
+    (hit,) = catalog.search("cut")
+
+    audio = catalog.get_hit_audio(hit)
+    assert np.array_equal(audio, np.arange(144000, 160000) % 20000)
+    padded = catalog.get_hit_audio(hit, padding_seconds=1.0)
+    assert np.array_equal(padded, np.arange(128000, 160000) % 20000)
+
+
+def test_hit_audio_that_was_not_retained(catalog):
+    _add_session(
+        catalog, "a", 20 * SAMPLE_RATE, 10 * SAMPLE_RATE, [_segment(3000, 5000, " evicted")]
+    )
+    (hit,) = catalog.search("evicted")
+    with pytest.raises(ValueError, match="not in session"):
+        catalog.get_hit_audio(hit)
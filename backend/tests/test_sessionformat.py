@@ -0,0 +1,117 @@
+import struct
+
+import numpy as np
+import pytest
+
+from source.sessionformat import (
+    VERSION,
+    SessionFile,
+    archive_session,
+    write_session,
+)
+
+SAMPLE_RATE = 16000
+FIRST_SAMPLE = 48000
+
+
+def _audio(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (3000 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.int16)
+
+
+def _write(filename, audio, **kwargs):
+    segments = [
+        {
+            "timestamp": 1.0,
+            "t0": 3000,
+            "t1": 4000,
+            "start_sample": FIRST_SAMPLE,
+            "end_sample": FIRST_SAMPLE + 16000,
+            "text": " hello",
+        }
+    ]
+    write_session(
+        str(filename),
+        sample_rate=SAMPLE_RATE,
+        dtype=np.int16,
+        first_sample=FIRST_SAMPLE,
+        # uneven blocks, written as they are iterated
+        audio_blocks=(audio[i : i + 7000] for i in range(0, len(audio), 7000)),
+        segments=segments,
+        metadata={"session_id": "abc"},
+        **kwargs,
+    )
+    return segments
+
+
+def test_raw_round_trip(tmp_path):
+    audio = _audio(3.3)
+    segments = _write(tmp_path / "a.session", audio)
+
+    session = SessionFile(str(tmp_path / "a.session"))
+    assert session.get_version() == VERSION
+    assert session.get_sample_rate() == SAMPLE_RATE
+    assert session.get_dtype() == np.int16
+    assert session.get_first_sample() == FIRST_SAMPLE
+    assert session.get_num_samples() == len(audio)
+    assert session.get_segments() == segments
+    assert session.get_metadata() == {"session_id": "abc"}
+    assert session.get_codec() is None
+    assert np.array_equal(session.get_audio(), audio)
+
+    # ranges are absolute stream sample indices
+    _start, _end = FIRST_SAMPLE + 1000, FIRST_SAMPLE + 20000
+    assert np.array_equal(session.get_audio_range_samples(_start, _end), audio[1000:20000])
+    assert len(session.get_audio_range_samples(0, FIRST_SAMPLE)) == 0
+
+
+def test_flac_blocks_decode_by_range(tmp_path):
+    pytest.importorskip("soundfile")
+    audio = _audio(3.3)
+    _write(tmp_path / "a.session", audio, codec="flac", codec_block_seconds=1.0)
+
+    session = SessionFile(str(tmp_path / "a.session"))
+    assert session.get_codec() == "flac"
+    assert session.get_num_samples() == len(audio)
+    # lossless for int16, across a block boundary
+    _start, _end = FIRST_SAMPLE + 15000, FIRST_SAMPLE + 34000
+    assert np.array_equal(session.get_audio_range_samples(_start, _end), audio[15000:34000])
+    assert np.array_equal(session.get_audio(), audio)
+
+
+def test_archive_session_keeps_segments(tmp_path):
+    pytest.importorskip("soundfile")
+    audio = _audio(2.0)
+    segments = _write(tmp_path / "a.session", audio)
+    archive_session(str(tmp_path / "a.session"), str(tmp_path / "b.session"))
+
+    session = SessionFile(str(tmp_path / "b.session"))
+    assert session.get_segments() == segments
+    assert session.get_audio_bytes() < len(audio) * 2
+    assert np.array_equal(session.get_audio(), audio)
+
+
+def test_newer_version_is_rejected(tmp_path):
+    _write(tmp_path / "a.session", _audio(0.5))
+    with open(tmp_path / "a.session", "r+b") as f:
+        f.seek(struct.calcsize("<8s"))
+        f.write(struct.pack("<H", VERSION + 1))
+
+    with pytest.raises(ValueError, match="version"):
+        SessionFile(str(tmp_path / "a.session"))
+
+
+def test_unknown_flags_are_rejected(tmp_path):
+    _write(tmp_path / "a.session", _audio(0.5))
+    with open(tmp_path / "a.session", "r+b") as f:
+        f.seek(struct.calcsize("<8sH"))
+        f.write(struct.pack("<H", 1 << 0))
+
+    with pytest.raises(ValueError, match="flags"):
+        SessionFile(str(tmp_path / "a.session"))
+
+
+def test_foreign_file_is_rejected(tmp_path):
+    (tmp_path / "a.session").write_bytes(b"\x80\x04\x95" + bytes(200))
+    with pytest.raises(ValueError, match="Not a WhisperCore session file"):
+        SessionFile(str(tmp_path / "a.session"))
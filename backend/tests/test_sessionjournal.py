@@ -0,0 +1,151 @@
+import glob
+import os
+import pickle
+
+import numpy as np
+
+from source.sessionformat import SessionFile
+from source.sessionjournal import SessionJournal, recover_session
+
+SAMPLE_RATE = 16000
+
+
+def _block(start: int, count: int) -> np.ndarray:
+    # sample value = its index, so overlaps / gaps show up in comparisons
+    return (np.arange(start, start + count) % 30000).astype(np.int16)
+
+
+def test_crash_recovery_across_checkpoints(tmp_path):
+    filename = str(tmp_path / "session.save")
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    journal.append_audio(0, _block(0, 8000))
+    journal.append_segment(0, 1.0, 0, 400, " one")
+    journal.checkpoint()
+    assert journal.get_generation() == 1
+    assert not os.path.exists(filename + ".0.journal")
+
+    journal.append_audio(8000, _block(8000, 12000))
+    journal.append_segment(0, 1.0, 0, 450, " one.")
+    journal.checkpoint()
+
+    # each part only holds what was appended since the checkpoint before
+    part = SessionFile(filename + ".1.part")
+    assert part.get_first_sample() == 8000
+    assert np.array_equal(part.get_audio(), _block(8000, 12000))
+    assert [x["text"] for x in part.get_segments()] == [" one."]
+
+    journal.append_audio(20000, _block(20000, 4000))
+    journal.append_segment(1, 2.0, 500, 1000, " two")
+    # no close() -- the process crashed
+
+    session = recover_session(filename)
+    assert session.get_num_samples() == 24000
+    assert np.array_equal(session.get_audio(), _block(0, 24000))
+    assert [x["text"] for x in session.segments] == [" one.", " two"]
+
+
+def test_reset_drops_older_parts(tmp_path):
+    filename = str(tmp_path / "session.save")
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    journal.append_audio(0, _block(0, 4000))
+    journal.append_segment(0, 1.0, 0, 200, " old")
+    journal.checkpoint()
+    journal.append_audio(4000, _block(4000, 1000))
+    journal.append_reset()
+    journal.append_audio(0, _block(100, 1000))
+    journal.checkpoint()
+    journal.close()
+
+    assert not os.path.exists(filename + ".0.part")
+    session = recover_session(filename)
+    assert session.segments == []
+    assert np.array_equal(session.get_audio(), _block(100, 1000))
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    filename = str(tmp_path / "session.save")
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    journal.append_audio(0, _block(0, 4000))
+    journal.append_audio(4000, _block(4000, 4000))
+    journal.close()
+
+    # cut the last record in half
+    _path = filename + ".0.journal"
+    os.truncate(_path, os.path.getsize(_path) - 3000)
+
+    session = recover_session(filename)
+    assert np.array_equal(session.get_audio(), _block(0, 4000))
+
+
+def test_reset_record_starts_over(tmp_path):
+    filename = str(tmp_path / "session.save")
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    journal.append_audio(0, _block(0, 4000))
+    journal.append_segment(0, 1.0, 0, 200, " old")
+    journal.append_reset()
+    journal.append_audio(0, _block(100, 1000))
+    journal.close()
+
+    session = recover_session(filename)
+    assert session.segments == []
+    assert np.array_equal(session.get_audio(), _block(100, 1000))
+
+
+def _previous_files(filename: str) -> list:
+    return sorted(glob.glob(glob.escape(filename) + ".previous-*"))
+
+
+def test_previous_run_is_archived(tmp_path):
+    filename = str(tmp_path / "session.save")
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    journal.append_audio(0, _block(0, 4000))
+    journal.append_segment(0, 1.0, 0, 200, " kept")
+    journal.checkpoint()
+    journal.append_audio(4000, _block(4000, 1000))
+    journal.close()
+
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    (path,) = _previous_files(filename)
+    previous = SessionFile(path)
+    assert np.array_equal(previous.get_audio(), _block(0, 5000))
+    assert [x["text"] for x in previous.get_segments()] == [" kept"]
+
+    # a second crashed run gets its own archive
+    journal.append_audio(0, _block(0, 2000))
+    journal.close()
+    SessionJournal(filename, SAMPLE_RATE).close()
+    first, second = [SessionFile(x) for x in _previous_files(filename)]
+    assert first.get_num_samples() == 5000
+    assert second.get_num_samples() == 2000
+
+
+def test_file_at_session_path_is_left_alone(tmp_path):
+    filename = str(tmp_path / "session.save")
+    # pickle save of an older version
+    with open(filename, "wb") as f:
+        pickle.dump({"header": {"sample_rate": SAMPLE_RATE}, "segments": []}, f)
+
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    journal.append_audio(0, _block(0, 1000))
+    journal.close()
+    SessionJournal(filename, SAMPLE_RATE).close()
+
+    with open(filename, "rb") as f:
+        assert pickle.load(f)["header"]["sample_rate"] == SAMPLE_RATE
+    assert np.array_equal(
+        SessionFile(_previous_files(filename)[0]).get_audio(), _block(0, 1000)
+    )
+
+
+def test_unreadable_part_is_kept(tmp_path):
+    filename = str(tmp_path / "session.save")
+    journal = SessionJournal(filename, SAMPLE_RATE)
+    journal.append_audio(0, _block(0, 2000))
+    journal.close()
+    with open(filename + ".0.part", "wb") as f:
+        f.write(b"not a session file")
+
+    SessionJournal(filename, SAMPLE_RATE).close()
+    assert os.path.exists(filename + ".0.part.legacy")
+    assert os.path.exists(filename + ".0.journal.legacy")
+    assert _previous_files(filename) == []
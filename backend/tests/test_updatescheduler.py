@@ -0,0 +1,62 @@
+import pytest
+
+from source.updatescheduler import AdaptiveScheduler
+
+
+def _scheduler(**kwargs):
+    return AdaptiveScheduler(
+        min_interval=0.25,
+        max_interval=2.0,
+        min_window_seconds=5.0,
+        max_window_seconds=15.0,
+        target_utilization=0.8,
+        rtf_smoothing=0.5,
+        **kwargs,
+    )
+
+
+def test_fast_decodes_use_the_shortest_interval_and_full_window():
+    scheduler = _scheduler()
+    scheduler.record_decode(0.1, 10.0)
+    assert scheduler.get_interval() == 0.25
+    assert scheduler.get_window_seconds() == 15.0
+    assert scheduler.get_rtf() == pytest.approx(0.01)
+    assert not scheduler.is_falling_behind()
+
+
+def test_slow_decodes_back_off_and_shrink_the_window():
+    scheduler = _scheduler()
+    # rtf 0.2 -> a 15s window takes 3s, more than 0.8 * 2s
+    scheduler.record_decode(1.2, 6.0)
+    assert scheduler.get_interval() == pytest.approx(1.5)
+    assert scheduler.get_window_seconds() == pytest.approx(8.0)
+
+    # smoothed, not replaced
+    scheduler.record_decode(0.4, 4.0)
+    assert scheduler.get_rtf() == pytest.approx(0.15)
+    assert scheduler.get_interval() == pytest.approx(0.8 / 0.8)
+
+
+def test_falling_behind():
+    scheduler = _scheduler()
+    assert not scheduler.is_falling_behind()
+
+    # a 5s window would take 2.5s -- more than the longest interval
+    scheduler.record_decode(2.5, 5.0)
+    assert scheduler.get_window_seconds() == 5.0
+    assert scheduler.get_interval() == 2.0
+    assert scheduler.is_falling_behind()
+
+    scheduler = _scheduler()
+    scheduler.record_decode(0.1, 10.0)
+    scheduler.record_backlog(0.5)
+    assert not scheduler.is_falling_behind()
+    scheduler.record_backlog(1.0)  # > 3 intervals of 0.25s
+    assert scheduler.get_params()["falling_behind"]
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveScheduler(min_interval=2.0, max_interval=1.0)
+    with pytest.raises(ValueError):
+        AdaptiveScheduler(min_window_seconds=0.0)
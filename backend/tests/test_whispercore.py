@@ -0,0 +1,379 @@
+import os
+import threading
+import time
+import types
+import wave
+
+import numpy as np
+import pytest
+
+for _module in ["pyaudio", "pvporcupine", "pywhispercpp", "dotenv", "ffmpeg"]:
+    pytest.importorskip(_module)
+
+from source import pipelinestate, requesthandler, whispercore_main
+from source.audioprocessing import VoiceActivityDetector
+from source.pipelinestate import PipelineState
+from source.sessionjournal import SessionJournal
+from source.whispercore_main import AudioConfig, AudioStorage, WhisperCore
+
+SAMPLE_RATE = 16000
+CONFIG = AudioConfig(SAMPLE_RATE, 1, 8)
+
+# peak amplitude (tenths) of a tone burst -> the word the fake decoder hears
+WORDS = {2: "Alpha.", 4: "Bravo."}
+
+
+def _tone(seconds: float, amplitude: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return (0.001 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+class FakeDecoder:
+    """Stands in for DecoderProcess -- one word per tone burst in the clip."""
+
+    def __init__(self, model: str, **kwargs):
+        self.model = model
+        self.clips = []
+
+    def transcribe(self, audio_data, params=None, on_segment=None, should_continue=None):
+        self.clips.append(len(audio_data))
+        segments = []
+        # 10 ms frames = whisper.cpp's centiseconds
+        frames = np.abs(audio_data[: len(audio_data) // 160 * 160]).reshape(-1, 160).max(axis=1)
+        loud = frames > 0.05
+        start = None
+        for i, is_loud in enumerate(np.append(loud, False)):
+            if is_loud and start is None:
+                start = i
+            elif not is_loud and start is not None:
+                peak = int(round(frames[start:i].max() * 10))
+                segments.append((start, i, WORDS.get(peak, "?")))
+                start = None
+        for segment in segments:
+            if on_segment is not None:
+                on_segment(segment)
+        return segments, False
+
+    def close(self):
+        pass
+
+
+class GatedDecoder(FakeDecoder):
+    """FakeDecoder that holds every decode until release() is called."""
+
+    def __init__(self, model: str, **kwargs):
+        super().__init__(model, **kwargs)
+        self.started = threading.Event()
+        self._gate = threading.Event()
+
+    def transcribe(self, audio_data, params=None, on_segment=None, should_continue=None):
+        self.started.set()
+        self._gate.wait(timeout=10)
+        return super().transcribe(audio_data, params, on_segment, should_continue)
+
+    def release(self):
+        self._gate.set()
+
+
+class ScriptedDecoder(FakeDecoder):
+    """Returns the next scripted hypothesis on every decode, records the params."""
+
+    script = []
+
+    def __init__(self, model: str, **kwargs):
+        super().__init__(model, **kwargs)
+        self.params = []
+        self._script = list(self.script)
+
+    def transcribe(self, audio_data, params=None, on_segment=None, should_continue=None):
+        self.clips.append(len(audio_data))
+        self.params.append(params)
+        return self._script.pop(0), False
+
+
+class SlowModel:
+    """Model for a real DecoderProcess -- decodes one second per second of audio."""
+
+    def __init__(self, model: str, **kwargs):
+        self.model = model
+
+    def transcribe(self, audio, new_segment_callback=None, **params):
+        time.sleep(len(audio) / SAMPLE_RATE)
+        return [types.SimpleNamespace(t0=0, t1=len(audio) // 160, text="Alpha.")]
+
+
+def slow_factory(model: str, **kwargs) -> SlowModel:
+    return SlowModel(model, **kwargs)
+
+
+def _make_core(monkeypatch, decoder=FakeDecoder, **kwargs) -> WhisperCore:
+    monkeypatch.setattr(whispercore_main, "DecoderProcess", decoder)
+    return WhisperCore("fake.bin", AudioStorage(CONFIG), **kwargs)
+
+
+class FakePorcupine:
+    frame_length = 512
+    sample_rate = SAMPLE_RATE
+
+    def process(self, frame) -> int:
+        return -1
+
+    def delete(self):
+        pass
+
+
+def test_replay_runs_every_utterance_of_a_file(tmp_path, monkeypatch):
+    audio = np.concatenate(
+        [_silence(1.0), _tone(1.5, 0.2), _silence(4.0, 1), _tone(1.5, 0.4), _silence(4.0, 2)]
+    )
+    filename = str(tmp_path / "replay.wav")
+    with wave.open(filename, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+    monkeypatch.setenv("REPLAY_FILE", filename)
+    monkeypatch.setenv("REPLAY_SPEED", "lockstep")
+    monkeypatch.setenv("WHISPER_SESSION_FILE", str(tmp_path / "session.save"))
+    monkeypatch.delenv("WHISPER_FINAL_MODEL_FILE", raising=False)
+    monkeypatch.delenv("WHISPER_SESSION_STORE", raising=False)
+    monkeypatch.setattr(whispercore_main, "DecoderProcess", FakeDecoder)
+    monkeypatch.setattr(whispercore_main.pvporcupine, "create", lambda **kwargs: FakePorcupine())
+    # run_whisper_core ends the process once it is done
+    monkeypatch.setattr(whispercore_main.os, "_exit", lambda code: None)
+
+    posts = []
+    monkeypatch.setattr(requesthandler, "send_post_request", lambda url, data: posts.append((url, data)))
+
+    state = PipelineState()
+    state.mark_ready()
+    runner = threading.Thread(target=whispercore_main.run_whisper_core, args=(state,), daemon=True)
+    runner.start()
+    runner.join(timeout=120)
+
+    # the replay stopped the pipeline by itself at the end of the file
+    assert not runner.is_alive()
+    assert state.is_in(pipelinestate.STOPPED)
+
+    completions = [
+        [x for x in data["messages"] if x]
+        for url, data in posts
+        if url.endswith("/whispercore/session_completion")
+    ]
+    # one session per utterance (plus the trailing silence, which has no text)
+    assert [x for x in completions if x] == [["Alpha."], ["Bravo."]]
+
+
+def test_vad_gate_skips_silence(monkeypatch):
+    whisper = _make_core(monkeypatch, vad=VoiceActivityDetector(SAMPLE_RATE))
+    whisper.append_audio(_silence(3.0))
+
+    assert whisper.update_stream() == (-1, 0)
+    assert whisper._model.clips == []
+
+
+def test_vad_gate_trims_clip_but_keeps_offsets(monkeypatch):
+    whisper = _make_core(monkeypatch, vad=VoiceActivityDetector(SAMPLE_RATE))
+    whisper.append_audio(np.concatenate([_silence(3.0), _tone(1.0, 0.2), _silence(1.0, 1)]))
+
+    _, segment = whisper.update_stream()
+    # only the speech (+ padding) was decoded ...
+    assert len(whisper._model.clips) == 1
+    assert whisper._model.clips[0] < 2.0 * SAMPLE_RATE
+    # ... but the segment is placed at its session time
+    assert segment.text == "Alpha."
+    assert abs(segment.t0 - 3000) <= 30
+    assert abs(segment.t1 - 4000) <= 30
+
+    # nothing new was said -- no second decode
+    whisper.append_audio(_silence(1.0, 2))
+    assert whisper.update_stream() == (-1, 0)
+    assert len(whisper._model.clips) == 1
+
+
+def test_async_updates_coalesce_while_decoding(monkeypatch):
+    whisper = _make_core(monkeypatch, decoder=GatedDecoder)
+    whisper.append_audio(_tone(1.0, 0.2))
+
+    running = whisper.update_stream_async()
+    assert whisper._model.started.wait(timeout=10)
+
+    # every request made during the decode shares one queued update
+    whisper.append_audio(_tone(1.0, 0.2))
+    queued = [whisper.update_stream_async() for _ in range(5)]
+    assert all(x is queued[0] for x in queued)
+    assert queued[0] is not running
+
+    whisper._model.release()
+    assert whisper.wait_for_updates(timeout=10)
+    running.result()
+    queued[0].result()
+    # the queued update covered the newest audio in a single decode
+    assert len(whisper._model.clips) == 2
+    assert whisper._model.clips[-1] == 2 * SAMPLE_RATE
+
+
+def test_agreement_commits_only_the_confirmed_prefix(monkeypatch):
+    monkeypatch.setattr(
+        ScriptedDecoder,
+        "script",
+        [
+            [(0, 30, "the"), (30, 60, "cat"), (60, 90, "sat")],
+            [(0, 30, "the"), (30, 60, "cat"), (60, 90, "sad"), (90, 120, "on")],
+            # relative to the committed end (600 ms)
+            [(0, 30, "sat"), (30, 60, "down")],
+        ],
+    )
+    whisper = _make_core(monkeypatch, decoder=ScriptedDecoder, local_agreement=True)
+    whisper.append_audio(_tone(2.0, 0.2))
+
+    # a single hypothesis commits nothing
+    _, segment = whisper.update_stream()
+    assert segment.text == "the cat sat"
+    assert whisper._audio_storage.snapshot().committed_sample == 0
+
+    # the agreed prefix is committed, the rest stays tentative
+    _, segment = whisper.update_stream()
+    assert segment.text == "the cat sad on"
+    assert whisper._audio_storage.snapshot().committed_sample == 600 * SAMPLE_RATE // 1000
+
+    # the next decode starts at the committed end, prompted with it
+    _, segment = whisper.update_stream()
+    assert whisper._model.clips[-1] == 2 * SAMPLE_RATE - 600 * SAMPLE_RATE // 1000
+    assert whisper._model.params[-1]["initial_prompt"] == "the cat"
+    assert segment.text == "the cat sat down"
+    assert whisper._audio_storage.snapshot().committed_sample == 600 * SAMPLE_RATE // 1000
+
+
+def test_stale_decode_is_aborted_mid_flight():
+    # the real decoder process -- only the model is fake
+    whisper = WhisperCore("slow.bin", AudioStorage(CONFIG), model_factory=slow_factory)
+    try:
+        whisper.append_audio(_tone(3.0, 0.2))
+        running = whisper.update_stream_async()
+        # let the child get well into the 3 s decode
+        time.sleep(0.5)
+
+        # a newer request makes the running decode stale -- it is killed
+        # instead of running its remaining ~2.5 s
+        queued = whisper.update_stream_async()
+        _start = time.perf_counter()
+        assert running.result(timeout=30) == (-1, 0)
+        assert time.perf_counter() - _start < 1.5
+
+        assert queued.result(timeout=30)[1].text == "Alpha."
+        _stats = whisper.get_decode_stats()
+        assert _stats["cancelled"] == 1
+        assert _stats["decodes"] == 1
+        assert whisper._model.get_restarts() == 1
+    finally:
+        whisper.close_decoders()
+
+
+def test_final_pass_runs_beside_streaming(monkeypatch):
+    class FinalDecoder(GatedDecoder):
+        def transcribe(self, audio_data, params=None, on_segment=None, should_continue=None):
+            super().transcribe(audio_data, params, on_segment, should_continue)
+            return [(0, len(audio_data) // 160, " Alpha, the final pass.")], False
+
+    def decoder(model: str, **kwargs):
+        return FinalDecoder(model) if model == "final.bin" else FakeDecoder(model)
+
+    whisper = _make_core(monkeypatch, decoder=decoder, final_model="final.bin")
+    whisper.append_audio(_tone(1.0, 0.2))
+    assert whisper.update_stream()[1].text == "Alpha."
+
+    final = whisper.finalize_async()
+    assert whisper._final_model.started.wait(timeout=10)
+
+    # partials keep decoding on their own model while the final pass runs
+    whisper.append_audio(np.concatenate([_silence(0.5), _tone(1.0, 0.4)]))
+    whisper.update_stream()
+    assert len(whisper._model.clips) == 2
+    assert not final.done()
+
+    whisper._final_model.release()
+    segments = final.result(timeout=10)
+    # the final pass saw the audio of its snapshot and replaces the partials
+    assert whisper._final_model.clips == [SAMPLE_RATE]
+    assert [x.text for x in segments] == ["Alpha, the final pass."]
+    assert (segments[0].t0, segments[0].t1) == (0, 1000)
+
+
+def test_decode_speed_is_measured_by_the_scheduler(monkeypatch):
+    whisper = _make_core(monkeypatch, max_window_seconds=8.0)
+    assert whisper.get_decode_rtf() is None
+
+    whisper.append_audio(_tone(1.0, 0.2))
+    whisper.update_stream()
+    # one average, kept by the (fixed window) default scheduler
+    assert whisper.get_decode_rtf() == whisper.get_scheduler().get_rtf() > 0
+    assert whisper.get_scheduler().get_window_seconds() == 8.0
+
+
+def test_live_events_of_an_aborted_decode_are_dropped(monkeypatch):
+    class AbortOnceDecoder(FakeDecoder):
+        def transcribe(self, audio_data, params=None, on_segment=None, should_continue=None):
+            if not self.clips:
+                # streams a segment, then gets killed
+                self.clips.append(len(audio_data))
+                on_segment((0, 50, " Alp"))
+                return [], True
+            return super().transcribe(audio_data, params, on_segment, should_continue)
+
+    whisper = _make_core(monkeypatch, decoder=AbortOnceDecoder, stream_segments=True)
+    whisper.append_audio(_tone(1.0, 0.2))
+
+    assert whisper.update_stream() == (-1, 0)
+    assert list(whisper.iter_segment_events(timeout=0)) == []
+    assert whisper.get_decode_stats()["cancelled"] == 1
+
+    # the completed decode's live event is confirmed and merged with its result
+    whisper.update_stream()
+    events = list(whisper.iter_segment_events(timeout=0))
+    assert [(x[0], x[1].text) for x in events] == [(whispercore_main.SEGMENT_UPDATED, "Alpha.")]
+
+
+def test_reset_starts_a_new_event_generation(monkeypatch):
+    whisper = _make_core(monkeypatch, stream_segments=True)
+    whisper.append_audio(_tone(1.0, 0.2))
+    whisper.update_stream()
+    generation = whisper.get_session_generation()
+
+    # events of the old session are not delivered after a reset
+    whisper.reset_stream()
+    assert whisper.get_session_generation() == generation + 1
+    assert list(whisper.iter_segment_events(timeout=0)) == []
+
+    whisper.append_audio(_tone(1.0, 0.4))
+    whisper.update_stream()
+    assert [x[1].text for x in whisper.iter_segment_events(timeout=0)] == ["Bravo."]
+
+
+def test_restored_save_survives_a_crash(tmp_path, monkeypatch):
+    source = _make_core(monkeypatch)
+    source.append_audio(_tone(1.0, 0.2))
+    source.update_stream()
+
+    filename = str(tmp_path / "session.save")
+    journal = SessionJournal(filename, SAMPLE_RATE, sample_dtype=np.int16)
+    whisper = _make_core(monkeypatch, journal=journal)
+    whisper.append_audio(_tone(2.0, 0.4))
+    whisper.checkpoint_async().result()
+
+    # the restored state replaces the journaled one, checkpoints only
+    # carry what changed since
+    whisper.restore_save(source.get_save())
+    whisper.checkpoint_async().result()
+    whisper.append_audio(_silence(0.5))
+    # no close_journal() -- the process crashed
+
+    recovered = whispercore_main.WhisperCoreSave.recover(filename)
+    assert [x.segment.text for x in recovered._saved_segments] == ["Alpha."]
+    assert recovered._audio_storage.get_total_samples() == int(1.5 * SAMPLE_RATE)
@@ -1,31 +1,36 @@
-import pickle
+import sys
+
+sys.path.insert(0, "backend")
+
+from source.sessionjournal import recover_session
 
 
 filename = "whispercpp-audio-test.save"
 
-# load data with pickle
-data = pickle.load(open(filename, "rb"))
+# checkpoint parts + the journal written since
+try:
+    session = recover_session(filename)
+except ValueError as e:
+    # e.g. a torn checkpoint part
+    print(f"Cannot read {filename}: {e}")
+    sys.exit(1)
+if session is None:
+    print(f"No session found at {filename}")
+    sys.exit(1)
 
-# get each chunk
-_header = data["header"]
-print(_header)
+print(f"Sample Rate: {session.sample_rate}")
+print(f"Sample Format: {session.dtype}")
+print(f"Metadata: {session.metadata}")
 print()
 
-_audio_chunks = data["audio_chunks"]
-print(f"Audio Chunk Count: {_audio_chunks['count']}")
-for i in range(len(_audio_chunks["chunks"])):
-    print(f"Audio Chunk {i}:")
-    print(_audio_chunks["chunks"][i])
-    print()
+_audio = session.get_audio()
+print(f"Audio Samples: {session.first_sample} - {session.first_sample + len(_audio)}")
+print(f"Audio Duration: {len(_audio) / session.sample_rate:.2f} s")
 print()
 
-_segment_data = data["segment_data"]
-# unpickle each segment
-for i in range(len(_segment_data["segments"])):
-    _segment_data["segments"][i] = pickle.loads(_segment_data["segments"][i])
-
-print(f"Segment Count: {len(_segment_data['segments'])}")
-for i in range(len(_segment_data["segments"])):
+_segments = session.segments
+print(f"Segment Count: {len(_segments)}")
+for i in range(len(_segments)):
     print(f"Segment {i}:")
-    print(_segment_data["segments"][i])
+    print(_segments[i])
     print()